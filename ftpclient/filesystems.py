@@ -1,20 +1,49 @@
 import errno
 import re
 import stat
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from io import UnsupportedOperation
 from os.path import commonprefix, join as pathjoin
 from tempfile import NamedTemporaryFile
+from threading import Thread
 
 from fman import fs, show_status_message
 from fman.fs import FileSystem, cached
-from fman.url import join as urljoin, splitscheme
+from fman.url import splitscheme
 
-from .ftp import FtpWrapper
+from .ftp import FtpWrapper, fxp_copy, load_settings, relay_copy
+from .transfers import TransferScheduler
 
 is_ftp = re.compile('^ftps?://').match
 is_file = re.compile('^file://').match
 
+# URLs listed in this session, see `FtpFs.iterdir`
+_visited = set()
+# Per thread depth of `live_listings` blocks
+_live = threading.local()
+
+
+@contextmanager
+def live_listings():
+    """
+    Make `FtpFs.iterdir` in this thread list the server instead of
+    showing a stored listing from an earlier session, for operations
+    that act on the entries (copy, move, delete).
+    """
+    _live.depth = getattr(_live, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _live.depth -= 1
+
+
+def _shown_stats(lstat):
+    # What fman shows, and all the persistent cache keeps
+    return (lstat.st_mode, lstat.st_size, lstat.st_mtime, lstat.st_uid,
+            lstat.st_gid)
+
 
 class FtpFs(FileSystem):
     scheme = 'ftp://'
@@ -64,19 +93,62 @@ class FtpFs(FileSystem):
         # XXX avoid errors on URLs without connection details
         if not path:
             return
+        url = self.scheme + path
+        # On the first visit, show the listing from an earlier session
+        # right away (if the persistent cache is enabled) and refresh it
+        # in the background. It may be up to a week old, so it's only
+        # for display, see `live_listings`.
+        stored = None
+        if url not in _visited and not getattr(_live, 'depth', 0):
+            _visited.add(url)
+            stored = FtpWrapper(url).load_listing()
+        if stored is not None:
+            for lstat in stored:
+                self._put_stats(pathjoin(path, lstat._st_name), lstat)
+                yield lstat._st_name
+            Thread(target=self._refresh, args=(path, stored),
+                   daemon=True).start()
+            return
         show_status_message('Loading %s...' % (path,))
-        with FtpWrapper(self.scheme + path) as ftp:
-            for name in ftp.conn.listdir(ftp.path):
-                self.get_stats(pathjoin(path, name))
-                yield name
+        for name, _ in self._list(path):
+            yield name
         show_status_message('Ready.', timeout_secs=0)
 
-    def delete(self, path):
+    def _list(self, path):
         with FtpWrapper(self.scheme + path) as ftp:
+            # One directory listing gives the stats of all entries,
+            # which are yielded while the listing is still arriving.
+            # Listings fetched less than `cache_max_age` seconds ago
+            # come from the connection's cache.
+            stat_results = []
+            for name, lstat in ftp.conn.iterdir_stat(ftp.path):
+                self._put_stats(pathjoin(path, name), lstat)
+                stat_results.append(lstat)
+                yield name, lstat
+            ftp.store_listing(stat_results)
+
+    def _refresh(self, path, stored):
+        old = {lstat._st_name: lstat for lstat in stored}
+        try:
+            for name, lstat in self._list(path):
+                old_lstat = old.pop(name, None)
+                if old_lstat is None:
+                    self.notify_file_added(pathjoin(path, name))
+                elif _shown_stats(old_lstat) != _shown_stats(lstat):
+                    self.notify_file_changed(pathjoin(path, name))
+        except Exception:
+            # Keep showing the stored listing, the next visit lists again
+            return
+        for name in old:
+            self.notify_file_removed(pathjoin(path, name))
+
+    def delete(self, path):
+        with live_listings(), FtpWrapper(self.scheme + path) as ftp:
             if self.is_dir(path):
                 ftp.conn.rmtree(ftp.path)
             else:
                 ftp.conn.remove(ftp.path)
+            ftp.changed()
 
     def move_to_trash(self, path):
         # ENOSYS: Function not implemented
@@ -85,6 +157,7 @@ class FtpFs(FileSystem):
     def mkdir(self, path):
         with FtpWrapper(self.scheme + path) as ftp:
             ftp.conn.makedirs(ftp.path)
+            ftp.changed()
 
     def touch(self, path):
         if self.exists(path):
@@ -92,6 +165,7 @@ class FtpFs(FileSystem):
         with FtpWrapper(self.scheme + path) as ftp:
             with NamedTemporaryFile(delete=True) as tmp:
                 ftp.conn.upload(tmp.name, ftp.path)
+            ftp.changed()
 
     def samefile(self, path1, path2):
         return path1 == path2
@@ -99,28 +173,49 @@ class FtpFs(FileSystem):
     def copy(self, src_url, dst_url):
         # Recursive copy
         if fs.is_dir(src_url):
-            fs.mkdir(dst_url)
-            for fname in fs.iterdir(src_url):
-                fs.copy(urljoin(src_url, fname), urljoin(dst_url, fname))
+            scheduler = TransferScheduler(
+                self._copy_file, self._transfer_workers(src_url, dst_url))
+            with live_listings():
+                scheduler.copy_tree(src_url, dst_url)
             return
+        self._copy_file(src_url, dst_url)
 
+    def _copy_file(self, src_url, dst_url):
         if is_ftp(src_url) and is_ftp(dst_url):
+            use_fxp = load_settings().get('fxp', True)
             with FtpWrapper(src_url) as src_ftp, \
                     FtpWrapper(dst_url) as dst_ftp:
-                with src_ftp.conn.open(src_ftp.path, 'rb') as src, \
-                        dst_ftp.conn.open(dst_ftp.path, 'wb') as dst:
-                    dst_ftp.conn.copyfileobj(src, dst)
+                # Transfer directly between the servers if possible,
+                # else relay the data
+                if not (use_fxp and fxp_copy(src_ftp, dst_ftp)):
+                    relay_copy(src_ftp, dst_ftp)
+                dst_ftp.changed()
         elif is_ftp(src_url) and is_file(dst_url):
             _, dst_path = splitscheme(dst_url)
+            segments = load_settings().get('download_segments', 1)
             with FtpWrapper(src_url) as src_ftp:
-                src_ftp.conn.download(src_ftp.path, dst_path)
+                # Don't wait for connections other transfers use
+                segments = max(
+                    1, min(segments, src_ftp.available_connections()))
+                src_ftp.conn.download(
+                    src_ftp.path, dst_path, segments=segments)
         elif is_file(src_url) and is_ftp(dst_url):
             _, src_path = splitscheme(src_url)
             with FtpWrapper(dst_url) as dst_ftp:
                 dst_ftp.conn.upload(src_path, dst_ftp.path)
+                dst_ftp.changed()
         else:
             raise UnsupportedOperation
 
+    def _transfer_workers(self, src_url, dst_url):
+        # As many concurrent transfers as both ends allow connections, each
+        # transfer needs one for commands and one for the data, even a copy
+        # within a server (see `relay_copy` and `fxp_copy`)
+        settings = load_settings()
+        return min(
+            FtpWrapper(url)._max_connections(settings) // 2
+            for url in (src_url, dst_url) if is_ftp(url))
+
     def move(self, src_url, dst_url):
         # Rename on same server
         src_scheme, src_path = splitscheme(src_url)
@@ -130,22 +225,31 @@ class FtpFs(FileSystem):
             with FtpWrapper(src_url) as src_ftp, \
                     FtpWrapper(dst_url) as dst_ftp:
                 src_ftp.conn.rename(src_ftp.path, dst_ftp.path)
+                src_ftp.changed()
+                src_ftp.changed(dst_ftp.path)
                 return
 
-        fs.copy(src_url, dst_url)
-        if fs.exists(src_url):
-            fs.delete(src_url)
+        with live_listings():
+            fs.copy(src_url, dst_url)
+            if fs.exists(src_url):
+                fs.delete(src_url)
 
     def get_stats(self, path):
         with FtpWrapper(self.scheme + path) as ftp:
-            lstat = ftp.conn.lstat(ftp.path)
-            dt_mtime = datetime.utcfromtimestamp(lstat.st_mtime)
-            st_mode = stat.filemode(lstat.st_mode)
-            self.cache.put(path, 'size_bytes', lstat.st_size)
-            self.cache.put(path, 'modified_datetime', dt_mtime)
-            self.cache.put(path, 'get_permissions', st_mode)
-            self.cache.put(path, 'get_owner', lstat.st_uid)
-            self.cache.put(path, 'get_group', lstat.st_gid)
+            self._put_stats(path, ftp.conn.lstat(ftp.path))
+
+    def _put_stats(self, path, lstat):
+        dt_mtime = datetime.utcfromtimestamp(lstat.st_mtime)
+        st_mode = stat.filemode(lstat.st_mode)
+        self.cache.put(path, 'size_bytes', lstat.st_size)
+        self.cache.put(path, 'modified_datetime', dt_mtime)
+        self.cache.put(path, 'get_permissions', st_mode)
+        self.cache.put(path, 'get_owner', lstat.st_uid)
+        self.cache.put(path, 'get_group', lstat.st_gid)
+        self.cache.put(path, 'exists', True)
+        # Links need another lookup to know whether they point to a dir
+        if not stat.S_ISLNK(lstat.st_mode):
+            self.cache.put(path, 'is_dir', stat.S_ISDIR(lstat.st_mode))
 
 
 class FtpsFs(FtpFs):
@@ -1,5 +1,11 @@
+import atexit
+import errno
 import ftplib
+import ipaddress
+import posixpath
+import socket
 import threading
+import time
 from urllib.parse import unquote, urlparse
 
 from fman import load_json
@@ -12,29 +18,530 @@ except ImportError:
     sys.path.append(
         os.path.join(os.path.dirname(__file__), 'ftputil-3.4'))
     import ftputil
+import ftputil.error
 
+from .persistent_cache import get_persistent_cache
+
+# Defaults, can be overridden in `FTP Settings.json`
+MAX_CONNECTIONS = 4
+LEASE_TIMEOUT = 30
+IDLE_TIMEOUT = 300
+KEEPALIVE_INTERVAL = 60
+CACHE_MAX_AGE = 30
+# Changed paths remembered per server, see `FtpConnectionPool.changed`
+MAX_CHANGES = 100
 
-class FtpSession(ftplib.FTP):
-    def __init__(self, host, port, user, password):
-        super().__init__()
-        self.connect(host, port)
-        # FIXME ftplib.error_temp: 421 Too many connections from the
-        #       same IP address.
-        self.login(user, password)
 
+def load_settings():
+    return load_json('FTP Settings.json', default={})
+
+
+class ReconnectingSession():
+    """
+    Session mixin that logs in again and retries a command once when the
+    server has dropped the control connection (e.g. on an idle timeout),
+    restoring the working directory first.
+    """
 
-class FtpTlsSession(ftplib.FTP_TLS):
     def __init__(self, host, port, user, password):
         super().__init__()
+        self._credentials = (host, port, user, password)
+        self._cwd = None
+        # Called once when the session is closed for good, see
+        # `FtpConnectionPool.session_factory`
+        self.on_close = None
+        # Don't retry while logging in for the first time
+        self._reconnecting = True
+        self._open()
+        self._reconnecting = False
+
+    def _open(self):
+        host, port, user, password = self._credentials
         self.connect(host, port)
         self.login(user, password)
+
+    def _reconnect(self):
+        self._reconnecting = True
+        try:
+            self.close()
+            self._open()
+            if self._cwd is not None:
+                super().voidcmd('CWD ' + self._cwd)
+        finally:
+            self._reconnecting = False
+
+    def _retry(self, command, cmd):
+        try:
+            return command(cmd)
+        except (EOFError, ConnectionError, ftplib.error_temp) as exc:
+            if self._reconnecting or isinstance(exc, ftplib.error_temp) and \
+                    not str(exc).startswith('421'):
+                raise
+        self._reconnect()
+        return command(cmd)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if not self._reconnecting and self.on_close is not None:
+                on_close, self.on_close = self.on_close, None
+                on_close()
+
+    def sendcmd(self, cmd):
+        return self._retry(super().sendcmd, cmd)
+
+    def voidcmd(self, cmd):
+        return self._retry(super().voidcmd, cmd)
+
+    def pwd(self):
+        self._cwd = super().pwd()
+        return self._cwd
+
+    def cwd(self, dirname):
+        resp = super().cwd(dirname)
+        if posixpath.isabs(dirname):
+            self._cwd = posixpath.normpath(dirname)
+        elif self._cwd is not None:
+            self._cwd = posixpath.normpath(posixpath.join(self._cwd, dirname))
+        return resp
+
+
+class FtpSession(ReconnectingSession, ftplib.FTP):
+    pass
+
+
+class FtpTlsSession(ReconnectingSession, ftplib.FTP_TLS):
+    def _open(self):
+        super()._open()
         self.prot_p()
 
 
+def is_connection_error(exc):
+    """Whether `exc` means that the FTP connection is no longer usable."""
+    if isinstance(exc, ftputil.error.InternalError):
+        return False
+    if isinstance(exc, ftputil.error.FTPError):
+        # No reply code means a socket level error, 421 means the server
+        # is closing the control connection.
+        return exc.errno is None or exc.errno == 421
+    return isinstance(exc, (EOFError, ConnectionError, socket.timeout))
+
+
+def quit_quietly(ftp_host):
+    """Say goodbye to the server and close `ftp_host`, ignoring errors."""
+    try:
+        ftp_host._session.quit()
+    except Exception:
+        pass
+    # Close every child session, even if closing a file fails
+    for child in list(ftp_host._children):
+        try:
+            child.close()
+        except Exception:
+            pass
+    try:
+        ftp_host.close()
+    except Exception:
+        pass
+
+
+# (source server, target server) pairs that refused FXP transfers
+_fxp_refused = set()
+
+
+def fxp_copy(src_ftp, dst_ftp):
+    """
+    Copy the file of `src_ftp` to the path of `dst_ftp` (both connected
+    `FtpWrapper`s) with a server-to-server (FXP) transfer: the target
+    server listens (PASV) and the source server connects to it (PORT),
+    so the data doesn't pass through this machine.
+
+    Return False if FXP isn't possible, e.g. over TLS or because a server
+    refuses to connect to a third party, or if the transfer fails, so that
+    the caller can relay the data instead. Pairs of servers that refused
+    are remembered and not tried again.
+    """
+    servers = (src_ftp.key[:3], dst_ftp.key[:3])
+    if 'ftps://' in (src_ftp.key[0], dst_ftp.key[0]) or \
+            servers in _fxp_refused:
+        return False
+    src = src_ftp.conn._session
+    if dst_ftp.conn is src_ftp.conn:
+        # Same server and thread: one control connection can't be both
+        # sides of the transfer, so use a child session for the target
+        dst = src_ftp.conn._child()._session
+    else:
+        dst = dst_ftp.conn._session
+    try:
+        src.voidcmd('TYPE I')
+        dst.voidcmd('TYPE I')
+        host, port = ftplib.parse227(dst.sendcmd('PASV'))
+        host = _pasv_host(dst, host)
+        src.voidcmd('PORT %s,%d,%d' % (
+            host.replace('.', ','), port >> 8, port & 0xff))
+    except ftplib.Error:
+        _fxp_refused.add(servers)
+        return False
+    # Don't wait for the reply to STOR: many servers (e.g. vsftpd and
+    # ProFTPD) only send it after the source has connected, i.e. after
+    # RETR.
+    try:
+        dst.putcmd('STOR ' + dst_ftp.path)
+        src.sendcmd('RETR ' + src_ftp.path)
+        dst.getresp()
+        src.voidresp()
+        dst.voidresp()
+    except ftplib.all_errors as exc:
+        if str(exc).startswith('425'):
+            # The source couldn't connect to the target
+            _fxp_refused.add(servers)
+        # Replies for the interrupted transfer may still be pending, so
+        # start over with new control connections before relaying
+        with ftputil.error.ftplib_error_to_ftp_os_error:
+            src._reconnect()
+            dst._reconnect()
+        return False
+    dst_ftp.conn.stat_cache.invalidate(dst_ftp.path)
+    return True
+
+
+def _pasv_host(session, host):
+    """
+    Return the address the source of an FXP transfer has to connect to
+    for the PASV reply address `host` of the target `session`. Servers
+    behind NAT often reply with their private address, so use the public
+    address of the control connection instead, as ftplib does for its own
+    data connections.
+    """
+    peer = ipaddress.ip_address(session.sock.getpeername()[0])
+    if peer.version == 4 and peer.is_global:
+        return str(peer)
+    return host
+
+
+def relay_copy(src_ftp, dst_ftp):
+    """
+    Copy the file of `src_ftp` to the path of `dst_ftp` (both connected
+    `FtpWrapper`s) through this machine.
+
+    On the same server and thread both share one `FTPHost`, and opening
+    both files would take two child sessions. So the source is read over
+    the `FTPHost`'s own control connection, which isn't used otherwise
+    meanwhile, and the transfer needs no more connections than any other.
+    """
+    src_host, dst_host = src_ftp.conn, dst_ftp.conn
+    if dst_host is not src_host:
+        with src_host.open(src_ftp.path, 'rb') as src, \
+                dst_host.open(dst_ftp.path, 'wb') as dst:
+            dst_host.copyfileobj(src, dst)
+        return
+    src_dir, src_name = src_host.path.split(src_ftp.path)
+    with dst_host.open(dst_ftp.path, 'wb') as dst:
+        # Through `FTPHost` so that it knows the current directory
+        src_host.chdir(src_dir)
+        session = src_host._session
+        with ftputil.error.ftplib_error_to_ftp_io_error:
+            session.voidcmd('TYPE I')
+            conn = session.transfercmd('RETR ' + src_name)
+        try:
+            with conn, conn.makefile('rb') as src:
+                dst_host.copyfileobj(src, dst)
+            with ftputil.error.ftplib_error_to_ftp_io_error:
+                session.voidresp()
+        except BaseException:
+            # The reply to the interrupted transfer may still be pending
+            with ftputil.error.ftplib_error_to_ftp_os_error:
+                session._reconnect()
+            raise
+
+
+class FtpConnectionPool():
+    """
+    Thread-safe pool of `FTPHost` objects shared by all fman threads.
+
+    Connections are grouped by key (scheme, host, port and credentials) and
+    each key has its own quota. The quota covers every connection to the
+    server, including the child sessions an `FTPHost` opens for transfers
+    and listings (see `session_factory`), so a new `FTPHost` is only made
+    if there's room for it and one child session. A lease is reentrant:
+    nested `FtpWrapper` blocks in the same thread get the connection leased
+    by the outer one. Other threads get an idle connection, a new one if
+    the quota allows it, or wait until another thread releases one.
+
+    Each connection caches listings and stats of its own. Paths changed
+    through one connection are invalidated in the caches of the other
+    connections to the same server when they are acquired next.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        # key -> [(ftp_host, released_at), ...], most recently used last
+        self._idle = {}
+        # key -> number of open connections (sessions), idle or leased
+        self._count = {}
+        # (thread id, key) -> [ftp_host, depth, discard]
+        self._leases = {}
+        self.keepalive_interval = KEEPALIVE_INTERVAL
+        self.idle_timeout = IDLE_TIMEOUT
+        self._keepalive_thread = None
+        # key -> (number of older changes, [path, ...])
+        self._changes = {}
+        # ftp_host -> number of changes applied to its cache
+        self._seen = {}
+
+    def acquire(self, key, connect, max_connections, timeout):
+        """
+        Return `(ftp_host, lease)` for `key`, calling `connect()` when a new
+        connection is needed. `lease` must be passed to `release`.
+
+        Raise `OSError` (ETIMEDOUT) if no connection became available
+        within `timeout` seconds.
+        """
+        lease = (threading.get_ident(), key)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if lease in self._leases:
+                self._leases[lease][1] += 1
+                return self._leases[lease][0], lease
+            while True:
+                idle = self._idle.get(key)
+                if idle:
+                    ftp_host, _ = idle.pop()
+                    self._apply_changes(key, ftp_host)
+                    break
+                # Room for the new connection and a child session, which
+                # is all an operation needs (see `relay_copy`)
+                if self._count.get(key, 0) + 2 <= max_connections:
+                    # Used by the first session from `session_factory`
+                    self._count[key] = self._count.get(key, 0) + 1
+                    ftp_host = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise OSError(
+                        errno.ETIMEDOUT,
+                        'No free connection to %s after %s seconds' % (
+                            key[1], timeout))
+                self._cond.wait(remaining)
+
+        if ftp_host is None:
+            self._start_keepalive()
+            try:
+                ftp_host = connect()
+            except BaseException:
+                with self._cond:
+                    self._count[key] -= 1
+                    self._cond.notify()
+                raise
+
+        with self._cond:
+            self._leases[lease] = [ftp_host, 1, False]
+            self._seen.setdefault(ftp_host, self._change_count(key))
+        return ftp_host, lease
+
+    def session_factory(self, key, session_class, max_connections, timeout):
+        """
+        Return a session factory for an `FTPHost` connecting for `key` which
+        counts every session towards `max_connections`. The first session,
+        the `FTPHost`'s own, uses the connection reserved by `acquire`. The
+        others, i.e. child sessions, close idle connections to make room or
+        wait up to `timeout` seconds for a free connection. Sessions give
+        back their connection when they're closed.
+        """
+        reserved = [True]
+
+        def make_session(*args, **kwargs):
+            first = bool(reserved)
+            if first:
+                reserved.pop()
+            else:
+                self._reserve(key, max_connections, timeout)
+            try:
+                session = session_class(*args, **kwargs)
+            except BaseException:
+                # `acquire` takes care of the reserved connection
+                if not first:
+                    self._unreserve(key)
+                raise
+            session.on_close = lambda: self._unreserve(key)
+            return session
+        return make_session
+
+    def _reserve(self, key, max_connections, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            ftp_host = None
+            with self._cond:
+                count = self._count.get(key, 0)
+                if count < max_connections:
+                    self._count[key] = count + 1
+                    return
+                idle = self._idle.get(key)
+                if idle:
+                    # Close the least recently used idle connection; its
+                    # sessions give back their connections when closed
+                    ftp_host, _ = idle.pop(0)
+                    self._forget(ftp_host)
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise OSError(
+                            errno.ETIMEDOUT,
+                            'No free connection to %s after %s seconds' % (
+                                key[1], timeout))
+                    self._cond.wait(remaining)
+            if ftp_host is not None:
+                quit_quietly(ftp_host)
+
+    def _unreserve(self, key):
+        with self._cond:
+            self._count[key] -= 1
+            self._cond.notify_all()
+
+    def spare(self, key, max_connections):
+        """Return how many more connections for `key` the quota allows."""
+        with self._cond:
+            return max(0, max_connections - self._count.get(key, 0))
+
+    def changed(self, key, path, ftp_host):
+        """
+        Record that `path` (and anything below it) has been changed on the
+        server of `key` through `ftp_host`, whose own cache is up to date.
+        """
+        with self._cond:
+            base, paths = self._changes.get(key, (0, []))
+            paths.append(path)
+            if len(paths) > MAX_CHANGES:
+                base += len(paths) - MAX_CHANGES
+                del paths[:-MAX_CHANGES]
+            self._changes[key] = (base, paths)
+            if self._seen.get(ftp_host) == base + len(paths) - 1:
+                self._seen[ftp_host] = base + len(paths)
+
+    def _change_count(self, key):
+        base, paths = self._changes.get(key, (0, []))
+        return base + len(paths)
+
+    def _apply_changes(self, key, ftp_host):
+        # Called with `_cond` held, for a connection nobody else uses
+        base, paths = self._changes.get(key, (0, []))
+        seen = self._seen.get(ftp_host, 0)
+        if seen < base:
+            # Too many changes since the last use to remember them all
+            ftp_host.stat_cache.clear()
+        else:
+            for path in paths[seen - base:]:
+                ftp_host.stat_cache.invalidate_subtree(path)
+        self._seen[ftp_host] = base + len(paths)
+
+    def _forget(self, ftp_host):
+        # Called with `_cond` held, for a connection being closed
+        self._seen.pop(ftp_host, None)
+
+    def release(self, lease, discard=False):
+        """
+        Give back a connection leased with `acquire`. If `discard` is true
+        the connection is closed instead of being kept for reuse once the
+        outermost lease is released.
+        """
+        key = lease[1]
+        with self._cond:
+            entry = self._leases[lease]
+            entry[1] -= 1
+            entry[2] = entry[2] or discard
+            if entry[1]:
+                return
+            del self._leases[lease]
+            ftp_host, _, discard = entry
+            if discard:
+                # Closing the sessions gives back their connections
+                self._forget(ftp_host)
+            else:
+                self._idle.setdefault(key, []).append(
+                    (ftp_host, time.monotonic()))
+            self._cond.notify()
+        if discard:
+            quit_quietly(ftp_host)
+
+    def evict_idle(self, idle_timeout):
+        """Close connections that have been idle for over `idle_timeout`."""
+        evicted = []
+        limit = time.monotonic() - idle_timeout
+        with self._cond:
+            for key, idle in self._idle.items():
+                keep = [item for item in idle if item[1] > limit]
+                evicted.extend(item[0] for item in idle if item[1] <= limit)
+                idle[:] = keep
+            for ftp_host in evicted:
+                self._forget(ftp_host)
+            if evicted:
+                self._cond.notify_all()
+        for ftp_host in evicted:
+            quit_quietly(ftp_host)
+
+    def close_all(self):
+        """Close every idle connection."""
+        self.evict_idle(-1)
+
+    def keep_alive(self):
+        """
+        Send a NOOP on idle connections unused for `keepalive_interval`
+        seconds, so that servers don't drop them. Connections that fail are
+        closed and forgotten.
+        """
+        now = time.monotonic()
+        probed = []
+        with self._cond:
+            for key, idle in self._idle.items():
+                stale = [item for item in idle
+                         if now - item[1] >= self.keepalive_interval]
+                idle[:] = [item for item in idle if item not in stale]
+                probed.extend((key, item) for item in stale)
+        for key, (ftp_host, released_at) in probed:
+            try:
+                ftp_host._session.voidcmd('NOOP')
+            except Exception:
+                quit_quietly(ftp_host)
+                alive = False
+            else:
+                alive = True
+            with self._cond:
+                if alive:
+                    # Keep the idle time, NOOPs don't count as use
+                    idle = self._idle.setdefault(key, [])
+                    idle.append((ftp_host, released_at))
+                    idle.sort(key=lambda item: item[1])
+                else:
+                    self._forget(ftp_host)
+                self._cond.notify()
+
+    def _start_keepalive(self):
+        with self._cond:
+            if self._keepalive_thread is not None:
+                return
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, name='FTP keep-alive',
+                daemon=True)
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while True:
+            time.sleep(min(self.keepalive_interval, self.idle_timeout))
+            try:
+                self.evict_idle(self.idle_timeout)
+                self.keep_alive()
+            except Exception:
+                pass  # Never let the background thread die
+
+
 class FtpWrapper():
-    __conn_pool = {}
+    __pool = FtpConnectionPool()
+    atexit.register(__pool.close_all)
 
     def __init__(self, url):
+        # Alias of the bookmark `url` belongs to, if any
+        self._bookmark = None
         u = self._get_bookmark(url)
         self._url = u.geturl()
         self._scheme = '%s://' % (u.scheme,)
@@ -43,33 +550,139 @@ class FtpWrapper():
         self._port = u.port or 21
         self._user = unquote(u.username or '')
         self._passwd = unquote(u.password or '')
+        self._conn = None
+        self._lease = None
+        self._settings = None
 
     def __enter__(self):
-        if self.hash in self.__conn_pool:
-            try:
-                self.conn._session.voidcmd('NOOP')
-            except:
-                pass  # Assume connection timeout
-            else:
-                return self
+        settings = self._settings = load_settings()
+        self.__pool.keepalive_interval = \
+            settings.get('keepalive_interval', KEEPALIVE_INTERVAL)
+        self.__pool.idle_timeout = settings.get('idle_timeout', IDLE_TIMEOUT)
+        self._conn, self._lease = self.__pool.acquire(
+            self.key, self._connect, self._max_connections(settings),
+            settings.get('lease_timeout', LEASE_TIMEOUT))
+        # Listings are reused for this long, see `FtpFs.iterdir`
+        self._conn.stat_cache.max_age = \
+            settings.get('cache_max_age', CACHE_MAX_AGE)
+        self._conn.stat_cache.revalidate_listings = \
+            settings.get('revalidate_listings', False)
+        adaptive_max_age = settings.get('adaptive_cache_max_age')
+        self._conn.stat_cache.adaptive_max_age = \
+            tuple(adaptive_max_age) if adaptive_max_age else None
+        return self
 
-        session_factory = \
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        lease, self._lease, self._conn = self._lease, None, None
+        self.__pool.release(
+            lease, discard=exc_value is not None and
+            is_connection_error(exc_value))
+        return
+
+    def changed(self, path=None):
+        """
+        Invalidate `path` (default: the path of this URL) and anything
+        below it in the caches of the other connections to this server,
+        after changing it through this connection.
+        """
+        path = self._path if path is None else path
+        self.__pool.changed(self.key, path, self.conn)
+        persistent = get_persistent_cache(self._settings)
+        if persistent is not None:
+            persistent.invalidate(self.key, path)
+
+    def store_listing(self, stat_results):
+        """
+        Keep the complete listing of this URL's directory, just made
+        through this connection, in the persistent cache if it's enabled.
+        """
+        persistent = get_persistent_cache(self._settings)
+        if persistent is not None:
+            persistent.store(
+                self.key, self._path, stat_results,
+                self.conn.stat_cache.listing_mtime(self._path))
+
+    def load_listing(self):
+        """
+        Return the stat results of this URL's directory from the
+        persistent cache, if it's enabled and has them, else None. This
+        doesn't need a connection.
+        """
+        persistent = get_persistent_cache(load_settings())
+        if persistent is None:
+            return None
+        listing = persistent.load(self.key, self._path)
+        return None if listing is None else listing[2]
+
+    def available_connections(self):
+        """
+        Return how many transfers the leased connection can run at once
+        without waiting for a free connection, e.g. for segmented
+        downloads: its unused child sessions plus the connections left in
+        the quota.
+        """
+        unused = sum(1 for child in self.conn._children if child._file.closed)
+        return unused + self.__pool.spare(
+            self.key, self._max_connections(self._settings))
+
+    def _connect(self):
+        session_class = \
             FtpTlsSession if self._scheme == 'ftps://' else FtpSession
+        session_factory = self.__pool.session_factory(
+            self.key, session_class, self._max_connections(self._settings),
+            self._settings.get('lease_timeout', LEASE_TIMEOUT))
         ftp_host = ftputil.FTPHost(
             self._host, self._port, self._user, self._passwd,
             session_factory=session_factory)
+        self._bookmark_capabilities(ftp_host)
+        persistent = get_persistent_cache(self._settings)
+        if persistent is not None:
+            # Listings from earlier sessions, only used after they have been
+            # revalidated (see `revalidate_listings`) if they're older than
+            # `cache_max_age`
+            cache = ftp_host.stat_cache
+            for path, listed, mtime, stat_results in persistent.load_all(
+                    self.key, cache.size // 2):
+                cache.add_listing(path, stat_results, mtime, listed)
+        return ftp_host
 
-        self.__conn_pool[self.hash] = ftp_host
-        return self
+    def _bookmark_capabilities(self, ftp_host):
+        """
+        With the `bookmark_capabilities` setting, keep the server's `FEAT`
+        response in the bookmark of this URL, and use it instead of asking
+        the server again in later sessions.
+        """
+        if self._bookmark is None or \
+                not self._settings.get('bookmark_capabilities', False):
+            return
+        bookmarks = \
+            load_json('FTP Bookmarks.json', default={}, save_on_quit=True)
+        bookmark = bookmarks.get(self._bookmark)
+        if bookmark is None:
+            return
+        if len(bookmark) > 2:
+            ftp_host.set_capabilities(bookmark[2])
+        else:
+            bookmarks[self._bookmark] = (
+                bookmark[0], bookmark[1], ftp_host.capabilities().as_dict())
 
-    def __exit__(self, exc_type, exc_value, exc_tb):
-        # try:
-        #     self.__conn.quit()
-        # except:
-        #     pass
-        # finally:
-        #     self.__conn = None
-        return
+    def _max_connections(self, settings):
+        # Per server overrides, e.g. {"user@ftp.host": 2, "ftp.host": 4}
+        overrides = settings.get('max_connections_per_host', {})
+        for name in ('%s@%s' % (self._user, self._host), self._host):
+            if name in overrides:
+                break
+        else:
+            name = None
+        limit = overrides[name] if name is not None else \
+            settings.get('max_connections', MAX_CONNECTIONS)
+        # Commands and transfers (even listings) need a connection each.
+        # Don't go over a lower limit, it may be the server's own.
+        if limit < 2:
+            raise ValueError(
+                'max_connections for %s is %s, but at least 2 are needed' % (
+                    name or self._host, limit))
+        return limit
 
     def _get_bookmark(self, url):
         u = urlparse(url)
@@ -80,20 +693,20 @@ class FtpWrapper():
         # Replace base URL -if found in bookmarks-, keep the same path
         if url_without_path in bookmarks:
             u = urlparse(bookmarks[url_without_path][0])._replace(path=u.path)
+            self._bookmark = url_without_path
 
         return u
 
     @property
-    def hash(self):
-        return hash((
-            threading.get_ident(), self._host, self._port, self._user,
-            self._passwd))
+    def key(self):
+        return (
+            self._scheme, self._host, self._port, self._user, self._passwd)
 
     @property
     def conn(self):
-        if self.hash not in self.__conn_pool:
+        if self._conn is None:
             raise Exception('Not connected')
-        return self.__conn_pool[self.hash]
+        return self._conn
 
     @property
     def path(self):
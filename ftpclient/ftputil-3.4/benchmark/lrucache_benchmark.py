@@ -0,0 +1,56 @@
+# Copyright (C) 2018, ftputil contributors (see `doc/contributors.txt`)
+# See the file LICENSE for licensing terms.
+
+"""
+Measure the cost of inserting into a full `LRUCache`.
+
+For growing cache sizes, fill the cache and then time a batch of
+inserts, each of which evicts the least recently used entry. With
+O(1) eviction, the time per insert stays flat as the cache grows.
+
+Run from the directory containing the `ftputil` package:
+
+    python benchmark/lrucache_benchmark.py
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import ftputil.lrucache
+
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+# Number of inserts into the full cache per measurement
+INSERTS = 100000
+
+
+def time_per_insert(size):
+    """
+    Return the time in microseconds an insert into a full cache of
+    `size` entries takes on average.
+    """
+    cache = ftputil.lrucache.LRUCache(size)
+    for key in range(size):
+        cache["/some/path/{0}".format(key)] = key
+    keys = ["/other/path/{0}".format(key) for key in range(INSERTS)]
+    start_time = time.time()
+    for key in keys:
+        cache[key] = key
+    return (time.time() - start_time) / INSERTS * 1e6
+
+
+def main():
+    print("{0:>10}  {1:>12}".format("size", "us/insert"))
+    for size in SIZES:
+        print("{0:>10}  {1:>12.2f}".format(size, time_per_insert(size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Copyright (C) 2018, ftputil contributors (see `doc/contributors.txt`)
+# See the file LICENSE for licensing terms.
+
+"""
+Measure the memory taken by the stat results of a synthetic Unix
+directory listing and the time to access their `st_mode` and
+`st_size` attributes.
+
+Run from the directory containing the `ftputil` package (needs
+Python 3.4 or later for `tracemalloc`):
+
+    python benchmark/stat_result_benchmark.py
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import ftputil.stat
+
+from parser_benchmark import LINE_COUNT, REPEAT, listing
+
+
+def main():
+    lines = listing(LINE_COUNT)
+    parser = ftputil.stat.UnixParser()
+    gc.collect()
+    tracemalloc.start()
+    stat_results = list(parser.parse_lines(lines))
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("Memory per entry:   {0:6.0f} bytes".
+          format(memory / len(stat_results)))
+    best_duration = None
+    for _ in range(REPEAT):
+        start_time = time.time()
+        for stat_result in stat_results:
+            stat_result.st_mode
+            stat_result.st_size
+        duration = time.time() - start_time
+        if best_duration is None or duration < best_duration:
+            best_duration = duration
+    print("st_mode + st_size:  {0:6.0f} ns".
+          format(best_duration / len(stat_results) * 1e9))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,785 @@
+# Copyright (C) 2018, ftputil contributors (see `doc/contributors.txt`)
+# See the file LICENSE for licensing terms.
+
+"""
+async_host.py - `FTPHost`-like access to FTP servers with `asyncio`
+
+`AsyncFTPHost` talks FTP over `asyncio` streams instead of `ftplib`,
+so one thread can drive many control and data connections at once:
+
+    async with AsyncFTPHost("ftp.domain.com", "me", "secret") as host:
+        names = await host.listdir("/pub")
+        await asyncio.gather(*[host.download("/pub/" + name, name)
+                               for name in names])
+
+This module needs Python 3.6 or later and therefore isn't imported
+by the `ftputil` package itself.
+"""
+
+import asyncio
+import ftplib
+import math
+import posixpath
+import re
+import stat
+import sys
+
+import ftputil.capabilities
+import ftputil.error
+import ftputil.stat
+import ftputil.stat_cache
+import ftputil.tool
+
+
+__all__ = ["AsyncFTPHost", "AsyncFTPFile"]
+
+
+# Size of the chunks for `upload` and `download`
+_CHUNK_SIZE = 64 * 1024
+
+
+def _error_for_reply(reply):
+    """Return the `FTPOSError` for the error `reply` from the server."""
+    if reply.startswith("4"):
+        return ftputil.error.TemporaryError(reply)
+    if reply.startswith("502"):
+        return ftputil.error.CommandNotImplementedError(reply)
+    return ftputil.error.PermanentError(reply)
+
+
+class _AsyncSession(object):
+    """
+    A control connection to an FTP server.
+
+    Like `ftplib.FTP`, a session can only handle one command (and
+    data transfer) at a time.
+    """
+
+    def __init__(self, host, port, encoding, timeout):
+        self._host = host
+        self._port = port
+        self._encoding = encoding
+        self._timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    async def _with_timeout(self, awaitable):
+        try:
+            return await asyncio.wait_for(awaitable, self._timeout)
+        except (OSError, asyncio.TimeoutError, EOFError) as exc:
+            raise ftputil.error.FTPOSError(str(exc) or "timed out",
+                                           original_exception=exc)
+
+    async def connect(self, user, password):
+        """Connect to the server and log in."""
+        self._reader, self._writer = await self._with_timeout(
+                                       asyncio.open_connection(self._host,
+                                                               self._port))
+        await self.response()
+        reply = await self.command("USER " + user)
+        if reply.startswith("3"):
+            await self.command("PASS " + password)
+
+    async def _read_line(self):
+        line = await self._with_timeout(self._reader.readline())
+        if not line:
+            raise ftputil.error.FTPOSError("connection closed by server")
+        return line.decode(self._encoding).rstrip("\r\n")
+
+    async def response(self):
+        """
+        Return the next reply from the server, with all lines of a
+        multi-line reply. Raise an `FTPOSError` for 4xx and 5xx
+        replies.
+        """
+        line = await self._read_line()
+        lines = [line]
+        if line[3:4] == "-":
+            # Multi-line reply, see RFC 959
+            end = line[:3] + " "
+            while not (line.startswith(end)):
+                line = await self._read_line()
+                lines.append(line)
+        reply = "\n".join(lines)
+        if reply[:1] in ("4", "5"):
+            raise _error_for_reply(reply)
+        return reply
+
+    async def command(self, command):
+        """Send the FTP `command` and return the reply."""
+        self._writer.write(command.encode(self._encoding) + b"\r\n")
+        await self._with_timeout(self._writer.drain())
+        return await self.response()
+
+    async def _passive_address(self):
+        """Return `(host, port)` for a passive data connection."""
+        try:
+            reply = await self.command("EPSV")
+        except ftputil.error.PermanentError:
+            reply = await self.command("PASV")
+            try:
+                _, port = ftplib.parse227(reply)
+            except ftplib.Error as exc:
+                raise ftputil.error.FTPOSError(str(exc),
+                                               original_exception=exc)
+        else:
+            match = re.search(r"\((.)\1\1(\d+)\1\)", reply)
+            if match is None:
+                raise ftputil.error.FTPOSError(
+                        "invalid EPSV reply {0!r}".format(reply))
+            port = int(match.group(2))
+        # Like `ftplib`, don't trust the address in a `PASV` reply.
+        return self._writer.get_extra_info("peername")[0], port
+
+    async def open_data(self, command, type_="I", rest=None):
+        """
+        Send the transfer `command` (e. g. `RETR path`) and return
+        the `(reader, writer)` pair of its data connection.
+        """
+        await self.command("TYPE " + type_)
+        host, port = await self._passive_address()
+        data_reader, data_writer = await self._with_timeout(
+                                     asyncio.open_connection(host, port))
+        try:
+            if rest is not None:
+                await self.command("REST {0:d}".format(rest))
+            await self.command(command)
+        except BaseException:
+            data_writer.close()
+            raise
+        return data_reader, data_writer
+
+    def close(self):
+        """Close the control connection without saying goodbye."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def quit(self):
+        """Say goodbye to the server and close the connection."""
+        try:
+            await self.command("QUIT")
+        except ftputil.error.FTPError:
+            pass
+        finally:
+            self.close()
+
+
+class AsyncFTPFile(object):
+    """
+    A remote file opened with `AsyncFTPHost.open`, readable or
+    writable in binary mode. Close it (or use it in an `async with`
+    statement) to finish the transfer and give the connection back
+    to the host.
+    """
+
+    def __init__(self, host, session, reader, writer, mode):
+        self._host = host
+        self._session = session
+        self._reader = reader
+        self._writer = writer
+        self.mode = mode
+        self.closed = False
+
+    async def read(self, size=-1):
+        """
+        Read and return up to `size` bytes, or all bytes until the
+        end of the file if `size` is negative.
+        """
+        return await self._reader.read(size)
+
+    async def write(self, data):
+        """Write the bytes `data`."""
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def close(self):
+        """Finish the transfer."""
+        if self.closed:
+            return
+        self.closed = True
+        discard = True
+        try:
+            if self._writer.can_write_eof():
+                self._writer.write_eof()
+            self._writer.close()
+            try:
+                await self._session.response()
+            except ftputil.error.FTPOSError as exc:
+                # Aborted transfers when a file is closed before the
+                # end, see `FTPFile.close`.
+                if exc.strerror[:3] not in ("426", "450", "451"):
+                    raise
+            discard = False
+        finally:
+            self._host._release(self._session, discard)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+
+class _Lease(object):
+    """
+    Asynchronous context manager for a session of an `AsyncFTPHost`.
+    A session which had an error other than an error reply from the
+    server is closed instead of being reused.
+    """
+
+    def __init__(self, host):
+        self._host = host
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = await self._host._acquire()
+        return self._session
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        discard = (exc_type is not None and
+                   not (isinstance(exc_value, ftputil.error.FTPOSError) and
+                        exc_value.errno is not None))
+        self._host._release(self._session, discard)
+        return False
+
+
+class AsyncFTPHost(object):
+    """
+    FTP host class for `asyncio`, with coroutine methods similar to
+    those of `FTPHost`.
+
+    Each command uses a control connection (session) of its own, so
+    many commands and transfers can run at the same time, up to
+    `max_sessions` connections to the server. Sessions are kept for
+    reuse until `close` is called.
+
+    Stat results are cached in `stat_cache`, a `StatCache` like
+    that of `FTPHost`, and the directory listings are parsed with
+    the parsers from `ftputil.stat`.
+    """
+
+    def __init__(self, host, user="anonymous", password="", port=21,
+                 max_sessions=8, encoding=ftputil.tool.LOSSLESS_ENCODING,
+                 timeout=None):
+        self._address = (host, port)
+        self._credentials = (user, password)
+        self._encoding = encoding
+        self._timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_sessions)
+        self._idle_sessions = []
+        self._capabilities = None
+        self._cwd = None
+        self._parser = ftputil.stat.UnixParser()
+        # Allow one chance to switch to another parser, like `_Stat`.
+        self._allow_parser_switching = True
+        self._time_shift = 0.0
+        self.stat_cache = ftputil.stat_cache.StatCache()
+        self.use_list_a_option = True
+        self.closed = True
+
+    #
+    # Sessions
+    #
+    async def _acquire(self):
+        """Return an idle or a new session."""
+        await self._semaphore.acquire()
+        # From here on, the semaphore must be released on errors.
+        try:
+            if self._idle_sessions:
+                return self._idle_sessions.pop()
+            session = _AsyncSession(self._address[0], self._address[1],
+                                    self._encoding, self._timeout)
+            try:
+                await session.connect(*self._credentials)
+            except BaseException:
+                session.close()
+                raise
+            return session
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def _release(self, session, discard=False):
+        """Return `session` for reuse, or close it if `discard` is true."""
+        if discard or self.closed:
+            session.close()
+        else:
+            self._idle_sessions.append(session)
+        self._semaphore.release()
+
+    def _session(self):
+        """
+        Return an asynchronous context manager for a session, e. g.
+
+            async with self._session() as session:
+                await session.command("NOOP")
+        """
+        return _Lease(self)
+
+    async def _command(self, command):
+        """Send `command` with any session and return the reply."""
+        async with self._session() as session:
+            return await session.command(command)
+
+    #
+    # Connecting and disconnecting
+    #
+    async def connect(self):
+        """
+        Log in to the server and find out the login directory and
+        the features of the server.
+        """
+        self.closed = False
+        try:
+            reply = await self._command("PWD")
+            match = re.search(r'"((?:[^"]|"")*)"', reply)
+            if match is None:
+                raise ftputil.error.FTPOSError(
+                        "invalid PWD reply {0!r}".format(reply))
+            self._cwd = posixpath.normpath(match.group(1).replace('""', '"'))
+            await self.capabilities()
+        except BaseException:
+            await self.close()
+            raise
+
+    async def close(self):
+        """Close all sessions."""
+        self.closed = True
+        sessions, self._idle_sessions = self._idle_sessions, []
+        await asyncio.gather(*[session.quit() for session in sessions])
+        self.stat_cache.clear()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    async def capabilities(self):
+        """
+        Return the `Capabilities` from the server's `FEAT` response,
+        like `FTPHost.capabilities`.
+        """
+        if self._capabilities is None:
+            try:
+                response = await self._command("FEAT")
+            except ftputil.error.PermanentError:
+                response = ""
+            self._capabilities = ftputil.capabilities.Capabilities.\
+                                   from_feat_response(response)
+            if self._capabilities.mlst and self._allow_parser_switching:
+                self._parser = ftputil.stat.MLSDParser()
+                self._allow_parser_switching = False
+        return self._capabilities
+
+    def set_parser(self, parser):
+        """Set the parser for directory listings, like `FTPHost`."""
+        self._parser = parser
+        self._allow_parser_switching = False
+        self.stat_cache.clear()
+
+    def set_time_shift(self, time_shift):
+        """
+        Set the time shift value, i. e. the time difference between
+        the server and the client in seconds (see `FTPHost`).
+        """
+        self._time_shift = time_shift
+
+    def time_shift(self):
+        """Return the time shift between FTP server and client."""
+        return self._time_shift
+
+    def _uses_mlsd(self):
+        return isinstance(self._parser, ftputil.stat.MLSDParser)
+
+    #
+    # Paths
+    #
+    def getcwd(self):
+        """Return the current directory on the client side."""
+        return self._cwd
+
+    async def chdir(self, path):
+        """
+        Change the directory that relative paths refer to. As the
+        sessions use absolute paths, this doesn't change the current
+        directory of any session.
+        """
+        path = self._abspath(path)
+        if not await self.isdir(path):
+            raise ftputil.error.PermanentError(
+                    "550 {0}: no such directory".format(path))
+        self._cwd = path
+
+    def _abspath(self, path):
+        path = ftputil.tool.as_unicode(path)
+        return posixpath.normpath(posixpath.join(self._cwd, path))
+
+    #
+    # Directory listings and stat results
+    #
+    async def _listing_lines(self, path):
+        """Return the lines of the listing of the directory `path`."""
+        async with self._session() as session:
+            if self._uses_mlsd():
+                command = "MLSD " + path
+            else:
+                # List the current directory, which also works for
+                # paths with whitespace.
+                await session.command("CWD " + path)
+                command = "LIST -a" if self.use_list_a_option else "LIST"
+            reader, writer = await session.open_data(command, type_="A")
+            try:
+                data = await reader.read()
+            finally:
+                writer.close()
+            await session.response()
+        return data.decode(self._encoding).splitlines()
+
+    def _parse_listing(self, path, lines):
+        """
+        Return the stat results from the listing `lines` of the
+        directory `path` and store them in the cache.
+        """
+        try:
+            stat_results = list(self._parser.parse_lines(lines,
+                                                         self._time_shift))
+        except ftputil.error.ParserError:
+            if not self._allow_parser_switching:
+                raise
+            self._allow_parser_switching = False
+            self._parser = ftputil.stat.MSParser()
+            stat_results = list(self._parser.parse_lines(lines,
+                                                         self._time_shift))
+        stat_results = [stat_result for stat_result in stat_results
+                        if stat_result._st_name not in (".", "..")]
+        if stat_results:
+            self._allow_parser_switching = False
+        cache = self.stat_cache
+        if cache._enabled and len(stat_results) >= cache.size:
+            cache.resize(int(math.ceil(1.1 * len(stat_results))))
+        for stat_result in stat_results:
+            cache[posixpath.join(path, stat_result._st_name)] = stat_result
+        cache.mark_listed(path, names=[stat_result._st_name
+                                       for stat_result in stat_results])
+        return stat_results
+
+    async def _listdir_stat_results(self, path):
+        path = self._abspath(path)
+        try:
+            return self.stat_cache.listing(path)
+        except ftputil.error.CacheMissError:
+            pass
+        # No `isdir` check; it would list the parent directory and so
+        # on up to the root directory. `CWD` before `LIST` fails for
+        # anything but directories, and so does `MLSD` (RFC 3659).
+        return self._parse_listing(path, await self._listing_lines(path))
+
+    async def listdir(self, path):
+        """
+        Return a list of directories, files etc. in the directory
+        named `path`.
+        """
+        return [stat_result._st_name
+                for stat_result in await self._listdir_stat_results(path)]
+
+    async def listdir_stat(self, path):
+        """
+        Return a list of `(name, stat_result)` pairs for the items in
+        the directory `path`, from a single listing, like
+        `FTPHost.listdir_stat`.
+        """
+        return [(stat_result._st_name, stat_result)
+                for stat_result in await self._listdir_stat_results(path)]
+
+    async def _lstat(self, path, exception_for_missing_path):
+        path = self._abspath(path)
+        try:
+            return self.stat_cache[path]
+        except ftputil.error.CacheMissError:
+            pass
+        if self.stat_cache.is_missing(path):
+            if exception_for_missing_path:
+                raise ftputil.error.PermanentError(
+                      "550 {0}: no such file or directory".format(path))
+            return None
+        if self._uses_mlsd():
+            try:
+                reply = await self._command("MLST " + path)
+            except ftputil.error.PermanentError:
+                if exception_for_missing_path:
+                    raise
+                return None
+            # The facts line is the one starting with a space.
+            for line in reply.splitlines():
+                if line.startswith(" "):
+                    break
+            else:
+                raise ftputil.error.ParserError(
+                        "no facts in MLST response {0!r}".format(reply))
+            stat_result = self._parser.parse_line(line[1:], self._time_shift)
+            stat_result._st_name = posixpath.basename(path)
+            self.stat_cache[path] = stat_result
+            return stat_result
+        if path == "/":
+            raise ftputil.error.RootDirError(
+                  "can't stat remote root directory")
+        dirname, basename = posixpath.split(path)
+        try:
+            stat_results = await self._listdir_stat_results(dirname)
+        except ftputil.error.PermanentError:
+            if exception_for_missing_path:
+                raise
+            return None
+        for stat_result in stat_results:
+            if stat_result._st_name == basename:
+                return stat_result
+        if exception_for_missing_path:
+            raise ftputil.error.PermanentError(
+                  "550 {0}: no such file or directory".format(path))
+        return None
+
+    async def _stat(self, path, exception_for_missing_path):
+        original_path = path
+        visited_paths = set()
+        while True:
+            lstat_result = await self._lstat(path, exception_for_missing_path)
+            if lstat_result is None:
+                return None
+            if (not stat.S_ISLNK(lstat_result.st_mode) or
+                lstat_result._st_target is None):
+                return lstat_result
+            dirname = posixpath.dirname(self._abspath(path))
+            path = self._abspath(posixpath.join(dirname,
+                                                lstat_result._st_target))
+            if path in visited_paths:
+                raise ftputil.error.RecursiveLinksError(
+                  "recursive link structure detected for remote path '{0}'".
+                  format(original_path))
+            visited_paths.add(path)
+
+    async def lstat(self, path):
+        """Return the stat result for `path`, without following links."""
+        return await self._lstat(path, True)
+
+    async def stat(self, path):
+        """Return the stat result for `path`, following links."""
+        return await self._stat(path, True)
+
+    async def exists(self, path):
+        """Return true if `path` exists (links are followed)."""
+        return await self._stat(path, False) is not None
+
+    async def isdir(self, path):
+        """Return true if `path` is a directory or a link to one."""
+        path = self._abspath(path)
+        # The root directory can't be stat'ed without `MLST`.
+        if path == "/":
+            return True
+        stat_result = await self._stat(path, False)
+        return stat_result is not None and stat.S_ISDIR(stat_result.st_mode)
+
+    async def isfile(self, path):
+        """Return true if `path` is a regular file or a link to one."""
+        stat_result = await self._stat(path, False)
+        return stat_result is not None and stat.S_ISREG(stat_result.st_mode)
+
+    async def islink(self, path):
+        """Return true if `path` is a link."""
+        stat_result = await self._lstat(path, False)
+        return stat_result is not None and stat.S_ISLNK(stat_result.st_mode)
+
+    async def walk(self, top, topdown=True, onerror=None, followlinks=False):
+        """
+        Iterate over the directory tree like `FTPHost.walk` (use
+        `async for`), yielding `(dirpath, dirnames, filenames)`
+        tuples.
+
+        After `dirpath` has been yielded (with `topdown`) or listed,
+        its subdirectories are listed at the same time, as far as
+        `max_sessions` allows.
+        """
+        try:
+            stat_results = await self._listdir_stat_results(top)
+        except ftputil.error.FTPOSError as exc:
+            if onerror is not None:
+                onerror(exc)
+            return
+        dirs, nondirs = [], []
+        for stat_result in stat_results:
+            name = stat_result._st_name
+            if stat.S_ISLNK(stat_result.st_mode):
+                is_dir = await self.isdir(posixpath.join(top, name))
+            else:
+                is_dir = stat.S_ISDIR(stat_result.st_mode)
+            (dirs if is_dir else nondirs).append(name)
+        if topdown:
+            yield top, dirs, nondirs
+        paths = []
+        for name in dirs:
+            path = posixpath.join(top, name)
+            if followlinks or not await self.islink(path):
+                paths.append(path)
+        # The listings end up in the cache, where the recursive calls
+        # find them.
+        prefetches = {}
+        if self.stat_cache._enabled:
+            prefetches = dict((path, asyncio.ensure_future(
+                                       self._prefetch(path)))
+                              for path in paths)
+        try:
+            for path in paths:
+                if path in prefetches:
+                    await prefetches.pop(path)
+                async for item in self.walk(path, topdown, onerror,
+                                            followlinks):
+                    yield item
+        finally:
+            for prefetch in prefetches.values():
+                prefetch.cancel()
+        if not topdown:
+            yield top, dirs, nondirs
+
+    async def _prefetch(self, path):
+        try:
+            await self._listdir_stat_results(path)
+        except ftputil.error.FTPError:
+            # The recursive `walk` call lists the directory again and
+            # passes the error to `onerror`.
+            pass
+
+    #
+    # Changing things on the server
+    #
+    async def mkdir(self, path):
+        """Make the directory `path`."""
+        path = self._abspath(path)
+        await self._command("MKD " + path)
+        self.stat_cache.invalidate(path)
+
+    async def rmdir(self, path):
+        """Remove the empty directory `path`."""
+        path = self._abspath(path)
+        await self._command("RMD " + path)
+        self.stat_cache.invalidate_subtree(path)
+
+    async def remove(self, path):
+        """Remove the file or link `path`."""
+        path = self._abspath(path)
+        await self._command("DELE " + path)
+        self.stat_cache.invalidate(path)
+
+    unlink = remove
+
+    async def rename(self, source, target):
+        """Rename `source` to `target`."""
+        source = self._abspath(source)
+        target = self._abspath(target)
+        async with self._session() as session:
+            await session.command("RNFR " + source)
+            await session.command("RNTO " + target)
+        self.stat_cache.move_subtree(source, target)
+
+    async def rmtree(self, path, ignore_errors=False, onerror=None):
+        """
+        Remove the directory tree `path`, like `FTPHost.rmtree`. The
+        entries of each directory are removed at the same time.
+        """
+        path = self._abspath(path)
+        if ignore_errors:
+            def onerror(*args):
+                """Ignore the error."""
+                pass
+        elif onerror is None:
+            def onerror(*args):
+                """Re-raise the error."""
+                raise
+        try:
+            stat_results = await self._listdir_stat_results(path)
+        except ftputil.error.PermanentError:
+            onerror(self.listdir, path, sys.exc_info())
+            stat_results = []
+
+        async def remove_entry(stat_result):
+            full_name = posixpath.join(path, stat_result._st_name)
+            if stat.S_ISDIR(stat_result.st_mode):
+                await self.rmtree(full_name, ignore_errors, onerror)
+                return
+            try:
+                await self.remove(full_name)
+            except ftputil.error.PermanentError:
+                onerror(self.remove, full_name, sys.exc_info())
+
+        results = await asyncio.gather(
+                    *[remove_entry(stat_result)
+                      for stat_result in stat_results],
+                    return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        try:
+            await self.rmdir(path)
+        except ftputil.error.FTPOSError:
+            onerror(self.rmdir, path, sys.exc_info())
+
+    #
+    # Files
+    #
+    async def open(self, path, mode="rb", rest=None):
+        """
+        Return an `AsyncFTPFile` for the remote file `path`. `mode`
+        is "rb" or "wb"; `rest` is the byte position at which reading
+        or writing starts.
+        """
+        if mode not in ("rb", "wb"):
+            raise ftputil.error.FTPIOError(
+                    "invalid mode '{0}', use 'rb' or 'wb'".format(mode))
+        path = self._abspath(path)
+        command = ("RETR " if mode == "rb" else "STOR ") + path
+        session = await self._acquire()
+        try:
+            reader, writer = await session.open_data(command, rest=rest)
+        except ftputil.error.FTPOSError as exc:
+            self._release(session, discard=exc.errno is None)
+            raise ftputil.error.FTPIOError(exc.strerror,
+                                           original_exception=exc)
+        except BaseException:
+            self._release(session, discard=True)
+            raise
+        if mode == "wb":
+            self.stat_cache.invalidate(path)
+        return AsyncFTPFile(self, session, reader, writer, mode)
+
+    async def upload(self, source, target, callback=None):
+        """
+        Upload the local file `source` to the remote file `target`.
+        `callback` is called with each chunk of data.
+        """
+        with open(source, "rb") as source_file:
+            async with await self.open(target, "wb") as target_file:
+                while True:
+                    chunk = source_file.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await target_file.write(chunk)
+                    if callback is not None:
+                        callback(chunk)
+
+    async def download(self, source, target, callback=None):
+        """
+        Download the remote file `source` to the local file `target`.
+        `callback` is called with each chunk of data.
+        """
+        async with await self.open(source, "rb") as source_file:
+            with open(target, "wb") as target_file:
+                while True:
+                    chunk = await source_file.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target_file.write(chunk)
+                    if callback is not None:
+                        callback(chunk)
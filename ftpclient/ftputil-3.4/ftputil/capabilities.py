@@ -0,0 +1,151 @@
+# Copyright (C) 2018, ftputil contributors (see `doc/contributors.txt`)
+# See the file LICENSE for licensing terms.
+
+"""
+ftputil.capabilities - features announced by FTP servers
+"""
+
+from __future__ import unicode_literals
+
+import ftputil.tool
+
+
+__all__ = ["Capabilities"]
+
+
+# Non-standard commands for checksums, by hash algorithm. They are
+# announced as features of their own, e. g. `XMD5`.
+_HASH_COMMANDS = {
+  "MD5": "XMD5",
+  "SHA-1": "XSHA1",
+  "SHA-256": "XSHA256",
+  "SHA-512": "XSHA512",
+  "CRC32": "XCRC",
+}
+
+
+class Capabilities(object):
+    """
+    The features of an FTP server, as announced in its `FEAT`
+    response (RFC 2389).
+
+    Test for a feature with `"SIZE" in capabilities` or one of the
+    properties, e. g. `capabilities.size`. Feature names are
+    upper-case. `as_dict` returns a dictionary of the features and
+    their parameters which can be stored (e. g. as JSON) and passed
+    to the constructor again.
+    """
+
+    def __init__(self, features=None):
+        self._features = {}
+        for name, parameters in (features or {}).items():
+            self._features[ftputil.tool.as_unicode(name).upper()] = \
+              ftputil.tool.as_unicode(parameters)
+
+    @classmethod
+    def from_feat_response(cls, response):
+        """
+        Return the capabilities from the `FEAT` response `response`
+        (a string). An empty response means no features.
+        """
+        features = {}
+        # Feature lines are the ones starting with a space, see
+        # RFC 2389.
+        for line in ftputil.tool.as_unicode(response).splitlines():
+            if line.startswith(" ") and line.strip():
+                name, _, parameters = line.strip().partition(" ")
+                features[name] = parameters
+        return cls(features)
+
+    def __contains__(self, name):
+        return name.upper() in self._features
+
+    def __eq__(self, other):
+        return isinstance(other, Capabilities) and \
+               self._features == other._features
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "<{0} {1}>".format(self.__class__.__name__,
+                                  " ".join(sorted(self._features)))
+
+    def parameters(self, name):
+        """
+        Return the parameters of the feature `name` (an empty string
+        if it has none), or `None` if the server doesn't support it.
+        """
+        return self._features.get(name.upper())
+
+    def as_dict(self):
+        """Return a dictionary of the feature names and parameters."""
+        return dict(self._features)
+
+    #
+    # Features used by ftputil
+    #
+    @property
+    def mlst(self):
+        """
+        Whether the server supports `MLST` and `MLSD` (RFC 3659
+        announces both as `MLST`).
+        """
+        return "MLST" in self
+
+    @property
+    def size(self):
+        """Whether the server supports the `SIZE` command."""
+        return "SIZE" in self
+
+    @property
+    def mdtm(self):
+        """Whether the server supports the `MDTM` command."""
+        return "MDTM" in self
+
+    @property
+    def rest_stream(self):
+        """
+        Whether the server supports `REST` for stream mode transfers,
+        i. e. starting a download at an offset.
+        """
+        parameters = self.parameters("REST")
+        return parameters is not None and \
+               "STREAM" in parameters.upper().split()
+
+    @property
+    def utf8(self):
+        """Whether the server supports UTF-8 encoded paths."""
+        return "UTF8" in self
+
+    @property
+    def epsv(self):
+        """
+        Whether the server announces `EPSV` (RFC 2428). Many servers
+        support `EPSV` without announcing it.
+        """
+        return "EPSV" in self
+
+    def mlst_facts(self):
+        """
+        Return the lower-case names of the facts the server can
+        give in `MLST` and `MLSD` responses, e. g. `["type", "size"]`.
+        """
+        parameters = self.parameters("MLST") or ""
+        return [fact.rstrip("*").lower()
+                for fact in parameters.split(";") if fact]
+
+    def hash_algorithms(self):
+        """
+        Return the names of the hash algorithms the server can
+        compute checksums with, from the `HASH` feature and the
+        non-standard commands like `XMD5`, e. g. `["SHA-1", "MD5"]`.
+        """
+        algorithms = [algorithm.rstrip("*").upper()
+                      for algorithm in
+                      (self.parameters("HASH") or "").split(";")
+                      if algorithm]
+        for algorithm, command in sorted(_HASH_COMMANDS.items()):
+            if command in self and algorithm not in algorithms:
+                algorithms.append(algorithm)
+        return algorithms
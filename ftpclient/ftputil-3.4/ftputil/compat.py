@@ -16,7 +16,7 @@ import sys
 
 
 __all__ = ["int_types", "unicode_type", "bytes_type", "bytes_from_ints",
-           "default_string_type"]
+           "intern_string", "default_string_type"]
 
 
 python_version = sys.version_info[0]
@@ -33,6 +33,15 @@ if python_version == 2:
         """Return a `bytes` object from a list of integers."""
         return b"".join((chr(i) for i in int_list))
 
+    # The `intern` builtin doesn't accept unicode strings.
+    _interned_strings = {}
+
+    def intern_string(string):
+        """
+        Return a shared object equal to the unicode string `string`.
+        """
+        return _interned_strings.setdefault(string, string)
+
 else:
 
     int_types = (int,)
@@ -42,5 +51,7 @@ else:
 
     bytes_from_ints = bytes
 
+    intern_string = sys.intern
+
 # For Python 2 `str` means byte strings, for Python 3 unicode strings.
 default_string_type = str
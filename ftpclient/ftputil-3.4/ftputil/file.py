@@ -10,6 +10,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import io
+import time
 
 import ftputil.compat
 import ftputil.error
@@ -112,6 +113,23 @@ class FTPFile(object):
         # error.
         self.closed = False
 
+    def _open_listing(self, command):
+        """
+        Send the directory listing command `command` (e. g. `LIST -a
+        /some/dir` or `MLSD`) and open its data connection, so that
+        the listing can be read as binary lines while it arrives.
+        """
+        # Listings are sent in ASCII mode, like in `ftplib.FTP.retrlines`.
+        with ftputil.error.ftplib_error_to_ftp_os_error:
+            self._session.voidcmd("TYPE A")
+            self._conn = self._session.transfercmd(command)
+        fobj = self._conn.makefile("rb")
+        if ftputil.compat.python_version == 2:
+            BufferedIOAdapter = ftputil.socket_file_adapter.BufferedIOAdapter
+            fobj = BufferedIOAdapter(fobj, is_readable=True)
+        self._fobj = fobj
+        self.closed = False
+
     def __iter__(self):
         """Return a file iterator."""
         return self
@@ -194,6 +212,10 @@ class FTPFile(object):
                 if exc.splitlines()[0] != "timed out" and \
                   error_code not in ("150", "426", "450", "451"):
                     raise
+            else:
+                # The transfer ended normally, so the session is known
+                # to work (see `FTPHost._available_child`).
+                self._host.last_used = time.time()
         finally:
             # Restore timeout for socket of `FTPFile`'s `ftplib.FTP`
             # object in case the connection is reused later.
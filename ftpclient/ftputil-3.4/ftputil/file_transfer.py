@@ -10,6 +10,7 @@ from __future__ import unicode_literals
 
 import io
 import os
+import threading
 
 import ftputil.stat
 
@@ -23,6 +24,10 @@ __all__ = []
 # Maximum size of chunk in `FTPHost.copyfileobj` in bytes.
 MAX_COPY_CHUNK_SIZE = 64 * 1024
 
+# Minimum size of a segment in segmented downloads in bytes. Smaller
+# segments aren't worth an additional connection.
+MIN_SEGMENT_SIZE = 1024 * 1024
+
 
 class LocalFile(object):
     """
@@ -158,6 +163,64 @@ def copyfileobj(source_fobj, target_fobj, max_chunk_size=MAX_COPY_CHUNK_SIZE,
             callback(chunk)
 
 
+def segment_ranges(size, segment_count):
+    """
+    Return a list of `(start, end)` byte ranges which split a file
+    of `size` bytes into at most `segment_count` segments, each of
+    them at least `MIN_SEGMENT_SIZE` bytes long (except if the whole
+    file is smaller). `end` is exclusive.
+    """
+    segment_count = max(1, min(segment_count, size // MIN_SEGMENT_SIZE))
+    segment_size = size // segment_count
+    starts = [index * segment_size for index in range(segment_count)]
+    ends = starts[1:] + [size]
+    return list(zip(starts, ends))
+
+
+# Serializes writes on platforms without `os.pwrite`.
+_write_lock = threading.Lock()
+
+def write_at(fd, data, offset):
+    """
+    Write the byte string `data` to the file descriptor `fd` at
+    `offset`, without using or changing a shared file position.
+    """
+    while data:
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(fd, data, offset)
+        else:
+            with _write_lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                written = os.write(fd, data)
+        data = data[written:]
+        offset += written
+
+
+def copy_range(source_fobj, target_fd, start, end, callback=None,
+               cancelled=None):
+    """
+    Copy the data for the byte range `start` to `end` (exclusive)
+    from the file-like object `source_fobj`, which must be positioned
+    at `start`, to the same range of the file descriptor `target_fd`.
+
+    Stop reading at `end`, even if the source has more data. Also
+    stop early if the `threading.Event` `cancelled` is set. Raise an
+    `IOError` if the source ends before `end`.
+    """
+    offset = start
+    while offset < end:
+        if cancelled is not None and cancelled.is_set():
+            return
+        chunk = source_fobj.read(min(MAX_COPY_CHUNK_SIZE, end - offset))
+        if not chunk:
+            raise IOError("premature end of data at byte {0}, expected "
+                          "{1} bytes".format(offset, end))
+        write_at(target_fd, chunk, offset)
+        offset += len(chunk)
+        if callback is not None:
+            callback(chunk)
+
+
 def copy_file(source_file, target_file, conditional, callback):
     """
     Copy a file from `source_file` to `target_file`.
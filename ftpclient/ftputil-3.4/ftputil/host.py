@@ -13,14 +13,19 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import ftplib
+import io
+import os
 import stat
 import sys
+import threading
 import time
 import warnings
 
+import ftputil.capabilities
 import ftputil.error
 import ftputil.file
 import ftputil.file_transfer
+import ftputil.parallel
 import ftputil.path
 import ftputil.session_adapter
 import ftputil.stat
@@ -29,12 +34,86 @@ import ftputil.tool
 __all__ = ["FTPHost"]
 
 
+# Results of the probe for direct path support, per server, so that
+# each server is probed only once per process. See
+# `FTPHost._uses_direct_paths`.
+_direct_path_support = {}
+
+# Capabilities from the `FEAT` responses, per server, so that each
+# server is asked only once per process. See `FTPHost.capabilities`.
+_server_capabilities = {}
+
+
 # The "protected" attributes PyLint talks about aren't intended for
 # clients of the library. `FTPHost` objects need to use some of these
 # library-internal attributes though.
 # pylint: disable=protected-access
 
 
+#####################################################################
+# Child sessions for data transfers
+
+class _ChildSession(object):
+    """
+    Additional connection of an `FTPHost` object, used for one data
+    transfer (file or directory listing) at a time.
+
+    Unlike a copy of the `FTPHost`, a child session only logs in. It
+    doesn't ask for the current directory and has neither a stat
+    cache nor a parser of its own; it uses those of its parent.
+    """
+
+    __slots__ = ("_parent", "_session", "_current_dir", "_file", "closed",
+                 "last_used", "last_verified")
+
+    def __init__(self, parent):
+        self._parent = parent
+        self._session = parent._make_session()
+        # Directory the session has been changed to with `chdir`, or
+        # `None` for the login directory
+        self._current_dir = None
+        self._file = ftputil.file.FTPFile(self)
+        self.closed = False
+        # Times when the last transfer of the child ended normally
+        # (see `FTPFile.close`) and when the connection was last known
+        # to work otherwise (see `FTPHost._available_child`)
+        self.last_used = self.last_verified = time.time()
+
+    @property
+    def stat_cache(self):
+        """The stat cache of the parent `FTPHost`."""
+        return self._parent.stat_cache
+
+    def capabilities(self):
+        """Return the `Capabilities` of the server."""
+        return self._parent.capabilities()
+
+    def time_shift(self):
+        """Return the time shift of the parent `FTPHost`."""
+        return self._parent.time_shift()
+
+    def chdir(self, path):
+        """
+        Change the directory of the session to the absolute `path`,
+        unless it's there already.
+        """
+        if path == self._current_dir:
+            return
+        with ftputil.error.ftplib_error_to_ftp_os_error:
+            self._session.cwd(path)
+        self._current_dir = path
+
+    def close(self):
+        """Close the session."""
+        if self.closed:
+            return
+        try:
+            with ftputil.error.ftplib_error_to_ftp_os_error:
+                self._session.close()
+        finally:
+            self.closed = True
+
+
 #####################################################################
 # `FTPHost` class with several methods similar to those of `os`
 
@@ -72,6 +151,12 @@ class FTPHost(object):
         self._session = self._make_session()
         # Simulate `os.path`.
         self.path = ftputil.path._Path(self)
+        # Features from the server's `FEAT` response, see
+        # `capabilities`.
+        self._capabilities = None
+        # Whether the server handles paths in commands correctly, see
+        # `_uses_direct_paths`.
+        self._direct_paths = None
         # lstat, stat, listdir services.
         self._stat = ftputil.stat._Stat(self)
         self.stat_cache = self._stat._lstat_cache
@@ -79,8 +164,17 @@ class FTPHost(object):
         with ftputil.error.ftplib_error_to_ftp_os_error:
             self._cached_current_dir = \
               self.path.normpath(ftputil.tool.as_unicode(self._session.pwd()))
-        # Associated `FTPHost` objects for data transfer.
+        # Associated `_ChildSession` objects for data transfer.
         self._children = []
+        # Maximum number of children to keep, `None` for no limit
+        self.max_children = None
+        # Children used or checked within this many seconds are used
+        # again without checking their connection first.
+        self.child_verify_interval = 5.0
+        # See `child_statistics`
+        self._child_probes = 0
+        self._child_probes_saved = 0
+        self._children_reaped = 0
         # This is only set to something else than `None` if this
         # instance represents an `FTPFile`.
         self._file = None
@@ -115,6 +209,47 @@ class FTPHost(object):
             # Ignore return value.
             self._session.pwd()
 
+    def capabilities(self):
+        """
+        Return the `Capabilities` of the server, i. e. the features
+        announced in its `FEAT` response, e. g. `MLST`, `SIZE` or
+        `REST STREAM`.
+
+        The `FEAT` command is sent only once per server and process
+        (or not at all after `set_capabilities`). If the server
+        doesn't support `FEAT`, the capabilities are empty.
+        """
+        if self._capabilities is None:
+            server_key = self._server_key()
+            capabilities = _server_capabilities.get(server_key)
+            if capabilities is None:
+                try:
+                    with ftputil.error.ftplib_error_to_ftp_os_error:
+                        response = self._session.sendcmd("FEAT")
+                except ftputil.error.PermanentError:
+                    response = ""
+                capabilities = ftputil.capabilities.Capabilities.\
+                                 from_feat_response(response)
+                if server_key is not None:
+                    _server_capabilities[server_key] = capabilities
+            self._capabilities = capabilities
+        return self._capabilities
+
+    def set_capabilities(self, capabilities):
+        """
+        Use `capabilities` (a `Capabilities` object or a dictionary
+        as returned by `Capabilities.as_dict`) instead of asking the
+        server with `FEAT`, e. g. with capabilities stored from an
+        earlier session. Other `FTPHost` objects for the same server
+        in this process use them, too.
+        """
+        if not isinstance(capabilities, ftputil.capabilities.Capabilities):
+            capabilities = ftputil.capabilities.Capabilities(capabilities)
+        self._capabilities = capabilities
+        server_key = self._server_key()
+        if server_key is not None:
+            _server_capabilities[server_key] = capabilities
+
     #
     # Dealing with child sessions and file-like objects
     # (rather low-level)
@@ -142,7 +277,10 @@ class FTPHost(object):
         return session
 
     def _copy(self):
-        """Return a copy of this `FTPHost` object."""
+        """
+        Return a copy of this `FTPHost` object. For data transfers,
+        `_child` returns a lighter-weight child session instead.
+        """
         # The copy includes a new session factory return value (aka
         # session) but doesn't copy the state of `self.getcwd()`.
         return self.__class__(*self._args, **self._kwargs)
@@ -151,51 +289,108 @@ class FTPHost(object):
         """
         Return an available (i. e. one whose `_file` object is closed
         and doesn't have a timed-out server connection) child
-        (`FTPHost` object) from the pool of children or `None` if
+        (`_ChildSession` object) from the pool of children or `None` if
         there aren't any.
+
+        Children whose last transfer ended or which have been checked
+        in the last `child_verify_interval` seconds are returned
+        without checking the connection. Children with a timed-out or closed
+        connection are closed and removed from the pool.
         """
-        #TODO: Currently timed-out child sessions aren't removed and
-        # may collect over time. In very busy or long running
-        # processes, this might slow down an application because the
-        # same stale child sessions have to be processed again and
-        # again.
-        for host in self._children:
+        now = time.time()
+        for host in list(self._children):
             # Test for timeouts only after testing for a closed file:
             # - If a file isn't closed, save time; don't bother to access
             #   the remote server.
             # - If a file transfer on the child is in progress, requesting
             #   the directory is an invalid operation because of the way
             #   the FTP state machine works (see RFC 959).
-            if host._file.closed:
-                try:
-                    host._session.pwd()
-                # Under high load, a 226 status response from a
-                # previous download may arrive too late, so that it's
-                # "seen" in the `pwd` call. For now, skip the
-                # potential child session; it will be considered again
-                # when `_available_child` is called the next time.
-                except ftplib.error_reply:
-                    continue
-                # Timed-out sessions raise `error_temp`.
-                except ftplib.error_temp:
-                    continue
-                # The server may have closed the connection which may
-                # cause `host._session.getline` to raise an `EOFError`
-                # (see ticket #114).
-                except EOFError:
-                    continue
-                # Under high load, there may be a socket read timeout
-                # during the last FTP file `close` (see ticket #112).
-                # Note that a socket timeout is quite different from
-                # an FTP session timeout.
-                except OSError:
-                    continue
-                else:
-                    # Everything's ok; use this `FTPHost` instance.
-                    return host
+            if not host._file.closed:
+                continue
+            if now - max(host.last_used, host.last_verified) <= \
+               self.child_verify_interval:
+                self._child_probes_saved += 1
+                return host
+            self._child_probes += 1
+            try:
+                host._session.pwd()
+            # Under high load, a 226 status response from a
+            # previous download may arrive too late, so that it's
+            # "seen" in the `pwd` call. For now, skip the
+            # potential child session; it will be considered again
+            # when `_available_child` is called the next time.
+            except ftplib.error_reply:
+                continue
+            # Timed-out sessions raise `error_temp`.
+            # The server may have closed the connection which may
+            # cause `host._session.getline` to raise an `EOFError`
+            # (see ticket #114).
+            # Under high load, there may be a socket read timeout
+            # during the last FTP file `close` (see ticket #112).
+            # Note that a socket timeout is quite different from
+            # an FTP session timeout.
+            # In all these cases, the connection can't be used again.
+            except (ftplib.error_temp, EOFError, OSError):
+                self._reap_child(host)
+                continue
+            else:
+                # Everything's ok; use this child.
+                host.last_verified = time.time()
+                return host
         # Be explicit.
         return None
 
+    def _reap_child(self, host):
+        """Close the child `host` and remove it from the children."""
+        self._children.remove(host)
+        self._children_reaped += 1
+        try:
+            host.close()
+        except ftputil.error.FTPOSError:
+            # The connection is defunct anyway.
+            pass
+
+    def _prune_children(self, keep):
+        """
+        Close unused children, least recently used first, while there
+        are more than `max_children`. Don't close the child `keep`.
+        """
+        if self.max_children is None:
+            return
+        unused = sorted((host for host in self._children
+                         if host._file.closed and host is not keep),
+                        key=lambda host: host.last_used)
+        for host in unused:
+            if len(self._children) <= self.max_children:
+                break
+            self._reap_child(host)
+
+    def _child(self):
+        """
+        Return an available child (`_ChildSession` object) or, if
+        there isn't any, a new one which is added to the children.
+        """
+        host = self._available_child()
+        if host is None:
+            host = _ChildSession(self)
+            self._children.append(host)
+            self._prune_children(keep=host)
+        return host
+
+    def child_statistics(self):
+        """
+        Return a dictionary with the number of `children` (additional
+        connections for transfers, see `open`), how often an unused
+        child's connection was checked (`probes`) or used again without
+        a check (`probes_saved`), and how many children were closed
+        because their connection was dead or there were more than
+        `max_children` (`reaped`).
+        """
+        return {"children": len(self._children),
+                "probes": self._child_probes,
+                "probes_saved": self._child_probes_saved,
+                "reaped": self._children_reaped}
+
     def open(self, path, mode="r", buffering=None, encoding=None, errors=None,
              newline=None, rest=None):
         """
@@ -215,21 +410,18 @@ class FTPHost(object):
         # Support the same arguments as `io.open`.
         # pylint: disable=too-many-arguments
         path = ftputil.tool.as_unicode(path)
-        host = self._available_child()
-        if host is None:
-            host = self._copy()
-            self._children.append(host)
-            host._file = ftputil.file.FTPFile(host)
+        host = self._child()
         basedir = self.getcwd()
         # Prepare for changing the directory (see whitespace workaround
         # in method `_dir`).
-        if host.path.isabs(path):
+        if self.path.isabs(path):
             effective_path = path
         else:
-            effective_path = host.path.join(basedir, path)
-        effective_dir, effective_file = host.path.split(effective_path)
+            effective_path = self.path.join(basedir, path)
+        effective_dir, effective_file = self.path.split(effective_path)
         try:
             # This will fail if the directory isn't accessible at all.
+            # A reused child may be in the directory already.
             host.chdir(effective_dir)
         except ftputil.error.PermanentError:
             # Similarly to a failed `file` in a local file system,
@@ -521,7 +713,79 @@ class FTPHost(object):
         target_file = ftputil.file_transfer.LocalFile(target_path, "wb")
         return source_file, target_file
 
-    def download(self, source, target, callback=None):
+    def _download_segments(self, source, target, ranges, callback):
+        """
+        Download the byte `ranges` of the remote file `source` in
+        parallel into the local file `target`, each range over its
+        own child session.
+
+        Return `False` without writing `target` if the server refuses
+        to start a transfer at an offset, else `True`.
+        """
+        # Open all remote files in this thread; `FTPHost` objects
+        # aren't thread-safe. Each `open` call uses another child
+        # because the files opened before aren't closed yet.
+        remote_files = []
+        errors = []
+        try:
+            for start, _ in ranges:
+                try:
+                    remote_files.append(self.open(source, "rb",
+                                                  rest=start or None))
+                except ftputil.error.FTPIOError:
+                    # Errors for the file itself come from the first
+                    # segment, which doesn't use `REST`.
+                    if not start:
+                        raise
+                    return False
+            # Preallocate the local file, then write each segment at
+            # its offset.
+            with io.open(target, "wb") as target_fobj:
+                target_fobj.truncate(ranges[-1][1])
+            target_fd = os.open(target,
+                                os.O_WRONLY | getattr(os, "O_BINARY", 0))
+            try:
+                callback_lock = threading.Lock()
+                def locked_callback(chunk):
+                    """Call `callback` from one thread at a time."""
+                    with callback_lock:
+                        callback(chunk)
+                # Tell the other segments to stop if one of them fails.
+                cancelled = threading.Event()
+                def copy_segment(remote_file, start, end):
+                    """Thread function."""
+                    try:
+                        ftputil.file_transfer.copy_range(
+                          remote_file, target_fd, start, end,
+                          locked_callback if callback else None, cancelled)
+                        # Closing the file before the end of the remote
+                        # file aborts the transfer.
+                        remote_file.close()
+                    except Exception as exc:
+                        errors.append(exc)
+                        cancelled.set()
+                threads = [threading.Thread(target=copy_segment,
+                                            args=(remote_file, start, end))
+                           for remote_file, (start, end)
+                           in zip(remote_files, ranges)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                os.close(target_fd)
+        finally:
+            # Files of failed segments are still open.
+            for remote_file in remote_files:
+                try:
+                    remote_file.close()
+                except ftputil.error.FTPIOError:
+                    pass
+        if errors:
+            raise errors[0]
+        return True
+
+    def download(self, source, target, callback=None, segments=1):
         """
         Download a file from the remote source (name) to the local
         target (name).
@@ -531,8 +795,26 @@ class FTPHost(object):
         defined in `file_transfer`. The callback will be called with a
         single argument, the data chunk that was transferred before
         the callback was called.
+
+        If `segments` is greater than 1, split the file into up to
+        this many parts and download them in parallel, each over its
+        own connection (starting at an offset via the `REST`
+        command). This can speed up downloads over high-latency
+        connections. Segments are at least
+        `ftputil.file_transfer.MIN_SEGMENT_SIZE` bytes large, so small
+        files are downloaded over a single connection, and so are all
+        files if the server doesn't announce `REST STREAM` in its
+        `FEAT` response or refuses a `REST` command. If `callback`
+        is given, it's called from the download threads, but not
+        concurrently.
         """
         source = ftputil.tool.as_unicode(source)
+        if segments > 1 and self.capabilities().rest_stream:
+            ranges = ftputil.file_transfer.segment_ranges(
+                       self.path.getsize(source), segments)
+            if len(ranges) > 1 and \
+               self._download_segments(source, target, ranges, callback):
+                return
         source_file, target_file = self._download_files(source, target)
         ftputil.file_transfer.copy_file(source_file, target_file,
                                         conditional=False, callback=callback)
@@ -577,6 +859,90 @@ class FTPHost(object):
                     "directory '{0}' is not accessible".
                     format(presumable_login_dir))
 
+    def _server_key(self):
+        """
+        Return a hashable value identifying the server of this
+        `FTPHost` object, or `None` if the session doesn't tell.
+        """
+        host = getattr(self._session, "host", None)
+        if not host:
+            return None
+        return (host, getattr(self._session, "port", None))
+
+    def _probe_direct_paths(self):
+        """
+        Return true if the server lists the current directory the
+        same when given its absolute path as after changing into it.
+
+        Some servers yield strange results if the path of a command
+        isn't in the current directory, or give recursive listings
+        for some paths (see `_robust_ftp_command`).
+        """
+        directory = self.getcwd()
+        if any(char.isspace() for char in directory):
+            # Can't tell.
+            return False
+        def listing(path):
+            """Return the listing lines for `path`."""
+            lines = []
+            def callback(line):
+                """Callback function."""
+                lines.append(ftputil.tool.as_unicode(line))
+            with ftputil.error.ftplib_error_to_ftp_os_error:
+                if self.use_list_a_option:
+                    self._session.dir("-a", path, callback)
+                else:
+                    self._session.dir(path, callback)
+            return lines
+        try:
+            direct_lines = listing(directory)
+            self.chdir(directory)
+            lines = listing("")
+        except ftputil.error.FTPOSError:
+            return False
+        return direct_lines == lines
+
+    def _uses_direct_paths(self, path):
+        """
+        Return true if commands on `path` can use the absolute path
+        directly instead of changing into the directory first.
+
+        Whether the server handles paths correctly is probed only
+        once per server and process. Even then, paths containing
+        whitespace use the workaround in `_robust_ftp_command`.
+        """
+        if self._direct_paths is None:
+            server_key = self._server_key()
+            if server_key in _direct_path_support:
+                self._direct_paths = _direct_path_support[server_key]
+            else:
+                self._direct_paths = self._probe_direct_paths()
+                if server_key is not None:
+                    _direct_path_support[server_key] = self._direct_paths
+        return self._direct_paths and \
+               not any(char.isspace() for char in path)
+
+    def _lists_directly(self, path):
+        """
+        Return true if the directory listing of `path` can be made
+        with the absolute path as argument of the listing command
+        instead of changing into the directory first.
+
+        This needs `_uses_direct_paths`, and `path` mustn't be a link:
+        like `ls -l link`, many servers list the link itself instead
+        of the directory it points to. The probe in
+        `_probe_direct_paths` can't tell, so paths whose cached stat
+        result is a link are listed after changing into them.
+        """
+        path = self.path.abspath(path)
+        if not self._uses_direct_paths(path):
+            return False
+        try:
+            lstat_result = self.stat_cache[path]
+        except ftputil.error.CacheMissError:
+            return True
+        return not stat.S_ISLNK(lstat_result.st_mode)
+
     def _robust_ftp_command(self, command, path, descend_deeply=False):
         """
         Run an FTP command on a path. The return value of the method
@@ -585,6 +951,15 @@ class FTPHost(object):
         If `descend_deeply` is true (the default is false), descend
         deeply, i. e. change the directory to the end of the path.
         """
+        # If the server can deal with it, run the command on the
+        # absolute path, without changing directories.
+        # Commands descending deeply make listings.
+        if descend_deeply:
+            direct = self._lists_directly(path)
+        else:
+            direct = self._uses_direct_paths(path)
+        if direct:
+            return command(self, self.path.abspath(path))
         # If we can't change to the yet-current directory, the code
         # below won't work (see below), so in this case rather raise
         # an exception than giving wrong results.
@@ -645,6 +1020,8 @@ class FTPHost(object):
             with ftputil.error.ftplib_error_to_ftp_os_error:
                 self._session.mkd(path)
         self._robust_ftp_command(command, path)
+        # The directory isn't in the cached listing of its parent.
+        self.stat_cache.invalidate(self.path.abspath(path))
 
     # TODO: The virtual directory support doesn't have unit tests yet
     # because the mocking most likely would be quite complicated. The
@@ -713,7 +1090,7 @@ class FTPHost(object):
             with ftputil.error.ftplib_error_to_ftp_os_error:
                 self._session.rmd(path)
         self._robust_ftp_command(command, path)
-        self.stat_cache.invalidate(path)
+        self.stat_cache.invalidate_subtree(path)
 
     def remove(self, path):
         """
@@ -829,6 +1206,9 @@ class FTPHost(object):
             # Use straightforward command.
             with ftputil.error.ftplib_error_to_ftp_os_error:
                 self._session.rename(source, target)
+        # Keep the cached entries below a renamed directory.
+        self.stat_cache.move_subtree(self.path.abspath(source),
+                                     self.path.abspath(target))
 
     #XXX One could argue to put this method into the `_Stat` class, but
     # I refrained from that because then `_Stat` would have to know
@@ -855,6 +1235,101 @@ class FTPHost(object):
                                          descend_deeply=True)
         return lines
 
+    def _mlsd(self, path):
+        """Return a directory listing as made by FTP's `MLSD` command."""
+        def _FTPHost_mlsd_command(self, path):
+            """Callback function."""
+            lines = []
+            def callback(line):
+                """Callback function."""
+                lines.append(ftputil.tool.as_unicode(line))
+            with ftputil.error.ftplib_error_to_ftp_os_error:
+                if path:
+                    self._session.retrlines("MLSD " + path, callback)
+                else:
+                    self._session.retrlines("MLSD", callback)
+            return lines
+        return self._robust_ftp_command(_FTPHost_mlsd_command, path,
+                                        descend_deeply=True)
+
+    def _listing_lines(self, command, path):
+        """
+        Yield the lines of the directory listing which the FTP command
+        `command` (`LIST`, `LIST -a` or `MLSD`) makes for `path`, as
+        they arrive from the server.
+
+        The listing is transferred by a child session, so this host
+        can be used for other commands while the lines are consumed.
+        """
+        path = self.path.abspath(path)
+        host = self._child()
+        if self._lists_directly(path):
+            command = "{0} {1}".format(command, path)
+        else:
+            # List the current directory; see `_robust_ftp_command`.
+            host.chdir(path)
+        encoding = getattr(host._session, "encoding",
+                           ftputil.tool.LOSSLESS_ENCODING)
+        listing = host._file
+        listing._open_listing(command)
+        try:
+            for line in listing:
+                yield line.rstrip(b"\r\n").decode(encoding)
+        finally:
+            listing.close()
+
+    def _streamed_dir(self, path):
+        """
+        Yield the lines of the `LIST` directory listing of `path` as
+        they arrive from the server.
+        """
+        command = "LIST -a" if self.use_list_a_option else "LIST"
+        return self._listing_lines(command, path)
+
+    def _streamed_mlsd(self, path):
+        """
+        Yield the lines of the `MLSD` directory listing of `path` as
+        they arrive from the server.
+        """
+        return self._listing_lines("MLSD", path)
+
+    def _mlst(self, path):
+        """
+        Return the facts line for the absolute `path` from FTP's
+        `MLST` command (without the leading space).
+        """
+        with ftputil.error.ftplib_error_to_ftp_os_error:
+            response = self._session.sendcmd("MLST " + path)
+        # The facts line is the only line starting with a space, see
+        # RFC 3659.
+        for line in ftputil.tool.as_unicode(response).splitlines():
+            if line.startswith(" "):
+                return line[1:]
+        raise ftputil.error.ParserError(
+                "no facts in MLST response {0!r}".format(response))
+
+    def _size(self, path):
+        """
+        Return the size of the file `path` from FTP's `SIZE` command
+        (RFC 3659).
+
+        Many servers don't give sizes for directories; they raise a
+        `PermanentError`, like for missing paths.
+        """
+        def _FTPHost_size_command(self, path):
+            """Callback function."""
+            with ftputil.error.ftplib_error_to_ftp_os_error:
+                # Many servers refuse `SIZE` in ASCII mode, which is
+                # set for directory listings.
+                self._session.voidcmd("TYPE I")
+                return self._session.sendcmd("SIZE " + path)
+        response = self._robust_ftp_command(_FTPHost_size_command, path)
+        code, _, size = ftputil.tool.as_unicode(response).partition(" ")
+        if code != "213" or not size.strip().isdigit():
+            raise ftputil.error.ParserError(
+                    "invalid SIZE response {0!r}".format(response))
+        return int(size.strip())
+
     # The `listdir`, `lstat` and `stat` methods don't use
     # `_robust_ftp_command` because they implicitly already use
     # `_dir` which actually uses `_robust_ftp_command`.
@@ -872,6 +1347,44 @@ class FTPHost(object):
         return [ftputil.tool.same_string_type_as(original_path, item)
                 for item in items]
 
+    def listdir_stat(self, path):
+        """
+        Return a list of `(name, stat_result)` pairs for the
+        directories, files etc. in the directory named `path`.
+
+        Unlike calling `lstat` for each name returned by `listdir`,
+        this needs only one directory listing from the server. The
+        stat results are the same `lstat` would return, i. e. links
+        aren't followed.
+
+        If the directory listing from the server can't be parsed with
+        any of the available parsers raise a `ParserError`.
+        """
+        original_path = path
+        path = ftputil.tool.as_unicode(path)
+        stat_results = self._stat._listdir_stat(path)
+        return [(ftputil.tool.same_string_type_as(original_path,
+                                                  stat_result._st_name),
+                 stat_result)
+                for stat_result in stat_results]
+
+    def iterdir_stat(self, path):
+        """
+        Like `listdir_stat`, but return an iterator which yields the
+        `(name, stat_result)` pairs while the directory listing is
+        still being transferred, so neither the whole listing nor all
+        stat results have to be kept in memory at once.
+
+        The listing uses an additional connection (see `open`). If
+        the iterator isn't exhausted, close it to end the transfer.
+        """
+        original_path = path
+        path = ftputil.tool.as_unicode(path)
+        for stat_result in self._stat._iter_listdir_stat(path):
+            yield (ftputil.tool.same_string_type_as(original_path,
+                                                    stat_result._st_name),
+                   stat_result)
+
     def lstat(self, path, _exception_for_missing_path=True):
         """
         Return an object similar to that returned by `os.lstat`.
@@ -903,13 +1416,24 @@ class FTPHost(object):
         path = ftputil.tool.as_unicode(path)
         return self._stat._stat(path, _exception_for_missing_path)
 
-    def walk(self, top, topdown=True, onerror=None, followlinks=False):
+    def walk(self, top, topdown=True, onerror=None, followlinks=False,
+             workers=1):
         """
         Iterate over directory tree and return a tuple (dirpath,
         dirnames, filenames) on each iteration, like the `os.walk`
         function (see https://docs.python.org/library/os.html#os.walk ).
+
+        With `workers` greater than 1, list up to `workers`
+        directories at the same time, using additional connections
+        to the server. The results are the same as without.
         """
         top = ftputil.tool.as_unicode(top)
+        if workers > 1:
+            return ftputil.parallel.walk(self, top, topdown, onerror,
+                                         followlinks, workers)
+        return self._walk(top, topdown, onerror, followlinks)
+
+    def _walk(self, top, topdown, onerror, followlinks):
         # The following code is copied from `os.walk` in Python 2.4
         # and adapted to ftputil.
         try:
@@ -929,7 +1453,7 @@ class FTPHost(object):
         for name in dirs:
             path = self.path.join(top, name)
             if followlinks or not self.path.islink(path):
-                for item in self.walk(path, topdown, onerror, followlinks):
+                for item in self._walk(path, topdown, onerror, followlinks):
                     yield item
         if not topdown:
             yield top, dirs, nondirs
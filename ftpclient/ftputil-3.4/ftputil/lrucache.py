@@ -49,7 +49,7 @@ import time
 
 # The suffix after the hyphen denotes modifications by the
 # ftputil project with respect to the original version.
-__version__ = "0.2-12"
+__version__ = "0.2-13"
 __all__ = ['CacheKeyError', 'LRUCache', 'DEFAULT_SIZE']
 __docformat__ = 'reStructuredText en'
 
@@ -117,19 +117,18 @@ class LRUCache(object):
     class _Node(object):
         """Record of a cached value. Not for public consumption."""
 
-        def __init__(self, key, obj, timestamp, sort_key):
+        # Save memory; a cache may hold hundreds of thousands of nodes.
+        __slots__ = ("key", "obj", "atime", "mtime", "prev", "next")
+
+        def __init__(self, key, obj, timestamp):
             object.__init__(self)
             self.key = key
             self.obj = obj
             self.atime = timestamp
             self.mtime = self.atime
-            self._sort_key = sort_key
-
-        def __lt__(self, other):
-            # Seems to be preferred over `__cmp__`, at least in newer
-            # Python versions. Uses only around 60 % of the time
-            # with respect to `__cmp__`.
-            return self._sort_key < other._sort_key
+            # Neighbors in the doubly linked list of nodes
+            self.prev = None
+            self.next = None
 
         def __repr__(self):
             return "<%s %s => %s (%s)>" % \
@@ -154,21 +153,37 @@ class LRUCache(object):
         The `size` attribute of the cache isn't modified.
         """
         # pylint: disable=attribute-defined-outside-init
-        self.__heap = []
+        #
+        # The nodes form a circular doubly linked list, ordered from
+        # the least recently used node (`root.next`) to the most
+        # recently used node (`root.prev`). The root node is a
+        # sentinel which makes unlinking and appending branch-free.
+        # Together with the dictionary this makes all operations
+        # O(1), independent of the cache size.
+        root = self._Node(None, None, 0)
+        root.prev = root.next = root
+        self.__root = root
         self.__dict = {}
-        self.__counter = 0
-
-    def _sort_key(self):
-        """Return a new integer value upon every call.
 
-        Cache nodes need a monotonically increasing time indicator.
-        `time.time()` and `time.clock()` don't guarantee this in a
-        platform-independent way.
-
-        See http://ftputil.sschwarzer.net/trac/ticket/32 for details.
-        """
-        self.__counter += 1
-        return self.__counter
+    def __unlink(self, node):
+        """Remove `node` from the linked list."""
+        node.prev.next = node.next
+        node.next.prev = node.prev
+
+    def __append(self, node):
+        """Insert `node` as most recently used node."""
+        root = self.__root
+        last = root.prev
+        last.next = node
+        node.prev = last
+        node.next = root
+        root.prev = node
+
+    def __touch(self, node):
+        """Make `node` the most recently used node."""
+        if node.next is not self.__root:
+            self.__unlink(node)
+            self.__append(node)
 
     def __len__(self):
         """Return _current_ number of cache entries.
@@ -176,7 +191,7 @@ class LRUCache(object):
         This may be different from the value of the `size`
         attribute.
         """
-        return len(self.__heap)
+        return len(self.__dict)
 
     def __contains__(self, key):
         """Return `True` if the item denoted by `key` is in the cache."""
@@ -189,7 +204,6 @@ class LRUCache(object):
         would exceed the maximum cache size, the least recently
         used item in the cache is "forgotten".
         """
-        heap = self.__heap
         dict_ = self.__dict
         if key in dict_:
             node = dict_[key]
@@ -197,19 +211,19 @@ class LRUCache(object):
             node.obj = obj
             node.atime = time.time()
             node.mtime = node.atime
-            node._sort_key = self._sort_key()
+            self.__touch(node)
         else:
-            # The size of the heap can be at most the value of
+            # The number of nodes can be at most the value of
             # `self.size` because `__setattr__` decreases the cache
             # size if the new size value is smaller; so we don't
             # need a loop _here_.
-            if len(heap) == self.size:
-                lru_node = min(heap)
-                heap.remove(lru_node)
+            if len(dict_) == self.size:
+                lru_node = self.__root.next
+                self.__unlink(lru_node)
                 del dict_[lru_node.key]
-            node = self._Node(key, obj, time.time(), self._sort_key())
+            node = self._Node(key, obj, time.time())
             dict_[key] = node
-            heap.append(node)
+            self.__append(node)
 
     def __getitem__(self, key):
         """Return the item stored under `key` key.
@@ -223,7 +237,7 @@ class LRUCache(object):
             node = self.__dict[key]
             # Update node object in-place.
             node.atime = time.time()
-            node._sort_key = self._sort_key()
+            self.__touch(node)
             return node.obj
 
     def __delitem__(self, key):
@@ -235,45 +249,60 @@ class LRUCache(object):
         if not key in self.__dict:
             raise CacheKeyError(key)
         else:
-            node = self.__dict[key]
-            self.__heap.remove(node)
-            del self.__dict[key]
+            node = self.__dict.pop(key)
+            self.__unlink(node)
             return node.obj
 
+    def popitem(self):
+        """Remove the least recently used item from the cache and
+        return it as a `(key, obj)` tuple.
+
+        If the cache is empty, raise a `CacheKeyError`.
+        """
+        root = self.__root
+        node = root.next
+        if node is root:
+            raise CacheKeyError("cache is empty")
+        self.__unlink(node)
+        del self.__dict[node.key]
+        return node.key, node.obj
+
     def __iter__(self):
         """Iterate over the cache, from the least to the most
         recently accessed item.
         """
-        self.__heap.sort()
-        for node in self.__heap:
-            yield node.key
+        # Iterate over a snapshot of the keys. Accessing or deleting
+        # items in the loop body reorders the linked list.
+        keys = []
+        root = self.__root
+        node = root.next
+        while node is not root:
+            keys.append(node.key)
+            node = node.next
+        return iter(keys)
 
     def __setattr__(self, name, value):
         """If the name of the attribute is "size", set the
         _maximum_ size of the cache to the supplied value.
         """
         object.__setattr__(self, name, value)
-        # Automagically shrink heap on resize.
+        # Automagically shrink cache on resize.
         if name == 'size':
             size = value
             if not isinstance(size, int_types):
                 raise TypeError("cache size (%r) must be an integer" % size)
             if size <= 0:
                 raise ValueError("cache size (%d) must be positive" % size)
-            heap = self.__heap
             dict_ = self.__dict
-            # Do we need to remove anything at all?
-            if len(heap) <= self.size:
-                return
-            # Remove enough nodes to reach the new size.
-            heap.sort()
-            node_count_to_remove = len(heap) - self.size
-            for node in heap[:node_count_to_remove]:
-                del dict_[node.key]
-            del heap[:node_count_to_remove]
+            # Remove least recently used nodes to reach the new size.
+            root = self.__root
+            while len(dict_) > self.size:
+                lru_node = root.next
+                self.__unlink(lru_node)
+                del dict_[lru_node.key]
 
     def __repr__(self):
-        return "<%s (%d elements)>" % (str(self.__class__), len(self.__heap))
+        return "<%s (%d elements)>" % (str(self.__class__), len(self.__dict))
 
     def mtime(self, key):
         """Return the last modification time for the cache record with key.
@@ -0,0 +1,252 @@
+# Copyright (C) 2018, ftputil contributors (see `doc/contributors.txt`)
+# See the file LICENSE for licensing terms.
+
+"""
+parallel.py - directory listings over several sessions
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import stat
+import threading
+
+import ftputil.error
+
+
+# Only `FTPHost.walk` is supposed to use this module.
+__all__ = []
+
+
+# States of a `_Listing`
+PENDING, RUNNING, DONE = "pending", "running", "done"
+
+
+class _Listing(object):
+    """
+    A directory listing requested from a `_ListingPool`.
+
+    `path` is the path as it's returned by `walk`, `abs_path` the
+    absolute path which is listed. `lstat` is the stat result of the
+    directory from the listing of its parent, if known.
+    """
+
+    def __init__(self, path, abs_path, lstat=None):
+        self.path = path
+        self.abs_path = abs_path
+        self.lstat = lstat
+        self.state = PENDING
+        self.cancelled = False
+        # List of `(name, lstat, is_dir, is_link)` tuples
+        self.entries = None
+        # `FTPOSError` to pass to `onerror`
+        self.error = None
+        # Any other exception, raised in the consuming thread
+        self.exception = None
+
+
+class _ListingPool(object):
+    """
+    Pool of threads that list directories, each with its own `FTPHost`
+    made with `host._copy()`.
+
+    Listings are taken from a stack, so that the most recently
+    submitted (i. e. deepest) directories are listed first, which is
+    the order in which a depth-first walk consumes them. If a listing
+    is needed before a worker has taken it, the consuming thread lists
+    it with `host` itself, so the walk doesn't depend on how many
+    workers could connect.
+    """
+
+    def __init__(self, host, workers):
+        self._host = host
+        # The consuming thread lists too, so start one thread less.
+        self._max_threads = workers - 1
+        self._cond = threading.Condition()
+        self._stack = []
+        self._threads = []
+        self._worker_hosts = []
+        self._closed = False
+
+    def submit(self, listings):
+        """
+        Request the `listings`, which are consumed in the given order.
+        """
+        # Listings in the cache of `host` are done by `result` without
+        # a server request, so don't hand them to the workers.
+        listings = [listing for listing in listings
+                    if not self._is_cached(listing)]
+        with self._cond:
+            self._stack.extend(reversed(listings))
+            while self._stack and len(self._threads) < self._max_threads:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify_all()
+
+    def cancel(self, listing):
+        """Don't list `listing` if it hasn't been started yet."""
+        with self._cond:
+            listing.cancelled = True
+
+    def result(self, listing):
+        """Wait for `listing` to be done, listing it here if needed."""
+        with self._cond:
+            while listing.state == RUNNING:
+                self._cond.wait()
+            run_here = (listing.state == PENDING)
+            if run_here:
+                listing.state = RUNNING
+        if run_here:
+            self._run(self._host, listing)
+        return listing
+
+    def close(self):
+        """Stop the threads and close their `FTPHost` objects."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        for host in self._worker_hosts:
+            host.close()
+
+    def _is_cached(self, listing):
+        try:
+            self._host.stat_cache.listing(listing.abs_path)
+        except ftputil.error.CacheMissError:
+            return False
+        return True
+
+    def _run(self, host, listing):
+        # Without the stat result of the directory itself the host would
+        # have to list the parent directory to find out that `abs_path`
+        # is a directory.
+        if listing.lstat is not None:
+            host.stat_cache[listing.abs_path] = listing.lstat
+        try:
+            listing.entries = _directory_entries(host, listing.abs_path)
+        except ftputil.error.FTPOSError as exc:
+            listing.error = exc
+        except Exception as exc:
+            listing.exception = exc
+        with self._cond:
+            listing.state = DONE
+            self._cond.notify_all()
+
+    def _new_worker_host(self):
+        host = self._host._copy()
+        host.set_time_shift(self._host.time_shift())
+        host.use_list_a_option = self._host.use_list_a_option
+        return host
+
+    def _work(self):
+        try:
+            host = self._new_worker_host()
+        except Exception:
+            # Listings are still done by the other threads.
+            return
+        with self._cond:
+            self._worker_hosts.append(host)
+        while True:
+            with self._cond:
+                while not (self._closed or self._stack):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                listing = self._stack.pop()
+                # Listings done by the consuming thread stay on the stack.
+                if listing.state != PENDING or listing.cancelled:
+                    continue
+                listing.state = RUNNING
+            self._run(host, listing)
+
+
+def _directory_entries(host, path):
+    """
+    Return a list of `(name, lstat, is_dir, is_link)` tuples for the
+    directory `path`. `is_dir` is true for links to directories, too.
+    """
+    entries = []
+    for name, lstat in host.listdir_stat(path):
+        is_link = stat.S_ISLNK(lstat.st_mode)
+        if is_link:
+            is_dir = host.path.isdir(host.path.join(path, name))
+        else:
+            is_dir = stat.S_ISDIR(lstat.st_mode)
+        entries.append((name, lstat, is_dir, is_link))
+    return entries
+
+
+def walk(host, top, topdown, onerror, followlinks, workers):
+    """
+    Like `FTPHost.walk`, but list the directories with up to `workers`
+    sessions at the same time.
+
+    Subdirectories are listed in advance while the caller processes
+    their parent. Their order and the result are the same as for a
+    sequential walk: with `topdown` true, directories the caller
+    removes from `dirnames` are neither listed (if that's still
+    possible) nor walked, and directories added to it are walked. The
+    stat results of all walked entries end up in `host.stat_cache`.
+    """
+    pool = _ListingPool(host, workers)
+    try:
+        root = _Listing(top, host.path.abspath(top))
+        pool.submit([root])
+        for item in _walk(host, pool, root, topdown, onerror, followlinks):
+            yield item
+    finally:
+        pool.close()
+
+
+def _walk(host, pool, listing, topdown, onerror, followlinks):
+    pool.result(listing)
+    if listing.error is not None:
+        if onerror is not None:
+            onerror(listing.error)
+        return
+    if listing.exception is not None:
+        raise listing.exception
+    dirs, nondirs = [], []
+    # Directories which are links and aren't followed
+    links = set()
+    # Listings of the subdirectories, by name
+    children = {}
+    for name, lstat, is_dir, is_link in listing.entries:
+        abs_path = host.path.join(listing.abs_path, name)
+        host.stat_cache[abs_path] = lstat
+        if not is_dir:
+            nondirs.append(name)
+            continue
+        dirs.append(name)
+        if is_link and not followlinks:
+            links.add(name)
+        else:
+            children[name] = _Listing(host.path.join(listing.path, name),
+                                      abs_path, None if is_link else lstat)
+    # With more entries than fit in the cache, some have been evicted.
+    if len(listing.entries) <= host.stat_cache.size:
+        host.stat_cache.mark_listed(
+          listing.abs_path, names=[entry[0] for entry in listing.entries])
+    pool.submit([children[name] for name in dirs if name in children])
+    if topdown:
+        yield listing.path, dirs, nondirs
+        for name in set(children) - set(dirs):
+            pool.cancel(children[name])
+    for name in dirs:
+        if name in links:
+            continue
+        child = children.get(name)
+        if child is None:
+            # Added to `dirs` by the caller
+            path = host.path.join(listing.path, name)
+            if not followlinks and host.path.islink(path):
+                continue
+            child = _Listing(path, host.path.abspath(path))
+            pool.submit([child])
+        for item in _walk(host, pool, child, topdown, onerror, followlinks):
+            yield item
+    if not topdown:
+        yield listing.path, dirs, nondirs
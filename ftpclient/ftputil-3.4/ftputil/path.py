@@ -59,10 +59,9 @@ class _Path(object):
 
     def exists(self, path):
         """Return true if the path exists."""
+        path = ftputil.tool.as_unicode(path)
         try:
-            lstat_result = self._host.lstat(
-                             path, _exception_for_missing_path=False)
-            return lstat_result is not None
+            return self._host._stat._exists(path)
         except ftputil.error.RootDirError:
             return True
 
@@ -84,8 +83,12 @@ class _Path(object):
         This will raise `PermanentError` if the path doesn't exist,
         but maybe raise other exceptions depending on the state of the
         server (e. g. timeout).
+
+        If the server supports the `SIZE` command, the parent
+        directory of `path` isn't listed for this.
         """
-        return self._host.stat(path).st_size
+        path = ftputil.tool.as_unicode(path)
+        return self._host._stat._getsize(path)
 
     @staticmethod
     def join(*paths):
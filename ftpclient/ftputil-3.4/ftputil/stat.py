@@ -9,59 +9,134 @@ ftputil.stat - stat result, parsers, and FTP stat'ing for `ftputil`
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import calendar
 import datetime
 import math
 import re
 import stat
 import time
 
+import ftputil.compat
 import ftputil.error
 import ftputil.stat_cache
 
 
 # These can be used to write custom parsers.
-__all__ = ["StatResult", "Parser", "UnixParser", "MSParser"]
+__all__ = ["StatResult", "Parser", "UnixParser", "MSParser", "MLSDParser"]
 
 
 # Datetime precision values in seconds.
+SECOND_PRECISION  = 1
 MINUTE_PRECISION  = 60
 DAY_PRECISION     = 24 * 60 * 60
 UNKNOWN_PRECISION = None
 
 
-class StatResult(tuple):
+class StatResult(object):
     """
     Support class resembling a tuple like that returned from
     `os.(l)stat`.
+
+    The values are stored in slots, so that the many stat results in
+    a stat cache take little memory. Like a tuple, a `StatResult` can
+    be indexed (e. g. with `stat.ST_MODE`) and sliced, iterated over
+    and compared (also ordered) with other stat results or tuples. It
+    isn't a `tuple` instance, though.
     """
 
+    # Names of the values in tuple order
+    _fields = ("st_mode", "st_ino", "st_dev", "st_nlink", "st_uid",
+               "st_gid", "st_size", "st_atime", "st_mtime", "st_ctime")
+
+    __slots__ = _fields + ("_st_mtime_precision", "_st_name", "_st_target")
+
     _index_mapping = {
       "st_mode":  0, "st_ino":   1, "st_dev":    2, "st_nlink":    3,
       "st_uid":   4, "st_gid":   5, "st_size":   6, "st_atime":    7,
       "st_mtime": 8, "st_ctime": 9, "_st_name": 10, "_st_target": 11}
 
     def __init__(self, sequence):
-        # Don't call `__init__` via `super`. Construction from a
-        # sequence is implicitly handled by `tuple.__new__`, not
-        # `tuple.__init__`. As a by-product, this avoids a
-        # `DeprecationWarning` in Python 2.6+ .
-        # pylint: disable=super-init-not-called
-        #
-        # Use `sequence` parameter to remain compatible to `__new__`
-        # interface.
-        # pylint: disable=unused-argument
-        #
+        (self.st_mode, self.st_ino, self.st_dev, self.st_nlink, st_uid,
+         st_gid, self.st_size, self.st_atime, self.st_mtime,
+         self.st_ctime) = sequence
+        # Many entries have the same owner and group, so share the
+        # strings.
+        if isinstance(st_uid, ftputil.compat.unicode_type):
+            st_uid = ftputil.compat.intern_string(st_uid)
+        if isinstance(st_gid, ftputil.compat.unicode_type):
+            st_gid = ftputil.compat.intern_string(st_gid)
+        self.st_uid = st_uid
+        self.st_gid = st_gid
         # These may be overwritten in a `Parser.parse_line` method.
         self._st_name = ""
         self._st_target = None
         self._st_mtime_precision = UNKNOWN_PRECISION
 
-    def __getattr__(self, attr_name):
-        if attr_name in self._index_mapping:
-            return self[self._index_mapping[attr_name]]
-        else:
-            raise AttributeError("'StatResult' object has no attribute '{0}'".
-                                 format(attr_name))
+    def _as_tuple(self):
+        return (self.st_mode, self.st_ino, self.st_dev, self.st_nlink,
+                self.st_uid, self.st_gid, self.st_size, self.st_atime,
+                self.st_mtime, self.st_ctime)
+
+    def __getitem__(self, index):
+        return self._as_tuple()[index]
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __iter__(self):
+        return iter(self._as_tuple())
+
+    @staticmethod
+    def _other_tuple(other):
+        """
+        Return the values of `other` for comparisons, a tuple if it's
+        a `StatResult` or a tuple, else `None`.
+        """
+        if isinstance(other, StatResult):
+            return other._as_tuple()
+        elif isinstance(other, tuple):
+            return other
+        return None
+
+    def __eq__(self, other):
+        other = self._other_tuple(other)
+        if other is None:
+            return NotImplemented
+        return self._as_tuple() == other
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    # Order like tuples, e. g. for `sorted`.
+    def __lt__(self, other):
+        other = self._other_tuple(other)
+        if other is None:
+            return NotImplemented
+        return self._as_tuple() < other
+
+    def __le__(self, other):
+        other = self._other_tuple(other)
+        if other is None:
+            return NotImplemented
+        return self._as_tuple() <= other
+
+    def __gt__(self, other):
+        other = self._other_tuple(other)
+        if other is None:
+            return NotImplemented
+        return self._as_tuple() > other
+
+    def __ge__(self, other):
+        other = self._other_tuple(other)
+        if other is None:
+            return NotImplemented
+        return self._as_tuple() >= other
+
+    def __hash__(self):
+        return hash(self._as_tuple())
 
     def __repr__(self):
         # "Invert" `_index_mapping` so that we can look up the names
@@ -124,6 +199,22 @@ class Parser(object):
         """
         raise NotImplementedError("must be defined by subclass")
 
+    def parse_lines(self, lines, time_shift=0.0):
+        """
+        Yield a `StatResult` object for each line in the iterable
+        `lines` which isn't ignored according to `ignores_line`.
+
+        If a line can't be parsed, raise a `ParserError`.
+
+        This default implementation calls `parse_line` for each line.
+        Parsers can override it to share work between the lines of a
+        listing.
+        """
+        for line in lines:
+            if self.ignores_line(line):
+                continue
+            yield self.parse_line(line, time_shift)
+
     #
     # Helper methods for parts of a directory listing line
     #
@@ -440,6 +531,154 @@ class UnixParser(Parser):
         return stat_result
 
 
+    def _defining_class(self, method_name):
+        """
+        Return the class which defines the method `method_name` of
+        this parser, so that `parse_lines` can tell if its shortcuts
+        would bypass methods overridden in a subclass.
+        """
+        for class_ in type(self).__mro__:
+            if method_name in vars(class_):
+                return class_
+
+    def _day_start(self, year, month, day):
+        """
+        Return the local time of midnight of the given day as from
+        `time.mktime`, or `None` if times on this day can't be
+        calculated by adding seconds to midnight. This is the case
+        on days with a DST switch and on days before the epoch.
+        """
+        day_start = self._mktime((year, month, day, 0, 0, 0, 0, 0, -1))
+        day_end = self._mktime((year, month, day, 23, 59, 0, 0, 0, -1))
+        if day_start == 0.0 or day_end - day_start != 23*60*60 + 59*60:
+            return None
+        return day_start
+
+    def _listing_day_start(self, month, day, year):
+        """
+        Return the start of the day given by the strings `month` and
+        `day` and the integer `year` from a listing line.
+
+        Raise a `ValueError` or `KeyError` for days which can't be
+        handled with the shortcuts of `parse_lines`.
+        """
+        day_start = self._day_start(year, self._month_numbers[month.lower()],
+                                    int(day))
+        if day_start is None:
+            raise ValueError("no day start for {0} {1} {2}".
+                             format(month, day, year))
+        return day_start
+
+    @staticmethod
+    def _listing_time_of_day(hour_and_minute):
+        """
+        Return the seconds since midnight for a time string "hh:mm"
+        from a listing line.
+
+        Raise a `ValueError` if the string isn't a valid time.
+        """
+        hour, minute = hour_and_minute.split(":")
+        hour, minute = int(hour), int(minute)
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError("invalid time {0!r}".format(hour_and_minute))
+        return hour * 3600 + minute * 60
+
+    def parse_lines(self, lines, time_shift=0.0):
+        """
+        Yield a `StatResult` object for each line in the iterable
+        `lines` which isn't ignored according to `ignores_line`.
+
+        This gives the same results as calling `parse_line` for each
+        line, but the current time is determined only once per
+        listing, and mode strings and datetimes are converted only
+        once per distinct value. Lines for which these shortcuts
+        don't work are passed to `parse_line`.
+        """
+        if self._defining_class("parse_line") is not UnixParser:
+            for stat_result in super(UnixParser, self).parse_lines(
+                                 lines, time_shift):
+                yield stat_result
+            return
+        ignores_line = self.ignores_line
+        # Avoid the method call for the default `ignores_line`.
+        default_ignores_line = self._defining_class("ignores_line") is Parser
+        total_regex_search = self._total_regex.search
+        # Latest datetime in the current year (see `parse_unix_time`)
+        latest_mtime = time.time() + time_shift + MINUTE_PRECISION
+        current_year = time.localtime()[0]
+        # Caches for this listing. Times in listing lines are either
+        # "hh:mm" in the current or previous year, or just a year.
+        modes = {}
+        day_starts = {}
+        this_year_day_starts = {}
+        last_year_day_starts = {}
+        times_of_day = {}
+        for line in lines:
+            if default_ignores_line:
+                if not line or line.isspace() or \
+                   line.startswith("total") and total_regex_search(line):
+                    continue
+            elif ignores_line(line):
+                continue
+            try:
+                mode_string, nlink, user, group, size, month, day, \
+                  year_or_time, name = line.split(None, 8)
+                # The variant without user id has a day in this field.
+                if month.isdigit():
+                    raise ValueError("no user id")
+                st_mode = modes.get(mode_string)
+                if st_mode is None:
+                    st_mode = modes[mode_string] = \
+                      self.parse_unix_mode(mode_string)
+                if ":" in year_or_time:
+                    day_key = (month, day)
+                    day_start = this_year_day_starts.get(day_key)
+                    if day_start is None:
+                        day_start = this_year_day_starts[day_key] = \
+                          self._listing_day_start(month, day, current_year)
+                    time_of_day = times_of_day.get(year_or_time)
+                    if time_of_day is None:
+                        time_of_day = times_of_day[year_or_time] = \
+                          self._listing_time_of_day(year_or_time)
+                    st_mtime = day_start + time_of_day
+                    if st_mtime > latest_mtime:
+                        # In the future, so use the previous year.
+                        day_start = last_year_day_starts.get(day_key)
+                        if day_start is None:
+                            day_start = last_year_day_starts[day_key] = \
+                              self._listing_day_start(month, day,
+                                                      current_year - 1)
+                        st_mtime = day_start + time_of_day
+                    st_mtime_precision = MINUTE_PRECISION
+                else:
+                    day_key = (month, day, year_or_time)
+                    st_mtime = day_starts.get(day_key)
+                    if st_mtime is None:
+                        st_mtime = day_starts[day_key] = \
+                          self._listing_day_start(month, day,
+                                                  int(year_or_time))
+                    st_mtime_precision = DAY_PRECISION
+                if " -> " in name:
+                    if name.count(" -> ") > 1:
+                        raise ValueError("more than one arrow")
+                    st_name, st_target = name.split(" -> ")
+                else:
+                    st_name, st_target = name, None
+                stat_result = StatResult(
+                  (st_mode, None, None, int(nlink), user, group,
+                   int(size), None, st_mtime, None))
+            except (ValueError, KeyError, ftputil.error.ParserError):
+                # Let `parse_line` deal with the details, including
+                # error messages.
+                yield self.parse_line(line, time_shift)
+                continue
+            # pylint: disable=protected-access
+            stat_result._st_mtime_precision = st_mtime_precision
+            stat_result._st_name = st_name
+            stat_result._st_target = st_target
+            yield stat_result
+
+
 class MSParser(Parser):
     """`Parser` class for MS-specific directory format."""
 
@@ -508,6 +747,135 @@ class MSParser(Parser):
             stat_result._st_mtime_precision = MINUTE_PRECISION
         return stat_result
 
+class MLSDParser(Parser):
+    """
+    `Parser` class for the machine-readable listings of the `MLSD`
+    and `MLST` commands (RFC 3659).
+
+    Lines look like
+
+      type=file;size=4604;modify=20180620101112;UNIX.mode=0644; index.html
+
+    i. e. a list of facts, each terminated by a semicolon, and the
+    name after a single space. Fact names are case-insensitive.
+    """
+
+    _type_modes = {
+      "file": stat.S_IFREG, "dir": stat.S_IFDIR,
+      "cdir": stat.S_IFDIR, "pdir": stat.S_IFDIR}
+
+    def parse_facts(self, line):
+        """
+        Return a tuple `(facts, name)` where `facts` is a dictionary
+        mapping the lower-case fact names of the `line` to their
+        values.
+        """
+        facts_string, space, name = line.partition(" ")
+        if not space or not name:
+            raise ftputil.error.ParserError(
+                    "no name in MLSD line {0!r}".format(line))
+        facts = {}
+        for fact in facts_string.split(";"):
+            if not fact:
+                continue
+            fact_name, equals, value = fact.partition("=")
+            if not equals:
+                raise ftputil.error.ParserError(
+                        "invalid fact {0!r} in MLSD line {1!r}".
+                        format(fact, line))
+            facts[fact_name.lower()] = value
+        return facts, name
+
+    def parse_mlsd_time(self, modify, time_shift):
+        """
+        Return a floating point number, like from `time.mktime`, by
+        parsing the `modify` fact value of the form
+        "YYYYMMDDHHMMSS[.sss]". The time in the fact is UTC, so the
+        result is exact up to a second.
+
+        Like for the other parsers, the result is the time on the
+        server, i. e. the time on the client plus `time_shift`.
+        """
+        datetime_string, _, fraction = modify.partition(".")
+        if len(datetime_string) != 14 or not datetime_string.isdigit():
+            raise ftputil.error.ParserError(
+                    "invalid modify fact {0!r}".format(modify))
+        datetime_tuple = (
+          int(datetime_string[0:4]), int(datetime_string[4:6]),
+          int(datetime_string[6:8]), int(datetime_string[8:10]),
+          int(datetime_string[10:12]), int(datetime_string[12:14]))
+        try:
+            datetime.datetime(*datetime_tuple)
+        except ValueError:
+            raise ftputil.error.ParserError(
+                    "invalid modify fact {0!r}".format(modify))
+        st_mtime = calendar.timegm(datetime_tuple)
+        if fraction.isdigit():
+            st_mtime += float("0." + fraction)
+        return max(0.0, st_mtime + time_shift)
+
+    def parse_line(self, line, time_shift=0.0):
+        """
+        Return a `StatResult` instance corresponding to the given
+        `MLSD` or `MLST` line.
+
+        If the line can't be parsed, raise a `ParserError`.
+        """
+        facts, name = self.parse_facts(line)
+        # st_mode
+        type_ = facts.get("type", "").lower()
+        st_target = None
+        if type_.startswith("os.unix=slink"):
+            # Some servers add the link target, e. g.
+            # "OS.unix=slink:/home/target"
+            st_mode = stat.S_IFLNK
+            st_target = facts["type"].partition(":")[2] or None
+        elif type_ == "os.unix=symlink":
+            st_mode = stat.S_IFLNK
+        else:
+            st_mode = self._type_modes.get(type_, stat.S_IFREG)
+        if "unix.mode" in facts:
+            # Octal permission bits, e. g. "0755"
+            try:
+                st_mode |= int(facts["unix.mode"], 8) & 0o7777
+            except ValueError:
+                raise ftputil.error.ParserError(
+                        "invalid unix.mode fact {0!r}".
+                        format(facts["unix.mode"]))
+        # st_ino, st_dev, st_nlink, st_uid, st_gid, st_size, st_atime
+        st_ino = None
+        st_dev = None
+        st_nlink = None
+        st_uid = facts.get("unix.owner", facts.get("unix.uid"))
+        st_gid = facts.get("unix.group", facts.get("unix.gid"))
+        size = facts.get("size", facts.get("sizd"))
+        st_size = self._as_int(size, "size") if size is not None else None
+        st_atime = None
+        # st_mtime
+        if "modify" in facts:
+            st_mtime = self.parse_mlsd_time(facts["modify"], time_shift)
+            st_mtime_precision = SECOND_PRECISION
+        else:
+            st_mtime = None
+            st_mtime_precision = UNKNOWN_PRECISION
+        # st_ctime
+        st_ctime = None
+        # st_name; `cdir` and `pdir` are the current and the parent
+        # directory, maybe under another name.
+        if type_ == "cdir":
+            name = "."
+        elif type_ == "pdir":
+            name = ".."
+        stat_result = StatResult(
+                      (st_mode, st_ino, st_dev, st_nlink, st_uid,
+                       st_gid, st_size, st_atime, st_mtime, st_ctime) )
+        # pylint: disable=protected-access
+        stat_result._st_mtime_precision = st_mtime_precision
+        stat_result._st_name = name
+        stat_result._st_target = st_target
+        return stat_result
+
+
 #
 # Stat'ing operations for files on an FTP server
 #
@@ -522,14 +890,37 @@ class _Stat(object):
         # Allow one chance to switch to another parser if the default
         # doesn't work.
         self._allow_parser_switching = True
+        # Check only once whether the server supports `MLSD`/`MLST`.
+        self._features_checked = False
         # Cache only lstat results. `stat` works locally on `lstat` results.
         self._lstat_cache = ftputil.stat_cache.StatCache()
 
+    def _check_features(self):
+        """
+        Use the `MLSDParser` if the server announces `MLST` (which
+        implies `MLSD`) in its `FEAT` response, unless a parser has
+        been set explicitly or has already proven to work.
+        """
+        if self._features_checked or not self._allow_parser_switching:
+            return
+        self._features_checked = True
+        if self._host.capabilities().mlst:
+            self._parser = MLSDParser()
+            # The listings are machine-readable; no guessing needed.
+            self._allow_parser_switching = False
+
+    def _uses_mlsd(self):
+        """Return true if listings are made with `MLSD`, not `LIST`."""
+        return isinstance(self._parser, MLSDParser)
+
     def _host_dir(self, path):
         """
-        Return a list of lines, as fetched by FTP's `LIST` command,
-        when applied to `path`.
+        Return a list of lines, as fetched by FTP's `LIST` command (or
+        `MLSD` command if the `MLSDParser` is used), when applied to
+        `path`.
         """
+        if self._uses_mlsd():
+            return self._host._mlsd(path)
         return self._host._dir(path)
 
     def _stat_results_from_dir(self, path):
@@ -539,53 +930,210 @@ class _Stat(object):
         directory.
         """
         lines = self._host_dir(path)
-        # `cache` is the "high-level" `StatCache` object whereas
-        # `cache._cache` is the "low-level" `LRUCache` object.
         cache = self._lstat_cache
         # Auto-grow cache if the cache up to now can't hold as many
         # entries as there are in the directory `path`.
-        if cache._enabled and len(lines) >= cache._cache.size:
+        if cache._enabled and len(lines) >= cache.size:
             new_size = int(math.ceil(1.1 * len(lines)))
             cache.resize(new_size)
-        # Yield stat results from lines.
-        for line in lines:
-            if self._parser.ignores_line(line):
-                continue
-            # For `listdir`, we are interested in just the names,
-            # but we use the `time_shift` parameter to have the
-            # correct timestamp values in the cache.
-            stat_result = self._parser.parse_line(line,
-                                                  self._host.time_shift())
+        return self._stat_results_from_lines(path, lines)
+
+    def _stat_results_from_lines(self, path, lines):
+        """
+        Yield stat results extracted from the listing `lines` of the
+        directory `path`, caching them. `lines` may be an iterator.
+
+        When all lines have been consumed, the listing of `path` is
+        marked as complete in the cache.
+        """
+        cache = self._lstat_cache
+        # Get the modification time before the listing, so that the
+        # listing is at least as new.
+        dir_mtime = self._listing_mtime(path)
+        # Yield stat results from lines. For `listdir`, we are
+        # interested in just the names, but we use the `time_shift`
+        # parameter to have the correct timestamp values in the cache.
+        stat_results = self._parser.parse_lines(lines,
+                                                self._host.time_shift())
+        names = set()
+        for count, stat_result in enumerate(stat_results, 1):
             if stat_result._st_name in [self._host.curdir, self._host.pardir]:
                 continue
+            names.add(stat_result._st_name)
+            # Grow the cache while reading listings of unknown size.
+            if cache._enabled and count >= cache.size:
+                cache.resize(int(math.ceil(1.1 * count)))
             loop_path = self._path.join(path, stat_result._st_name)
             self._lstat_cache[loop_path] = stat_result
             yield stat_result
+        cache.mark_listed(path, dir_mtime, names)
 
-    def _real_listdir(self, path):
+    def _listing_mtime(self, path):
         """
-        Return a list of directories, files etc. in the directory
-        named `path`.
+        Return the cached modification time of the directory `path`
+        if it can later tell whether the directory has changed, else
+        `None`.
+        """
+        cache = self._lstat_cache
+        if not cache.revalidate_listings:
+            return None
+        try:
+            stat_result = cache[path]
+        except ftputil.error.CacheMissError:
+            return None
+        precision = stat_result._st_mtime_precision
+        if stat_result.st_mtime is None or precision is UNKNOWN_PRECISION:
+            return None
+        # Another change in the same minute (or whatever the precision
+        # is) wouldn't change the modification time from the server.
+        if stat_result.st_mtime + precision > time.time():
+            return None
+        return stat_result.st_mtime
 
-        Like `os.listdir` the returned list elements have the type
-        of the path argument.
+    def _cached_listing(self, path):
+        """
+        Return the stat results for the directory `path` from the
+        cache. If the listing has expired, but the modification time
+        of the directory is the same as when it was listed, use it
+        again. Otherwise raise a `CacheMissError`.
+        """
+        cache = self._lstat_cache
+        try:
+            return cache.listing(path)
+        except ftputil.error.CacheMissError:
+            listed_mtime, stat_results = cache.stale_listing(path)
+        # One `MLST` command or, usually cached, the listing of the
+        # parent directory
+        if self._uses_mlsd():
+            stat_result = self._real_lstat_via_mlst(path, False)
+        else:
+            stat_result = self._real_lstat(path, False)
+        if stat_result is None or stat_result.st_mtime != listed_mtime:
+            raise ftputil.error.CacheMissError(
+                    "directory {0} has changed".format(path))
+        cache.renew_listing(path)
+        return stat_results
+
+    def _streamed_stat_results_from_dir(self, path):
+        """
+        Yield stat results extracted from the directory listing `path`
+        while the listing is being transferred.
+        """
+        if self._uses_mlsd():
+            lines = self._host._streamed_mlsd(path)
+        else:
+            lines = self._host._streamed_dir(path)
+        try:
+            for stat_result in self._stat_results_from_lines(path, lines):
+                yield stat_result
+        finally:
+            # End the transfer if the caller stops early.
+            lines.close()
 
+    def _real_listdir_stat(self, path):
+        """
+        Return a list of `StatResult` objects for the directories,
+        files etc. in the directory named `path`, parsed from a
+        single directory listing. The names are available as the
+        `_st_name` attribute of the stat results.
+
+        If the complete listing is in the cache, return it from there.
         If the directory listing from the server can't be parsed,
         raise a `ParserError`.
         """
         # We _can't_ put this check into `FTPHost._dir`; see its docstring.
         path = self._path.abspath(path)
+        try:
+            return self._cached_listing(path)
+        except ftputil.error.CacheMissError:
+            pass
+        self._check_listable(path)
+        return list(self._stat_results_from_dir(path))
+
+    def _real_iter_listdir_stat(self, path):
+        """
+        Yield `StatResult` objects for the directories, files etc. in
+        the directory named `path` while its listing is transferred.
+        """
+        path = self._path.abspath(path)
+        try:
+            stat_results = self._cached_listing(path)
+        except ftputil.error.CacheMissError:
+            pass
+        else:
+            for stat_result in stat_results:
+                yield stat_result
+            return
+        self._check_listable(path)
+        for stat_result in self._streamed_stat_results_from_dir(path):
+            yield stat_result
+
+    def _may_be_dir(self, path):
+        """
+        Return false if the absolute `path` is neither a directory nor
+        a link to one, as far as this can be told without listing the
+        parent directory of `path`.
+
+        Listing the parent directory would in turn need to know
+        whether the parent is a directory, and so on up to the root
+        directory. Instead, use the cache or try to change into
+        `path`. If the server runs commands on absolute paths, a
+        listing of a file or a missing path may succeed, so this is
+        tested with `CWD` beforehand. Otherwise the listing changes
+        into the directory anyway, which fails if it isn't one.
+        """
+        if self._uses_mlsd():
+            # A single `MLST` command
+            return self._path.isdir(path)
+        if path in (self._host.sep, self._host.getcwd()):
+            return True
+        if path in self._lstat_cache:
+            lstat_result = self._lstat_cache[path]
+            if stat.S_ISLNK(lstat_result.st_mode):
+                return self._path.isdir(path)
+            return stat.S_ISDIR(lstat_result.st_mode)
+        if self._lstat_cache.is_missing(path):
+            return False
+        if not self._host._uses_direct_paths(path):
+            return True
+        old_dir = self._host.getcwd()
+        try:
+            self._host.chdir(path)
+        except ftputil.error.PermanentError:
+            return False
+        self._host.chdir(old_dir)
+        return True
+
+    def _check_listable(self, path):
+        """
+        Raise a `PermanentError` if the absolute `path` is known not
+        to be a directory or a link to one.
+        """
+        cache = self._lstat_cache
+        # Revalidating the listing later needs the modification time
+        # of the directory, from the listing of its parent directory.
+        if cache.revalidate_listings and not self._uses_mlsd() and \
+           path != self._host.sep and path not in cache:
+            self._real_lstat(path, False)
         # `listdir` should only be allowed for directories and links to them.
-        if not self._path.isdir(path):
+        if not self._may_be_dir(path):
             raise ftputil.error.PermanentError(
                   "550 {0}: no such directory or wrong directory parser used".
                   format(path))
-        # Set up for `for` loop.
-        names = []
-        for stat_result in self._stat_results_from_dir(path):
-            st_name = stat_result._st_name
-            names.append(st_name)
-        return names
+
+    def _real_listdir(self, path):
+        """
+        Return a list of directories, files etc. in the directory
+        named `path`.
+
+        Like `os.listdir` the returned list elements have the type
+        of the path argument.
+
+        If the directory listing from the server can't be parsed,
+        raise a `ParserError`.
+        """
+        return [stat_result._st_name
+                for stat_result in self._real_listdir_stat(path)]
 
     def _real_lstat(self, path, _exception_for_missing_path=True):
         """
@@ -605,6 +1153,18 @@ class _Stat(object):
         # If the path is in the cache, return the lstat result.
         if path in self._lstat_cache:
             return self._lstat_cache[path]
+        # A complete listing in the cache may tell that the path
+        # doesn't exist.
+        if self._lstat_cache.is_missing(path):
+            if _exception_for_missing_path:
+                raise ftputil.error.PermanentError(
+                      "550 {0}: no such file or directory".format(path))
+            return None
+        # With `MLST`, a single command gives the stat result for the
+        # path, even for the root directory.
+        if self._uses_mlsd():
+            return self._real_lstat_via_mlst(path,
+                                             _exception_for_missing_path)
         # Note: (l)stat works by going one directory up and parsing
         # the output of an FTP `LIST` command. Unfortunately, it is
         # not possible to do this for the root directory `/`.
@@ -612,22 +1172,35 @@ class _Stat(object):
             raise ftputil.error.RootDirError(
                   "can't stat remote root directory")
         dirname, basename = self._path.split(path)
-        # If even the directory doesn't exist and we don't want the
-        # exception, treat it the same as if the path wasn't found in the
-        # directory's contents (compare below). The use of `isdir` here
-        # causes a recursion but that should be ok because that will at
-        # the latest stop when we've gotten to the root directory.
-        if not self._path.isdir(dirname) and not _exception_for_missing_path:
+        # If even the directory doesn't exist, treat it the same as if
+        # the path wasn't found in the directory's contents (compare
+        # below). This check is needed even if we want the exception:
+        # if the server runs commands on absolute paths, `LIST` on a
+        # file returns the line for the file, which must not be taken
+        # as a directory listing. Don't use `isdir` here; it would
+        # stat the parent directory from the listing of the
+        # grandparent directory and so on up to the root directory.
+        if not self._may_be_dir(dirname):
+            if _exception_for_missing_path:
+                raise ftputil.error.PermanentError(
+                      "550 {0}: no such file or directory".format(path))
             return None
         # Loop through all lines of the directory listing. We
         # probably won't need all lines for the particular path but
         # we want to collect as many stat results in the cache as
         # possible.
         lstat_result_for_path = None
-        for stat_result in self._stat_results_from_dir(dirname):
-            # Needed to work without cache or with disabled cache.
-            if stat_result._st_name == basename:
-                lstat_result_for_path = stat_result
+        try:
+            for stat_result in self._stat_results_from_dir(dirname):
+                # Needed to work without cache or with disabled cache.
+                if stat_result._st_name == basename:
+                    lstat_result_for_path = stat_result
+        except ftputil.error.PermanentError:
+            # The directory can't be listed, e. g. because it doesn't
+            # exist.
+            if _exception_for_missing_path:
+                raise
+            return None
         if lstat_result_for_path is not None:
             return lstat_result_for_path
         # Path was not found during the loop.
@@ -645,6 +1218,27 @@ class _Stat(object):
             # severe error in the code above.
             return None
 
+    def _real_lstat_via_mlst(self, path, _exception_for_missing_path=True):
+        """
+        Return the lstat result for the absolute `path` from an FTP
+        `MLST` command.
+
+        If the `path` is not found, raise a `PermanentError` or, if
+        `_exception_for_missing_path` is false, return `None`.
+        """
+        try:
+            line = self._host._mlst(path)
+        except ftputil.error.PermanentError:
+            if _exception_for_missing_path:
+                raise
+            return None
+        stat_result = self._parser.parse_line(line, self._host.time_shift())
+        # The name in the `MLST` response is the full path (or "." if
+        # the server reports the type as `cdir`).
+        stat_result._st_name = self._path.basename(path)
+        self._lstat_cache[path] = stat_result
+        return stat_result
+
     def _real_stat(self, path, _exception_for_missing_path=True):
         """
         Return info from a "stat" call on `path`.
@@ -672,6 +1266,10 @@ class _Stat(object):
             # same as the `lstat` result.
             if not stat.S_ISLNK(lstat_result.st_mode):
                 return lstat_result
+            # Some `MLSD` servers mark links without telling the target,
+            # so there's nothing to follow.
+            if lstat_result._st_target is None:
+                return lstat_result
             # If we stat'ed a link, calculate a normalized path for
             # the file the link points to.
             dirname, _ = self._path.split(path)
@@ -686,6 +1284,57 @@ class _Stat(object):
             # Remember the path we have encountered.
             visited_paths.add(path)
 
+    def _needs_listing(self, path):
+        """
+        Return true if stat'ing the absolute `path` would list its
+        directory, i. e. if neither the cache nor an `MLST` command
+        can give the stat result.
+        """
+        cache = self._lstat_cache
+        return not self._uses_mlsd() and path not in cache and \
+               not cache.is_missing(path)
+
+    def _single_command(self, path, feature, method):
+        """
+        Return the result of `method(path)` if the server supports
+        `feature` and the stat result of `path` would otherwise need
+        a directory listing. Return `None` if the listing is needed
+        after all.
+        """
+        self._check_features()
+        if not (self._needs_listing(path) and
+                getattr(self._host.capabilities(), feature)):
+            return None
+        try:
+            return method(path)
+        # Missing paths and directories (for which many servers don't
+        # give a size) end up here. The listing will tell.
+        except (ftputil.error.PermanentError, ftputil.error.ParserError):
+            return None
+
+    def _getsize(self, path):
+        """
+        Return the size of `path`, following links. If possible, use
+        the `SIZE` command instead of listing the parent directory.
+        """
+        path = self._path.abspath(path)
+        size = self._single_command(path, "size", self._host._size)
+        if size is None:
+            size = self._stat(path).st_size
+        return size
+
+    def _exists(self, path):
+        """
+        Return true if `path` exists. If the server gives the size
+        of `path` with the `SIZE` command, it's a file (or a link to
+        one), so the parent directory needn't be listed.
+        """
+        path = self._path.abspath(path)
+        if self._single_command(path, "size", self._host._size) is not None:
+            return True
+        return self._lstat(path, _exception_for_missing_path=False) \
+               is not None
+
     def __call_with_parser_retry(self, method, *args, **kwargs):
         """
         Call `method` with the `args` and `kwargs` once. If that
@@ -693,6 +1342,7 @@ class _Stat(object):
         used yet, try the other parser. If that still fails,
         propagate the `ParserError`.
         """
+        self._check_features()
         # Do _not_ set `_allow_parser_switching` in a `finally` clause!
         # This would cause a `PermanentError` due to a not-found
         # file in an empty directory to finally establish the
@@ -701,7 +1351,8 @@ class _Stat(object):
             result = method(*args, **kwargs)
             # If a `listdir` call didn't find anything, we can't
             # say anything about the usefulness of the parser.
-            if (method is not self._real_listdir) and result:
+            if (method not in (self._real_listdir,
+                               self._real_listdir_stat)) and result:
                 self._allow_parser_switching = False
             return result
         except ftputil.error.ParserError:
@@ -724,6 +1375,44 @@ class _Stat(object):
         """
         return self.__call_with_parser_retry(self._real_listdir, path)
 
+    def _listdir_stat(self, path):
+        """
+        Return a list of `StatResult` objects for the items in `path`.
+
+        Raise a `PermanentError` if the path doesn't exist, but
+        maybe raise other exceptions depending on the state of
+        the server (e. g. timeout).
+        """
+        return self.__call_with_parser_retry(self._real_listdir_stat, path)
+
+    def _iter_listdir_stat(self, path):
+        """
+        Yield the `StatResult` objects for the items in `path` while
+        the listing is transferred.
+
+        Raise a `PermanentError` if the path doesn't exist, but
+        maybe raise other exceptions depending on the state of
+        the server (e. g. timeout).
+        """
+        self._check_features()
+        stat_results = self._real_iter_listdir_stat(path)
+        try:
+            first_stat_result = next(stat_results)
+        except StopIteration:
+            return
+        except ftputil.error.ParserError:
+            if not self._allow_parser_switching:
+                raise
+            # Nothing has been yielded yet, so the other parser can
+            # still be tried, as in `__call_with_parser_retry`.
+            self._allow_parser_switching = False
+            self._parser = MSParser()
+            stat_results = self._real_iter_listdir_stat(path)
+        else:
+            yield first_stat_result
+        for stat_result in stat_results:
+            yield stat_result
+
     def _lstat(self, path, _exception_for_missing_path=True):
         """
         Return a `StatResult` without following links.
@@ -8,8 +8,10 @@ ftp_stat_cache.py - cache for (l)stat data
 
 from __future__ import unicode_literals
 
+import stat
 import time
 
+import ftputil.compat
 import ftputil.error
 import ftputil.lrucache
 
@@ -18,6 +20,69 @@ import ftputil.lrucache
 __all__ = []
 
 
+class _PathNode(object):
+    """
+    Node for one path component in a `StatCache`.
+
+    The nodes form a tree like the directories on the server, so that
+    common path prefixes are stored only once and whole subtrees can
+    be found, removed or moved at once. The stat results of nodes
+    with a cache entry are stored in an `LRUCache` with the nodes as
+    keys.
+    """
+
+    # There's a node for each cached path.
+    __slots__ = ("name", "parent", "children", "mtime", "listed",
+                 "listed_mtime", "history")
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        # Dictionary from name to child node, or `None` for no children
+        self.children = None
+        # Time when the entry was set
+        self.mtime = None
+        # Time when the entries of all children were stored from a
+        # complete directory listing, or `None`
+        self.listed = None
+        # Modification time of the directory at the time of the listing
+        # if it can be used to revalidate the listing, else `None`
+        self.listed_mtime = None
+        # `_ListingHistory` of a listed directory if the cache adapts
+        # its maximum age, else `None`
+        self.history = None
+
+    def path(self):
+        """Return the absolute path of this node."""
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return "/" + "/".join(reversed(names))
+
+
+class _ListingHistory(object):
+    """
+    How often the listing of a directory has changed, for a
+    `StatCache` that adapts the maximum age of its listings.
+    """
+
+    __slots__ = ("digest", "max_age", "listings", "changes", "hits",
+                 "misses")
+
+    def __init__(self, digest, max_age):
+        # Hash of the names and stat results of the last listing
+        self.digest = digest
+        # Maximum age learned for the listing and its entries
+        self.max_age = max_age
+        self.listings = 1
+        self.changes = 0
+        # Requests for the listing which the cache could (not) answer
+        self.hits = 0
+        self.misses = 0
+
+
 class StatCache(object):
     """
     Implement an LRU (least-recently-used) cache.
@@ -34,6 +99,31 @@ class StatCache(object):
     that, the entry will be treated as if it had never been in the
     cache and should be fetched again from the remote host.
 
+    The entries are stored in a tree of path components (see
+    `_PathNode`), so that the entries for a directory and everything
+    below it can be invalidated, moved or enumerated in time
+    proportional to the size of the subtree.
+
+    After the entries for all items in a directory have been stored,
+    `mark_listed` records that the directory listing is complete, so
+    that `listing` can return it without asking the server again.
+    Invalidating, evicting or expiring an entry in the directory
+    makes the listing incomplete again. While it's complete, paths
+    which aren't in it are known to be missing (see `is_missing`).
+
+    If `revalidate_listings` is true, expired listings and their
+    entries are kept, so that they can be reused with `renew_listing`
+    if the modification time of the directory hasn't changed.
+
+    If `adaptive_max_age` is set to a pair `(minimum, maximum)` of
+    seconds, each listed directory gets a maximum age of its own,
+    starting at `minimum`. Each time the directory is listed again,
+    it's doubled if the listing is the same as before, and halved if
+    it has changed, within these limits. So listings of directories
+    which change often expire soon, and listings of directories
+    which rarely change are kept long. `listing_statistics` shows the
+    learned maximum ages.
+
     Note that the `__len__` method does no age tests and thus may
     include some or many already expired entries.
     """
@@ -46,10 +136,16 @@ class StatCache(object):
     _DEFAULT_CACHE_SIZE = 5000
 
     def __init__(self):
-        # Can be reset with method `resize`
+        # Stat results by `_PathNode`, in LRU order. Can be resized
+        # with method `resize`.
         self._cache = ftputil.lrucache.LRUCache(self._DEFAULT_CACHE_SIZE)
+        self.clear()
         # Never expire
         self.max_age = None
+        # Keep expired listings, see `stale_listing`
+        self.revalidate_listings = False
+        # Per-directory maximum age, `None` or `(minimum, maximum)`
+        self.adaptive_max_age = None
         self.enable()
 
     def enable(self):
@@ -75,22 +171,211 @@ class StatCache(object):
         If the new size is smaller than the current cache size,
         relatively long-unused elements will be removed.
         """
+        if not isinstance(new_size, ftputil.compat.int_types):
+            raise TypeError("cache size ({0!r}) must be an integer".
+                            format(new_size))
+        if new_size <= 0:
+            raise ValueError("cache size ({0:d}) must be positive".
+                             format(new_size))
+        # Evict here, not in the `LRUCache`, to update the tree.
+        while len(self._cache) > new_size:
+            self._evict()
         self._cache.size = new_size
 
-    def _age(self, path):
+    @property
+    def size(self):
+        """Maximum number of cache entries, see `resize`."""
+        return self._cache.size
+
+    #
+    # Path tree and LRU list
+    #
+    def _node(self, path, create=False):
         """
-        Return the age of a cache entry for `path` in seconds. If
-        the path isn't in the cache, raise a `CacheMissError`.
+        Return the node for the absolute `path`. If there's no node
+        for it, create it if `create` is true, else return `None`.
         """
-        try:
-            return time.time() - self._cache.mtime(path)
-        except ftputil.lrucache.CacheKeyError:
+        #XXX To be 100 % sure, this should be `host.sep`, but I don't
+        # want to introduce a reference to the `FTPHost` object for
+        # only that purpose.
+        assert path.startswith("/"), ("{0} must be an absolute path".
+                                      format(path))
+        # Consecutive lookups are usually in the same directory, so
+        # remember the node of the last one.
+        head, _, name = path.rpartition("/")
+        if head == self._dir_path:
+            parent = self._dir_node
+        else:
+            parent = self._walk(head, create)
+            if parent is None:
+                return None
+            self._dir_path, self._dir_node = head, parent
+        if not name:
+            return parent
+        children = parent.children
+        node = None if children is None else children.get(name)
+        if node is None and create:
+            if children is None:
+                children = parent.children = {}
+            node = children[name] = _PathNode(name, parent)
+        return node
+
+    def _walk(self, path, create):
+        """
+        Return the node for `path` (absolute, or "" for the root),
+        going down from the root. If there's no node for the path,
+        create it if `create` is true, else return `None`.
+        """
+        node = self._root
+        for name in path.split("/"):
+            if not name:
+                continue
+            children = node.children
+            child = None if children is None else children.get(name)
+            if child is None:
+                if not create:
+                    return None
+                if children is None:
+                    children = node.children = {}
+                child = children[name] = _PathNode(name, node)
+            node = child
+        return node
+
+    def _remove_entry(self, node):
+        """Remove the cache entry of `node`, but keep the node."""
+        del self._cache[node]
+        node.mtime = None
+
+    def _evict(self):
+        """Discard the entry of the least recently used node."""
+        node, _ = self._cache.popitem()
+        node.mtime = None
+        node.parent.listed = None
+        self._prune(node)
+
+    def _forget_listing(self, path):
+        """
+        Mark the listing of the directory containing the absolute
+        `path` as incomplete.
+        """
+        head = path.rstrip("/").rpartition("/")[0] or "/"
+        parent = self._node(head)
+        if parent is not None:
+            parent.listed = None
+
+    def _prune(self, node):
+        """
+        Remove `node` and then its ancestors from the tree while they
+        have neither an entry nor children.
+        """
+        while (node.parent is not None and node.children is None and
+               node not in self._cache):
+            self._detach(node)
+            node = node.parent
+
+    def _detach(self, node):
+        """Remove `node` (and thus its subtree) from its parent."""
+        parent = node.parent
+        del parent.children[node.name]
+        if not parent.children:
+            parent.children = None
+        # Forget the last directory node if it's in the subtree.
+        dir_node = self._dir_node
+        while dir_node is not None:
+            if dir_node is node:
+                self._dir_path = self._dir_node = None
+                break
+            dir_node = dir_node.parent
+
+    def _subtree(self, node):
+        """Return a list of `node` and all nodes below it."""
+        nodes = [node]
+        index = 0
+        while index < len(nodes):
+            children = nodes[index].children
+            if children is not None:
+                nodes.extend(children.values())
+            index += 1
+        return nodes
+
+    def _age(self, node):
+        """
+        Return the age of the cache entry of `node` in seconds. If
+        the node has no entry, raise a `CacheMissError`.
+        """
+        if node not in self._cache:
+            raise ftputil.error.CacheMissError(
+                    "no entry for path {0} in cache".format(node.path()))
+        return time.time() - node.mtime
+
+    def _max_age(self, dir_node):
+        """
+        Return the maximum age for the listing of the directory
+        `dir_node` and its entries (`None` for no limit).
+        """
+        if dir_node is not None and dir_node.history is not None and \
+           self.adaptive_max_age is not None:
+            return dir_node.history.max_age
+        return self.max_age
+
+    def _learn(self, node, changed):
+        """
+        Adapt the maximum age of the listing of the directory `node`
+        after it has been listed again, depending on whether the
+        listing has `changed`.
+        """
+        minimum, maximum = self.adaptive_max_age
+        history = node.history
+        history.listings += 1
+        if changed:
+            history.changes += 1
+            history.max_age = max(minimum, history.max_age / 2.0)
+        else:
+            history.max_age = min(maximum, history.max_age * 2.0)
+
+    def _observe_listing(self, node):
+        """
+        Compare the listing of the directory `node` which has just
+        been stored with the previous one, if the cache adapts its
+        maximum ages.
+        """
+        if self.adaptive_max_age is None:
+            return
+        children = node.children or {}
+        digest = hash(frozenset((name, self._cache[child])
+                                for name, child in children.items()
+                                if child in self._cache))
+        history = node.history
+        if history is None:
+            node.history = _ListingHistory(digest,
+                                           float(self.adaptive_max_age[0]))
+            return
+        self._learn(node, changed=digest != history.digest)
+        history.digest = digest
+
+    def _get(self, node, path):
+        """Return the stat entry for `node`, which is for `path`."""
+        max_age = self._max_age(node.parent)
+        # Possibly raise a `CacheMissError` in `_age`
+        if (max_age is not None) and (self._age(node) > max_age):
+            # Keep the entries of a listing that may be revalidated.
+            if not (self.revalidate_listings and node.parent is not None and
+                    node.parent.listed_mtime is not None):
+                self.invalidate(path)
             raise ftputil.error.CacheMissError(
-                    "no entry for path {0} in cache".format(path))
+                    "entry for path {0} has expired".format(path))
+        if node not in self._cache:
+            raise ftputil.error.CacheMissError(
+                    "entry for path {0} not found".format(path))
+        return self._cache[node]
 
     def clear(self):
         """Clear (invalidate) all cache entries."""
         self._cache.clear()
+        self._root = _PathNode("", None)
+        # Directory path and node of the last lookup (see `_node`)
+        self._dir_path = None
+        self._dir_node = None
 
     def invalidate(self, path):
         """
@@ -100,48 +385,348 @@ class StatCache(object):
 
         If no stat result for `path` is in the cache, do _not_
         raise an exception.
+
+        In any case, the listing of the directory containing `path`
+        is no longer complete, so that `path` is listed or left out
+        correctly after it has been created or removed.
         """
-        #XXX To be 100 % sure, this should be `host.sep`, but I don't
-        # want to introduce a reference to the `FTPHost` object for
-        # only that purpose.
-        assert path.startswith("/"), ("{0} must be an absolute path".
-                                      format(path))
-        try:
-            del self._cache[path]
-        except ftputil.lrucache.CacheKeyError:
-            # Ignore errors
-            pass
+        self._forget_listing(path)
+        node = self._node(path)
+        if node is None or node not in self._cache:
+            return
+        self._remove_entry(node)
+        self._prune(node)
 
-    def __getitem__(self, path):
+    def invalidate_subtree(self, path):
         """
-        Return the stat entry for the `path`. If there's no stored
-        stat entry or the cache is disabled, raise `CacheMissError`.
+        Invalidate the cache entries for the absolute `path` and all
+        paths below it, e. g. after removing a directory tree.
+        """
+        self._forget_listing(path)
+        node = self._node(path)
+        if node is None:
+            return
+        if node is self._root:
+            self.clear()
+            return
+        for subtree_node in self._subtree(node):
+            if subtree_node in self._cache:
+                self._remove_entry(subtree_node)
+        self._detach(node)
+        self._prune(node.parent)
+
+    def move_subtree(self, source, target):
+        """
+        Move the cache entries below the absolute path `source` to
+        the corresponding paths below `target`, e. g. after renaming
+        a directory. The entries for `source` itself and any entries
+        for `target` and below are invalidated.
+        """
+        self.invalidate_subtree(target)
+        self._forget_listing(source)
+        node = self._node(source)
+        if node is None:
+            return
+        if node is self._root:
+            self.clear()
+            return
+        if node in self._cache:
+            self._remove_entry(node)
+        self._detach(node)
+        self._prune(node.parent)
+        if node.children is None:
+            return
+        target_parent, _, target_name = target.rstrip("/").rpartition("/")
+        new_parent = self._node(target_parent or "/", create=True)
+        if new_parent.children is None:
+            new_parent.children = {}
+        new_parent.children[target_name] = node
+        node.name = target_name
+        node.parent = new_parent
+
+    def _drop_other_children(self, node, names):
+        """
+        Remove the children of the directory `node` whose names aren't
+        in the set `names`, with all entries below them.
+        """
+        if node.children is None:
+            return
+        for name, child in list(node.children.items()):
+            if name in names:
+                continue
+            for subtree_node in self._subtree(child):
+                if subtree_node in self._cache:
+                    self._remove_entry(subtree_node)
+            self._detach(child)
+
+    def mark_listed(self, path, mtime=None, names=None):
+        """
+        Record that the entries for all items in the directory at
+        the absolute `path` have just been stored, e. g. from a
+        directory listing.
+
+        `mtime` is the modification time of the directory from
+        before the listing, if it's precise enough to tell whether
+        the directory has changed since (see `stale_listing`).
+
+        `names` are the names of the items in the listing. Cached
+        entries for other items in the directory (and below them)
+        are removed since these items don't exist any more. Without
+        `names`, the stored entries are taken as the listing.
+        """
+        if not self._enabled:
+            return
+        node = self._node(path, create=True)
+        if names is not None:
+            self._drop_other_children(node, frozenset(names))
+        node.listed = time.time()
+        node.listed_mtime = mtime
+        self._observe_listing(node)
+
+    def listing(self, path):
+        """
+        Return a list of the stat results for the items in the
+        directory at the absolute `path`, if they have been stored
+        with `mark_listed`. If the listing is incomplete, has expired
+        or the cache is disabled, raise a `CacheMissError`.
         """
         if not self._enabled:
             raise ftputil.error.CacheMissError("cache is disabled")
-        # Possibly raise a `CacheMissError` in `_age`
-        if (self.max_age is not None) and (self._age(path) > self.max_age):
-            self.invalidate(path)
+        node = self._node(path)
+        history = None if node is None else node.history
+        if node is None or node.listed is None:
+            if history is not None:
+                history.misses += 1
             raise ftputil.error.CacheMissError(
-                    "entry for path {0} has expired".format(path))
+                    "no listing for path {0} in cache".format(path))
+        if not self._is_listed(node):
+            if history is not None:
+                history.misses += 1
+            raise ftputil.error.CacheMissError(
+                    "listing for path {0} has expired".format(path))
+        if node.children is None:
+            stat_results = []
         else:
-            #XXX I don't know if this may raise a `CacheMissError` in
-            # case of race conditions. I prefer robust code.
+            # Use the path of `node`, which is normalized.
+            prefix = node.path().rstrip("/") + "/"
+            # Get all entries first, so that expiring ones make the
+            # listing incomplete before any is returned.
             try:
-                return self._cache[path]
-            except ftputil.lrucache.CacheKeyError:
+                stat_results = [self._get(child, prefix + name)
+                                for name, child in
+                                list(node.children.items())]
+            except ftputil.error.CacheMissError:
+                if history is not None:
+                    history.misses += 1
+                raise
+        if history is not None:
+            history.hits += 1
+        return stat_results
+
+    def _is_listed(self, node):
+        """
+        Return true if `node` has a complete listing which hasn't
+        expired.
+        """
+        max_age = self._max_age(node)
+        return node.listed is not None and \
+               (max_age is None or time.time() - node.listed <= max_age)
+
+    def is_missing(self, path):
+        """
+        Return true if the absolute `path` is known not to exist
+        because the complete listing of a directory above it doesn't
+        contain the next path component, or contains it as neither a
+        directory nor a link. Else (e. g. if there's no such listing
+        or the cache is disabled) return false.
+
+        Changes through the `FTPHost` make the listings incomplete,
+        so created paths aren't missing any longer.
+        """
+        if not self._enabled:
+            return False
+        names = [name for name in path.split("/") if name]
+        node = self._root
+        for index, name in enumerate(names):
+            children = node.children
+            child = None if children is None else children.get(name)
+            if self._is_listed(node):
+                if child is None or child not in self._cache:
+                    return True
+                mode = self._cache[child].st_mode
+                if index < len(names) - 1 and \
+                   not (stat.S_ISDIR(mode) or stat.S_ISLNK(mode)):
+                    return True
+            elif child is None:
+                return False
+            node = child
+        return False
+
+    def add_listing(self, path, stat_results, mtime=None, listed=None):
+        """
+        Store the `stat_results` (with their `_st_name` attribute)
+        of a complete listing of the directory at the absolute `path`
+        and mark it as listed, as if that happened at the time
+        `listed` (default: now). Cached entries for items which aren't
+        in the listing are removed. `mtime` is the same as for
+        `mark_listed`.
+
+        This is useful to restore listings stored elsewhere, e. g.
+        on disk. If they're older than `max_age`, they're only used
+        after revalidation (see `revalidate_listings`).
+        """
+        if not self._enabled:
+            return
+        if listed is None:
+            listed = time.time()
+        node = self._node(path, create=True)
+        self._drop_other_children(
+          node, frozenset(stat_result._st_name for stat_result in stat_results))
+        prefix = path.rstrip("/") + "/"
+        for stat_result in stat_results:
+            self._set(prefix + stat_result._st_name, stat_result, listed)
+        # With more entries than fit in the cache, some have been evicted.
+        if len(stat_results) <= self.size:
+            node = self._node(path, create=True)
+            node.listed = listed
+            node.listed_mtime = mtime
+            self._observe_listing(node)
+
+    def listing_mtime(self, path):
+        """
+        Return the modification time of the directory at the absolute
+        `path` passed to `mark_listed` for its listing, or `None`.
+        """
+        node = self._node(path)
+        return None if node is None else node.listed_mtime
+
+    def stale_listing(self, path):
+        """
+        Return a tuple `(mtime, stat_results)` for the complete, but
+        maybe expired listing of the directory at the absolute `path`.
+        `mtime` is the modification time passed to `mark_listed`.
+
+        If the listing is incomplete, has no modification time, the
+        cache is disabled or `revalidate_listings` is false, raise a
+        `CacheMissError`.
+        """
+        if not (self._enabled and self.revalidate_listings):
+            raise ftputil.error.CacheMissError(
+                    "listings aren't revalidated")
+        node = self._node(path)
+        if node is None or node.listed is None or node.listed_mtime is None:
+            raise ftputil.error.CacheMissError(
+                    "no listing to revalidate for path {0}".format(path))
+        children = node.children.values() if node.children else []
+        stat_results = []
+        for child in children:
+            if child not in self._cache:
                 raise ftputil.error.CacheMissError(
-                        "entry for path {0} not found".format(path))
+                        "listing for path {0} is incomplete".format(path))
+            stat_results.append(self._cache[child])
+        return node.listed_mtime, stat_results
+
+    def renew_listing(self, path):
+        """
+        Treat the listing of the directory at the absolute `path` and
+        its entries as if they had just been stored, after finding
+        out that the directory hasn't changed.
+        """
+        node = self._node(path)
+        if node is None or node.listed is None:
+            return
+        now = time.time()
+        node.listed = now
+        cache = self._cache
+        for child in (node.children or {}).values():
+            if child in cache:
+                child.mtime = now
+                # Make it the most recently used entry.
+                cache[child] = cache[child]
+        if node.history is not None and self.adaptive_max_age is not None:
+            self._learn(node, changed=False)
+
+    def listing_statistics(self):
+        """
+        Return a dictionary from the absolute paths of the listed
+        directories to dictionaries with the learned maximum age of
+        the listing (`max_age`), how often it was listed (`listings`)
+        and found changed (`changes`), and how often the cache could
+        or couldn't answer requests for it (`hits`, `misses` and
+        `hit_ratio`, `None` without requests).
+
+        Statistics are only collected if `adaptive_max_age` is set.
+        """
+        statistics = {}
+        for node in self._subtree(self._root):
+            history = node.history
+            if history is None:
+                continue
+            requests = history.hits + history.misses
+            statistics[node.path()] = {
+              "max_age": history.max_age,
+              "listings": history.listings,
+              "changes": history.changes,
+              "hits": history.hits,
+              "misses": history.misses,
+              "hit_ratio": float(history.hits) / requests if requests
+                           else None}
+        return statistics
+
+    def iter_subtree(self, path):
+        """
+        Yield `(path, stat_result)` pairs for the cached entries of
+        the absolute `path` and all paths below it.
+        """
+        node = self._node(path)
+        if node is None:
+            return
+        pending = [(node, node.path())]
+        while pending:
+            node, path = pending.pop()
+            if node.children is not None:
+                prefix = path.rstrip("/") + "/"
+                pending.extend((child, prefix + name)
+                               for name, child in node.children.items())
+            if node in self._cache:
+                try:
+                    yield path, self._get(node, path)
+                except ftputil.error.CacheMissError:
+                    pass
+
+    def __getitem__(self, path):
+        """
+        Return the stat entry for the `path`. If there's no stored
+        stat entry or the cache is disabled, raise `CacheMissError`.
+        """
+        if not self._enabled:
+            raise ftputil.error.CacheMissError("cache is disabled")
+        node = self._node(path)
+        if node is None:
+            raise ftputil.error.CacheMissError(
+                    "entry for path {0} not found".format(path))
+        return self._get(node, path)
 
     def __setitem__(self, path, stat_result):
         """
         Put the stat data for the absolute `path` into the cache,
         unless it's disabled.
         """
-        assert path.startswith("/")
         if not self._enabled:
             return
-        self._cache[path] = stat_result
+        self._set(path, stat_result, time.time())
+
+    def _set(self, path, stat_result, mtime):
+        """Store `stat_result` for `path`, as if set at time `mtime`."""
+        node = self._node(path, create=True)
+        cache = self._cache
+        # Evict here, not in the `LRUCache`, to update the tree. The
+        # node is a child of its parent now, so evicting won't remove
+        # it or its ancestors from the tree.
+        if node not in cache and len(cache) >= cache.size:
+            self._evict()
+        cache[node] = stat_result
+        node.mtime = mtime
 
     def __contains__(self, path):
         """
@@ -169,6 +754,6 @@ class StatCache(object):
     def __str__(self):
         """Return a string representation of the cache contents."""
         lines = []
-        for key in sorted(self._cache):
-            lines.append("{0}: {1}".format(key, self[key]))
+        for path, stat_result in sorted(self.iter_subtree("/")):
+            lines.append("{0}: {1}".format(path, stat_result))
         return "\n".join(lines)
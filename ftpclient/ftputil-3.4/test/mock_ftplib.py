@@ -128,6 +128,12 @@ class MockSession(object):
         else:
             raise ftplib.error_perm
 
+    def sendcmd(self, cmd):
+        if DEBUG:
+            print(cmd)
+        # `FEAT` isn't supported by default.
+        raise ftplib.error_perm("500 {0} not understood".format(cmd))
+
     def pwd(self):
         return self.current_dir
 
@@ -186,6 +192,8 @@ class MockSession(object):
         """
         if DEBUG:
             print(cmd)
+        if cmd.startswith(("LIST", "MLSD")):
+            return self._listing_transfercmd(cmd)
         # Fail if attempting to read from/write to a directory.
         cmd, path = cmd.split()
         #  Normalize path for lookup.
@@ -200,6 +208,22 @@ class MockSession(object):
         self._transfercmds += 1
         return MockSocket(path, self.mock_file_content)
 
+    def _listing_transfercmd(self, cmd):
+        """
+        Return a `MockSocket` object for reading the directory listing
+        requested with `cmd`.
+        """
+        args = cmd.split(" ")[1:]
+        if args[:1] == ["-a"]:
+            args = args[1:]
+        path = self._transform_path(" ".join(args))
+        if path not in self.dir_contents:
+            raise ftplib.error_perm("550 {0}: No such directory".format(path))
+        assert self._transfercmds == 0
+        self._transfercmds += 1
+        listing = "\r\n".join(self.dir_contents[path].split("\n")) + "\r\n"
+        return MockSocket(path, listing.encode(ftputil.tool.LOSSLESS_ENCODING))
+
     def close(self):
         if not self.closed:
             self.closed = 1
@@ -284,3 +308,64 @@ class MockMSFormatSession(MockSession):
 
       "/home/msformat/XPLaunch/empty": "total 0",
     }
+
+
+class MockMLSDSession(MockSession):
+    """
+    Mock session for a server which supports the `MLSD` and `MLST`
+    commands.
+    """
+
+    # Mapping from absolute path to the `MLSD` lines for the directory
+    dir_contents = {
+      "/": """\
+type=cdir;modify=20000504120000;UNIX.mode=0755; /
+type=dir;modify=20000504120000;UNIX.mode=0755;UNIX.owner=45854;UNIX.group=200; home""",
+
+      "/home": """\
+type=cdir;modify=20000504120000;UNIX.mode=0755; /home
+type=pdir;modify=20000504120000;UNIX.mode=0755; /
+type=dir;sizd=512;modify=20000504120000;UNIX.mode=02755;UNIX.owner=45854;UNIX.group=200; sschwarzer
+type=file;size=4604;modify=20180620101112;UNIX.mode=0644;UNIX.owner=45854;UNIX.group=200; index.html
+type=OS.unix=slink:/home/sschwarzer;modify=20020119000000;UNIX.mode=0777; link
+type=file;size=12;modify=20180620101112.5;UNIX.mode=0644; file with spaces""",
+
+      "/home/sschwarzer": """\
+type=cdir;modify=20000504120000;UNIX.mode=02755; .
+type=pdir;modify=20000504120000;UNIX.mode=0755; ..""",
+    }
+
+    def sendcmd(self, cmd):
+        if DEBUG:
+            print(cmd)
+        if cmd == "FEAT":
+            return ("211-Features:\n"
+                    " MDTM\n"
+                    " MLST type*;size*;sizd*;modify*;UNIX.mode*;\n"
+                    " SIZE\n"
+                    "211 End")
+        elif cmd.startswith("MLST "):
+            path = self._transform_path(cmd[len("MLST "):])
+            head, tail = posixpath.split(path)
+            if path == "/":
+                facts_line = self.dir_contents["/"].split("\n")[0]
+            else:
+                for line in self.dir_contents.get(head, "").split("\n"):
+                    if line.endswith("; " + tail):
+                        facts_line = line.replace("; " + tail, "; " + path)
+                        break
+                else:
+                    raise ftplib.error_perm(
+                            "550 {0}: No such file or directory".format(path))
+            return "250-Listing {0}\n {1}\n250 End".format(path, facts_line)
+        else:
+            raise ftplib.error_perm("500 {0} not understood".format(cmd))
+
+    def retrlines(self, cmd, callback=None):
+        if DEBUG:
+            print(cmd)
+        path = self._transform_path(cmd[len("MLSD "):])
+        if path not in self.dir_contents:
+            raise ftplib.error_perm("550 {0}: No such directory".format(path))
+        for line in self.dir_contents[path].split("\n"):
+            callback(line)
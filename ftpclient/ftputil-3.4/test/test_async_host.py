@@ -0,0 +1,395 @@
+# Copyright (C) 2018, ftputil contributors (see `doc/contributors.txt`)
+# See the file LICENSE for licensing terms.
+
+# `ftputil.async_host` and these tests need Python 3.6 or later.
+
+import asyncio
+import posixpath
+import stat
+
+import pytest
+
+import ftputil.error
+import ftputil.stat
+from ftputil.async_host import AsyncFTPHost
+
+
+class _FakeServer(object):
+    """
+    A minimal FTP server with an in-memory file system, listening on
+    localhost. Files are byte strings, directories are `None`.
+    """
+
+    def __init__(self, mlsd=False, epsv=True):
+        self.mlsd = mlsd
+        self.epsv = epsv
+        self.files = {
+          "/": None,
+          "/home": None,
+          "/home/file1": b"content 1",
+          "/home/file2": b"",
+          "/home/dir1": None,
+          "/home/dir1/file3": b"content 3",
+          "/home/dir1/dir2": None,
+          "/home/dir1/dir2/file4": b"content 4",
+          "/home/dir3": None,
+          "/home/link": "dir1",
+        }
+        self.commands = []
+        self.connections = 0
+        self.max_connections = 0
+        self._server = None
+        self.port = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle,
+                                                  "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _children(self, path):
+        prefix = path.rstrip("/") + "/"
+        return sorted(name[len(prefix):] for name in self.files
+                      if name.startswith(prefix) and name != prefix and
+                         "/" not in name[len(prefix):])
+
+    def _unix_line(self, path):
+        content = self.files[path]
+        name = posixpath.basename(path)
+        if content is None:
+            mode, size = "drwxr-xr-x", 512
+        elif isinstance(content, str):
+            mode, size = "lrwxrwxrwx", len(content)
+            name = "{0} -> {1}".format(name, content)
+        else:
+            mode, size = "-rw-r--r--", len(content)
+        return "{0}   1 user group {1:8d} Jan 01  2015 {2}".format(
+                 mode, size, name)
+
+    def _facts(self, path):
+        content = self.files[path]
+        if content is None:
+            type_, size = "dir", 0
+        elif isinstance(content, str):
+            # Links are shown as their targets with `MLSD`.
+            return self._facts(posixpath.join(posixpath.dirname(path),
+                                              content))
+        else:
+            type_, size = "file", len(content)
+        return "type={0};size={1};modify=20150101000000;perm=r;".format(
+                 type_, size)
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self.max_connections = max(self.max_connections, self.connections)
+        data_server = None
+        data_connection = asyncio.Future()
+        cwd = "/home"
+        rename_source = None
+
+        def reply(text):
+            writer.write(text.encode("latin-1") + b"\r\n")
+
+        def on_data_connection(data_reader, data_writer):
+            if not data_connection.done():
+                data_connection.set_result((data_reader, data_writer))
+
+        async def transfer(send=None):
+            reply("150 Opening data connection")
+            data_reader, data_writer = await data_connection
+            data_server.close()
+            if send is None:
+                received = await data_reader.read()
+                data_writer.close()
+                return received
+            data_writer.write(send)
+            await data_writer.drain()
+            data_writer.close()
+
+        reply("220 Fake server ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode("latin-1").rstrip("\r\n")
+                self.commands.append(line)
+                command, _, argument = line.partition(" ")
+                command = command.upper()
+                path = posixpath.normpath(posixpath.join(cwd, argument))
+                if command == "USER":
+                    reply("331 Password required")
+                elif command == "PASS":
+                    reply("230 Logged in")
+                elif command == "PWD":
+                    reply('257 "/home" is the current directory')
+                elif command == "FEAT":
+                    features = [" MLST type*;size*;modify*;"] \
+                               if self.mlsd else []
+                    reply("\r\n".join(["211-Features:"] + features +
+                                      ["211 End"]))
+                elif command == "TYPE":
+                    reply("200 Type set")
+                elif command in ("EPSV", "PASV"):
+                    if command == "EPSV" and not self.epsv:
+                        reply("500 EPSV not understood")
+                        continue
+                    data_connection = asyncio.Future()
+                    data_server = await asyncio.start_server(
+                                    on_data_connection, "127.0.0.1", 0)
+                    port = data_server.sockets[0].getsockname()[1]
+                    if command == "EPSV":
+                        reply("229 Entering Extended Passive Mode "
+                              "(|||{0}|)".format(port))
+                    else:
+                        reply("227 Entering Passive Mode "
+                              "(10,0,0,1,{0},{1})".format(port >> 8,
+                                                          port & 0xff))
+                elif command == "CWD":
+                    if self.files.get(path, b"") is None:
+                        cwd = path
+                        reply("250 OK")
+                    else:
+                        reply("550 No such directory")
+                elif command == "LIST":
+                    lines = [self._unix_line(posixpath.join(cwd, name))
+                             for name in self._children(cwd)]
+                    await transfer("".join(line + "\r\n"
+                                           for line in lines).encode())
+                    reply("226 Done")
+                elif command == "MLSD":
+                    if self.files.get(path, b"") is not None:
+                        reply("550 No such directory")
+                        continue
+                    lines = ["{0} {1}".format(
+                               self._facts(posixpath.join(path, name)), name)
+                             for name in self._children(path)]
+                    await transfer("".join(line + "\r\n"
+                                           for line in lines).encode())
+                    reply("226 Done")
+                elif command == "MLST":
+                    if path not in self.files:
+                        reply("550 No such file")
+                    else:
+                        reply("250-Listing\r\n {0} {1}\r\n250 End".format(
+                                self._facts(path), path))
+                elif command == "RETR":
+                    if not isinstance(self.files.get(path), bytes):
+                        reply("550 No such file")
+                        continue
+                    await transfer(self.files[path])
+                    reply("226 Done")
+                elif command == "STOR":
+                    self.files[path] = await transfer()
+                    reply("226 Done")
+                elif command in ("DELE", "RMD"):
+                    is_dir = self.files.get(path, b"") is None
+                    if path not in self.files or \
+                       (command == "RMD") != is_dir or \
+                       (is_dir and self._children(path)):
+                        reply("550 Can't remove")
+                    else:
+                        del self.files[path]
+                        reply("250 Removed")
+                elif command == "MKD":
+                    if path in self.files:
+                        reply("550 Exists")
+                    else:
+                        self.files[path] = None
+                        reply('257 "{0}" created'.format(path))
+                elif command == "RNFR":
+                    rename_source = path
+                    reply("350 Ready")
+                elif command == "RNTO":
+                    for name in sorted(self.files):
+                        if name == rename_source or \
+                           name.startswith(rename_source + "/"):
+                            new_name = path + name[len(rename_source):]
+                            self.files[new_name] = self.files.pop(name)
+                    reply("250 Renamed")
+                elif command == "QUIT":
+                    reply("221 Bye")
+                    break
+                else:
+                    reply("502 Not implemented")
+                await writer.drain()
+        finally:
+            self.connections -= 1
+            writer.close()
+
+
+def _run(test, **server_options):
+    """
+    Run the coroutine function `test` with a started `_FakeServer`
+    and an `AsyncFTPHost` connected to it.
+    """
+    async def main():
+        server = _FakeServer(**server_options)
+        await server.start()
+        try:
+            async with AsyncFTPHost("127.0.0.1", "user", "password",
+                                    port=server.port,
+                                    max_sessions=3) as host:
+                await test(server, host)
+        finally:
+            await server.stop()
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+
+@pytest.fixture(params=[False, True], ids=["LIST", "MLSD"])
+def mlsd(request):
+    return request.param
+
+
+class TestAsyncFTPHost(object):
+
+    def test_connect(self):
+        async def test(server, host):
+            assert host.getcwd() == "/home"
+            assert isinstance(host._parser, ftputil.stat.UnixParser)
+        _run(test)
+
+    def test_mlsd_parser(self):
+        async def test(server, host):
+            assert isinstance(host._parser, ftputil.stat.MLSDParser)
+        _run(test, mlsd=True)
+
+    def test_listdir(self, mlsd):
+        async def test(server, host):
+            assert await host.listdir("/home") == \
+                   ["dir1", "dir3", "file1", "file2", "link"]
+            assert await host.listdir("dir1") == ["dir2", "file3"]
+            names = [name for name, _ in await host.listdir_stat("dir1")]
+            assert names == ["dir2", "file3"]
+            with pytest.raises(ftputil.error.PermanentError):
+                await host.listdir("/home/missing")
+        _run(test, mlsd=mlsd)
+
+    def test_listdir_uses_cache(self):
+        async def test(server, host):
+            await host.listdir("/home/dir1")
+            count = server.commands.count("LIST -a")
+            await host.listdir("/home/dir1")
+            await host.lstat("/home/dir1/file3")
+            assert server.commands.count("LIST -a") == count
+        _run(test)
+
+    def test_stat(self, mlsd):
+        async def test(server, host):
+            stat_result = await host.lstat("/home/file1")
+            assert stat_result.st_size == 9
+            assert stat.S_ISREG(stat_result.st_mode)
+            assert await host.isdir("/home/dir1/dir2")
+            assert await host.isfile("dir1/file3")
+            assert not await host.isfile("/home/dir1")
+            assert await host.exists("/home/file2")
+            assert not await host.exists("/home/missing")
+            assert not await host.exists("/home/missing/file")
+            with pytest.raises(ftputil.error.PermanentError):
+                await host.lstat("/home/missing")
+            # Links are only shown as such in `LIST` listings.
+            assert await host.isdir("/home/link")
+            assert await host.islink("/home/link") == (not mlsd)
+        _run(test, mlsd=mlsd)
+
+    def test_walk(self, mlsd):
+        async def test(server, host):
+            result = []
+            async for item in host.walk("/home"):
+                result.append(item)
+            assert result == [
+              ("/home", ["dir1", "dir3", "link"], ["file1", "file2"]),
+              ("/home/dir1", ["dir2"], ["file3"]),
+              ("/home/dir1/dir2", [], ["file4"]),
+              ("/home/dir3", [], []),
+            ] if not mlsd else [
+              ("/home", ["dir1", "dir3", "link"], ["file1", "file2"]),
+              ("/home/dir1", ["dir2"], ["file3"]),
+              ("/home/dir1/dir2", [], ["file4"]),
+              ("/home/dir3", [], []),
+              ("/home/link", [], []),
+            ]
+            result = []
+            async for item in host.walk("/home", topdown=False):
+                result.append(item[0])
+            assert result[-1] == "/home"
+        _run(test, mlsd=mlsd)
+
+    def test_open_and_transfers(self, tmpdir):
+        async def test(server, host):
+            async with await host.open("/home/dir1/file3") as fobj:
+                assert await fobj.read() == b"content 3"
+            async with await host.open("/home/new", "wb") as fobj:
+                await fobj.write(b"new ")
+                await fobj.write(b"content")
+            assert server.files["/home/new"] == b"new content"
+            with pytest.raises(ftputil.error.FTPIOError):
+                await host.open("/home/missing")
+            # The session is still usable after the error.
+            assert await host.listdir("/home/dir3") == []
+            source = tmpdir.join("source")
+            source.write_binary(b"x" * 100000)
+            chunks = []
+            await host.upload(str(source), "/home/uploaded",
+                              callback=chunks.append)
+            assert server.files["/home/uploaded"] == b"x" * 100000
+            assert sum(len(chunk) for chunk in chunks) == 100000
+            target = tmpdir.join("target")
+            await host.download("/home/uploaded", str(target))
+            assert target.read_binary() == b"x" * 100000
+        _run(test)
+
+    def test_pasv_fallback(self):
+        async def test(server, host):
+            assert await host.listdir("/home/dir1") == ["dir2", "file3"]
+            assert "PASV" in server.commands
+        _run(test, epsv=False)
+
+    def test_changes(self, mlsd):
+        async def test(server, host):
+            await host.mkdir("/home/dir3/new")
+            assert await host.listdir("/home/dir3") == ["new"]
+            await host.rename("/home/dir3/new", "/home/dir3/renamed")
+            assert await host.listdir("/home/dir3") == ["renamed"]
+            await host.rmdir("/home/dir3/renamed")
+            assert await host.listdir("/home/dir3") == []
+            await host.remove("/home/file1")
+            assert not await host.exists("/home/file1")
+        _run(test, mlsd=mlsd)
+
+    def test_rmtree(self, mlsd):
+        async def test(server, host):
+            await host.rmtree("/home/dir1")
+            assert not any(name.startswith("/home/dir1")
+                           for name in server.files)
+            assert not await host.exists("/home/dir1")
+            with pytest.raises(ftputil.error.PermanentError):
+                await host.rmtree("/home/missing")
+            errors = []
+            await host.rmtree("/home/missing",
+                              onerror=lambda *args: errors.append(args[0]))
+            assert errors == [host.listdir, host.rmdir]
+            await host.rmtree("/home/missing", ignore_errors=True)
+        _run(test, mlsd=mlsd)
+
+    def test_concurrency(self):
+        async def test(server, host):
+            results = await asyncio.gather(
+                        *[host.open("/home/file1") for _ in range(3)])
+            # All sessions are busy, so another command has to wait.
+            task = asyncio.ensure_future(host.listdir("/home/dir3"))
+            await asyncio.sleep(0.1)
+            assert not task.done()
+            for fobj in results:
+                assert await fobj.read() == b"content 1"
+                await fobj.close()
+            assert await task == []
+            assert server.max_connections == 3
+        _run(test)
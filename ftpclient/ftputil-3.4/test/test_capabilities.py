@@ -0,0 +1,59 @@
+# Copyright (C) 2018, ftputil contributors (see `doc/contributors.txt`)
+# See the file LICENSE for licensing terms.
+
+from __future__ import unicode_literals
+
+from ftputil.capabilities import Capabilities
+
+
+FEAT_RESPONSE = """\
+211-Features:
+ EPSV
+ HASH SHA-256;SHA-1*;MD5
+ MDTM
+ MLST type*;size*;modify*;UNIX.mode;
+ REST STREAM
+ SIZE
+ UTF8
+ XCRC
+ XMD5
+211 End"""
+
+
+class TestCapabilities(object):
+
+    def test_from_feat_response(self):
+        capabilities = Capabilities.from_feat_response(FEAT_RESPONSE)
+        assert "mlst" in capabilities
+        assert "MLSD" not in capabilities
+        assert capabilities.parameters("REST") == "STREAM"
+        assert capabilities.parameters("SIZE") == ""
+        assert capabilities.parameters("AUTH") is None
+        for name in ("mlst", "size", "mdtm", "rest_stream", "utf8", "epsv"):
+            assert getattr(capabilities, name)
+
+    def test_no_features(self):
+        capabilities = Capabilities.from_feat_response("")
+        assert capabilities.as_dict() == {}
+        assert not capabilities.mlst
+        assert not capabilities.rest_stream
+        assert capabilities.mlst_facts() == []
+        assert capabilities.hash_algorithms() == []
+
+    def test_rest_without_stream(self):
+        assert not Capabilities({"REST": ""}).rest_stream
+
+    def test_mlst_facts(self):
+        capabilities = Capabilities.from_feat_response(FEAT_RESPONSE)
+        assert capabilities.mlst_facts() == ["type", "size", "modify",
+                                             "unix.mode"]
+
+    def test_hash_algorithms(self):
+        capabilities = Capabilities.from_feat_response(FEAT_RESPONSE)
+        assert capabilities.hash_algorithms() == ["SHA-256", "SHA-1", "MD5",
+                                                  "CRC32"]
+
+    def test_as_dict_round_trip(self):
+        capabilities = Capabilities.from_feat_response(FEAT_RESPONSE)
+        assert Capabilities(capabilities.as_dict()) == capabilities
+        assert Capabilities({"size": ""}).as_dict() == {"SIZE": ""}
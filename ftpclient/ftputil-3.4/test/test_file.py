@@ -5,6 +5,8 @@
 from __future__ import unicode_literals
 
 import ftplib
+import posixpath
+import time
 
 import pytest
 
@@ -42,6 +44,26 @@ class InaccessibleDirSession(mock_ftplib.MockSession):
             super(InaccessibleDirSession, self).cwd(dir)
 
 
+class CommandCountingSession(mock_ftplib.MockSession):
+
+    def __init__(self, *args, **kwargs):
+        super(CommandCountingSession, self).__init__(*args, **kwargs)
+        self.pwd_calls = 0
+        self.cwd_calls = 0
+
+    def pwd(self):
+        self.pwd_calls += 1
+        return super(CommandCountingSession, self).pwd()
+
+    def cwd(self, path):
+        self.cwd_calls += 1
+        super(CommandCountingSession, self).cwd(path)
+
+    def _transform_path(self, path):
+        # Don't count `pwd` calls of the mock session itself.
+        return posixpath.normpath(posixpath.join(self.current_dir, path))
+
+
 class TestFileOperations(object):
     """Test operations with file-like objects."""
 
@@ -84,6 +106,25 @@ class TestFileOperations(object):
         file2.close()
         assert child2._file.closed
 
+    def test_child_session(self):
+        """Children share the state of their parent."""
+        host = test_base.ftp_host_factory(
+                 session_factory=CommandCountingSession)
+        with host.open("/home/file1", "w"):
+            pass
+        child = host._children[0]
+        # No `PWD` for the child itself, only for checking it when
+        # it's reused (see `_available_child`).
+        assert child._session.pwd_calls == 0
+        assert child.stat_cache is host.stat_cache
+        assert child.time_shift() == host.time_shift()
+        with host.open("/home/file2", "w") as file2:
+            assert file2._host is child
+        # The child is still in `/home`.
+        assert child._session.cwd_calls == 1
+        host.close()
+        assert child.closed
+
     def test_write_to_directory(self):
         """Test whether attempting to write to a directory fails."""
         host = test_base.ftp_host_factory()
@@ -242,49 +283,124 @@ class TestAvailableChild(object):
             raise exception_class("")
         return new_pwd
 
-    def _test_with_pwd_error(self, exception_class):
+    def _test_with_pwd_error(self, exception_class, reaped):
         """
         Test if reusing a child session fails because of
         `child_host._session.pwd` raising an exception of type
-        `exception_class`.
+        `exception_class`. If `reaped` is true, the failing child
+        session must have been removed.
         """
         host = test_base.ftp_host_factory()
+        # Always check the connection of unused children.
+        host.child_verify_interval = 0
         # Implicitly create a child session.
         with host.open("/home/older") as _:
             pass
         assert len(host._children) == 1
+        failing_child = host._children[0]
         # Make sure reusing the previous child session will fail.
-        host._children[0]._session.pwd = self._failing_pwd(exception_class)
+        failing_child._session.pwd = self._failing_pwd(exception_class)
         # Try to create a new file. Since `pwd` now raises an
         # exception, a new child session should be created.
         with host.open("home/older") as _:
             pass
-        assert len(host._children) == 2
+        assert (failing_child in host._children) is not reaped
+        assert len(host._children) == (1 if reaped else 2)
+        assert host.child_statistics()["reaped"] == (1 if reaped else 0)
 
     def test_pwd_with_error_temp(self):
         """
-        Test if an `error_temp` in `_session.pwd` skips the child
+        Test if an `error_temp` in `_session.pwd` removes the child
         session.
         """
-        self._test_with_pwd_error(ftplib.error_temp)
+        self._test_with_pwd_error(ftplib.error_temp, reaped=True)
 
     def test_pwd_with_error_reply(self):
         """
         Test if an `error_reply` in `_session.pwd` skips the child
         session.
         """
-        self._test_with_pwd_error(ftplib.error_reply)
+        self._test_with_pwd_error(ftplib.error_reply, reaped=False)
 
     def test_pwd_with_OSError(self):
         """
-        Test if an `OSError` in `_session.pwd` skips the child
+        Test if an `OSError` in `_session.pwd` removes the child
         session.
         """
-        self._test_with_pwd_error(OSError)
+        self._test_with_pwd_error(OSError, reaped=True)
 
     def test_pwd_with_EOFError(self):
         """
-        Test if an `EOFError` in `_session.pwd` skips the child
+        Test if an `EOFError` in `_session.pwd` removes the child
         session.
         """
-        self._test_with_pwd_error(EOFError)
+        self._test_with_pwd_error(EOFError, reaped=True)
+
+    def test_recently_used_child_not_probed(self):
+        """
+        Test if a recently used child session is used again without
+        checking its connection.
+        """
+        host = test_base.ftp_host_factory()
+        with host.open("/home/older") as _:
+            pass
+        child = host._children[0]
+        child._session.pwd = self._failing_pwd(ftplib.error_temp)
+        # The failing `pwd` isn't called.
+        assert host._available_child() is child
+        statistics = host.child_statistics()
+        assert statistics["probes"] == 0
+        assert statistics["probes_saved"] == 1
+
+    def test_child_after_long_transfer(self):
+        """
+        Test if a child session whose transfer has just ended is used
+        again without checking its connection, however long the
+        transfer took, unless the transfer ended with an error.
+        """
+        host = test_base.ftp_host_factory()
+        host.child_verify_interval = 10
+        remote_file = host.open("/home/older")
+        child = host._children[0]
+        # The transfer took 100 seconds.
+        child.last_used = child.last_verified = time.time() - 100
+        remote_file.close()
+        child._session.pwd = self._failing_pwd(ftplib.error_temp)
+        assert host._available_child() is child
+        assert host.child_statistics()["probes"] == 0
+        # A failed transfer doesn't count as use.
+        remote_file = host.open("/home/older")
+        child.last_used = child.last_verified = time.time() - 100
+        def failing_voidresp():
+            # Balance the transfer command for the mock session.
+            child._session._transfercmds -= 1
+            raise ftplib.error_temp("421 Connection closed")
+        child._session.voidresp = failing_voidresp
+        with pytest.raises(ftputil.error.FTPIOError):
+            remote_file.close()
+        assert host._available_child() is None
+        statistics = host.child_statistics()
+        assert statistics["probes"] == 1
+        assert statistics["reaped"] == 1
+
+    def test_max_children(self):
+        """Test if unused children beyond `max_children` are closed."""
+        host = test_base.ftp_host_factory()
+        host.max_children = 1
+        file1 = host.open("/home/older")
+        file2 = host.open("/home/older")
+        # Both files are open, so no child can be closed.
+        assert len(host._children) == 2
+        file1.close()
+        file2.close()
+        host.child_verify_interval = 0
+        host._children[0]._session.pwd = \
+          self._failing_pwd(ftplib.error_reply)
+        host._children[1]._session.pwd = \
+          self._failing_pwd(ftplib.error_reply)
+        # Neither child is usable, so a new one is created and both
+        # unused ones are closed.
+        with host.open("/home/older") as _:
+            pass
+        assert len(host._children) == 1
+        assert host.child_statistics()["reaped"] == 2
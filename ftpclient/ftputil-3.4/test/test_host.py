@@ -19,6 +19,7 @@ import pytest
 import ftputil
 import ftputil.compat
 import ftputil.error
+import ftputil.file_transfer
 import ftputil.tool
 import ftputil.stat
 
@@ -117,11 +118,124 @@ d--x--x--x   5 staff        512 Oct  3  2000 usr"""}
         return path
 
 
+class CommandRecordingSession(mock_ftplib.MockUnixFormatSession):
+
+    # Server identity for the process-wide direct path cache
+    host = "recording_host"
+    port = 21
+
+    def __init__(self, *args, **kwargs):
+        super(CommandRecordingSession, self).__init__(*args, **kwargs)
+        self.commands = []
+
+    def cwd(self, path):
+        self.commands.append("CWD " + path)
+        super(CommandRecordingSession, self).cwd(path)
+
+    def dir(self, *args):
+        self.commands.append("LIST " + " ".join(args[:-1]))
+        super(CommandRecordingSession, self).dir(*args)
+
+    def mkd(self, path):
+        self.commands.append("MKD " + path)
+
+
+class StrictCwdSession(CommandRecordingSession):
+
+    def cwd(self, path):
+        self.commands.append("CWD " + path)
+        if self._transform_path(path) not in self.dir_contents:
+            raise ftplib.error_perm("550 {0}: No such directory".format(path))
+        mock_ftplib.MockSession.cwd(self, path)
+
+
+class FileListingSession(StrictCwdSession):
+    """
+    Like many servers which run commands on absolute paths, list a
+    file as its own line.
+    """
+
+    file_path = "/home/sschwarzer/index.html"
+
+    def __init__(self, *args, **kwargs):
+        super(FileListingSession, self).__init__(*args, **kwargs)
+        self.dir_contents = dict(self.dir_contents)
+        self.dir_contents[self.file_path] = \
+          "-rw-r--r--   1 45854    200          4604 Jan 19 23:11 index.html"
+
+    def cwd(self, path):
+        if self._transform_path(path) == self.file_path:
+            self.commands.append("CWD " + path)
+            raise ftplib.error_perm("550 {0}: Not a directory".format(path))
+        super(FileListingSession, self).cwd(path)
+
+
+class LinkListingSession(CommandRecordingSession):
+    """
+    Like many servers which run commands on absolute paths, list a
+    link to a directory as its own line, and the directory it points
+    to only after changing into the link.
+    """
+
+    link_path = "/home/sschwarzer/os2_link"
+    target_path = "/home/sschwarzer/os2"
+
+    def __init__(self, *args, **kwargs):
+        super(LinkListingSession, self).__init__(*args, **kwargs)
+        self.dir_contents = dict(self.dir_contents)
+        link_line = ("lrwxrwxrwx   1 45854    200             3 "
+                     "May 29  2000 os2_link -> os2")
+        self.dir_contents["/home/sschwarzer"] += "\n" + link_line
+        self.dir_contents[self.link_path] = link_line
+        self.dir_contents[self.target_path] = \
+          "-rw-r--r--   1 45854    200          4604 Jan 19 23:11 os2_file"
+
+    def cwd(self, path):
+        super(LinkListingSession, self).cwd(path)
+        if self.current_dir == self.link_path:
+            self.current_dir = self.target_path
+
+
 class BinaryDownloadMockSession(mock_ftplib.MockUnixFormatSession):
 
     mock_file_content = binary_data()
 
 
+class SegmentedDownloadMockSession(mock_ftplib.MockUnixFormatSession):
+
+    # Size of `/home/sschwarzer/index.html` in the directory listing
+    mock_file_content = binary_data()[:4604]
+
+    def sendcmd(self, cmd):
+        if cmd == "FEAT":
+            return "211-Features:\n REST STREAM\n211 End"
+        return super(SegmentedDownloadMockSession, self).sendcmd(cmd)
+
+    def transfercmd(self, cmd, rest=None):
+        socket = super(SegmentedDownloadMockSession, self).transfercmd(cmd)
+        socket.mock_file_content = self.mock_file_content[int(rest or 0):]
+        return socket
+
+
+class NoRestStreamMockSession(SegmentedDownloadMockSession):
+
+    def sendcmd(self, cmd):
+        # No `FEAT` support
+        return mock_ftplib.MockUnixFormatSession.sendcmd(self, cmd)
+
+    def transfercmd(self, cmd, rest=None):
+        assert rest is None, "`REST` used without `REST STREAM` feature"
+        return super(NoRestStreamMockSession, self).transfercmd(cmd)
+
+
+class RestRefusingMockSession(SegmentedDownloadMockSession):
+
+    def transfercmd(self, cmd, rest=None):
+        if rest is not None:
+            raise ftplib.error_perm("502 REST not implemented")
+        return super(RestRefusingMockSession, self).transfercmd(cmd)
+
+
 class TimeShiftMockSession(mock_ftplib.MockSession):
 
     def delete(self, file_name):
@@ -291,6 +405,167 @@ class TestRecursiveListingForDotAsPath(object):
         host.close()
 
 
+class TestDirectPaths(object):
+    """Test commands on absolute paths without changing directories."""
+
+    def setup_method(self, method):
+        ftputil.host._direct_path_support.clear()
+
+    def teardown_method(self, method):
+        ftputil.host._direct_path_support.clear()
+
+    def test_direct_paths(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=CommandRecordingSession)
+        host.listdir("/home/sschwarzer")
+        # The probe lists the login directory twice; after that, no
+        # more directory changes are needed.
+        assert host._session.commands[:3] == [
+          "LIST -a /home/sschwarzer", "CWD /home/sschwarzer", "LIST -a "]
+        assert host._session.commands[3:] == ["LIST -a /home/sschwarzer"]
+        host._session.commands = []
+        host.mkdir("newdir")
+        assert host._session.commands == ["MKD /home/sschwarzer/newdir"]
+
+    def test_whitespace_uses_workaround(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=CommandRecordingSession)
+        assert host._uses_direct_paths("/home/sschwarzer")
+        assert not host._uses_direct_paths("/home/dir with spaces")
+        host._session.commands = []
+        host._dir("/home/dir with spaces")
+        assert "CWD /home/dir with spaces" in host._session.commands
+
+    def test_probe_once_per_server(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=CommandRecordingSession)
+        host.listdir("/home")
+        other_host = test_base.ftp_host_factory(
+                       session_factory=CommandRecordingSession)
+        other_host.listdir("/home")
+        # Only the check whether `/home` is a directory, no probe
+        assert other_host._session.commands == [
+          "CWD /home", "CWD /home/sschwarzer", "LIST -a /home"]
+
+    def test_deep_path(self):
+        """Stat'ing a deep path doesn't list all its ancestors."""
+        host = test_base.ftp_host_factory(session_factory=StrictCwdSession)
+        host._uses_direct_paths("/")
+        host._session.commands = []
+        path = "/home/sschwarzer/a/b/c/d"
+        assert not host.path.exists(path)
+        assert not host.path.isdir(path)
+        assert host._session.commands == ["CWD /home/sschwarzer/a/b/c"] * 2
+        host._session.commands = []
+        assert host.path.isdir("/home/sschwarzer/chemeng")
+        # The current directory is known to be a directory.
+        assert host._session.commands == ["LIST -a /home/sschwarzer"]
+        host._session.commands = []
+        assert host.path.isfile("/home/python/link_link")
+        # Only the directories of the link targets are listed.
+        assert [command for command in host._session.commands
+                if command.startswith("LIST")] == \
+               ["LIST -a /home/python", "LIST -a /home"]
+
+    def test_path_below_file(self):
+        """A listing of a file isn't taken as a directory listing."""
+        host = test_base.ftp_host_factory(session_factory=FileListingSession)
+        assert host._uses_direct_paths("/")
+        file_path = FileListingSession.file_path
+        with pytest.raises(ftputil.error.PermanentError):
+            host.lstat(file_path + "/foo")
+        assert not host.path.exists(file_path + "/foo")
+        assert not host.path.isfile(file_path + "/index.html")
+        with pytest.raises(ftputil.error.PermanentError):
+            host.listdir(file_path)
+        assert host.path.isfile(file_path)
+
+    def test_link_to_directory(self):
+        """A link is listed as the directory it points to."""
+        host = test_base.ftp_host_factory(session_factory=LinkListingSession)
+        assert host._uses_direct_paths("/")
+        link_path = LinkListingSession.link_path
+        # The stat cache knows the link from the listing of its directory.
+        assert host.path.islink(link_path)
+        assert host.listdir(link_path) == ["os2_file"]
+        assert host._dir(link_path) == [
+          "-rw-r--r--   1 45854    200          4604 Jan 19 23:11 os2_file"]
+        # Directories are still listed directly.
+        host._session.commands = []
+        host._dir("/home/sschwarzer")
+        assert host._session.commands == ["LIST -a /home/sschwarzer"]
+
+    def test_failing_probe(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=RecursiveListingForDotAsPathSession)
+        assert not host._uses_direct_paths("/pub")
+        # Sessions without server information aren't cached.
+        assert ftputil.host._direct_path_support == {}
+
+
+class FeatureCountingSession(mock_ftplib.MockMLSDSession):
+
+    # Server identity for the process-wide capabilities
+    host = "features_host"
+    port = 21
+
+    feat_calls = 0
+
+    def sendcmd(self, cmd):
+        if cmd == "FEAT":
+            FeatureCountingSession.feat_calls += 1
+        return super(FeatureCountingSession, self).sendcmd(cmd)
+
+
+class TestCapabilities(object):
+    """Test the capabilities from the `FEAT` response."""
+
+    def setup_method(self, method):
+        ftputil.host._server_capabilities.clear()
+        FeatureCountingSession.feat_calls = 0
+
+    def teardown_method(self, method):
+        ftputil.host._server_capabilities.clear()
+
+    def test_capabilities(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=FeatureCountingSession)
+        capabilities = host.capabilities()
+        assert capabilities.mlst and capabilities.size and capabilities.mdtm
+        assert not capabilities.rest_stream
+        assert host.capabilities() is capabilities
+
+    def test_feat_once_per_server(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=FeatureCountingSession)
+        host.listdir("/home")
+        other_host = test_base.ftp_host_factory(
+                       session_factory=FeatureCountingSession)
+        other_host.listdir("/home")
+        assert isinstance(other_host._stat._parser, ftputil.stat.MLSDParser)
+        assert FeatureCountingSession.feat_calls == 1
+
+    def test_without_server_key(self):
+        # Sessions without server information aren't cached.
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockMLSDSession)
+        assert host.capabilities().mlst
+        assert ftputil.host._server_capabilities == {}
+
+    def test_set_capabilities(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=FeatureCountingSession)
+        host.set_capabilities({"SIZE": ""})
+        assert host.capabilities().size
+        assert not host.capabilities().mlst
+        host._stat._check_features()
+        assert isinstance(host._stat._parser, ftputil.stat.UnixParser)
+        other_host = test_base.ftp_host_factory(
+                       session_factory=FeatureCountingSession)
+        assert other_host.capabilities().as_dict() == {"SIZE": ""}
+        assert FeatureCountingSession.feat_calls == 0
+
+
 class TestUploadAndDownload(object):
     """Test ASCII upload and binary download as examples."""
 
@@ -314,6 +589,69 @@ class TestUploadAndDownload(object):
         # Clean up
         os.unlink(local_target)
 
+    def test_segmented_download(self):
+        """Test download in parallel segments."""
+        local_target = "_test_target_"
+        host = test_base.ftp_host_factory(
+                 session_factory=SegmentedDownloadMockSession)
+        old_min_segment_size = ftputil.file_transfer.MIN_SEGMENT_SIZE
+        ftputil.file_transfer.MIN_SEGMENT_SIZE = 1000
+        try:
+            assert (ftputil.file_transfer.segment_ranges(4604, 8) ==
+                    [(0, 1151), (1151, 2302), (2302, 3453), (3453, 4604)])
+            chunks = []
+            host.download("/home/sschwarzer/index.html", local_target,
+                          callback=chunks.append, segments=8)
+        finally:
+            ftputil.file_transfer.MIN_SEGMENT_SIZE = old_min_segment_size
+        # One child session per segment
+        assert len(host._children) == 4
+        assert all(child._file.closed for child in host._children)
+        with open(local_target, "rb") as fobj:
+            data = fobj.read()
+        assert data == SegmentedDownloadMockSession.mock_file_content
+        assert sum(len(chunk) for chunk in chunks) == 4604
+        os.unlink(local_target)
+
+    def _test_single_stream_download(self, session_factory):
+        """
+        Test that a segmented download with `session_factory` is made
+        over a single connection.
+        """
+        local_target = "_test_target_"
+        host = test_base.ftp_host_factory(session_factory=session_factory)
+        old_min_segment_size = ftputil.file_transfer.MIN_SEGMENT_SIZE
+        ftputil.file_transfer.MIN_SEGMENT_SIZE = 1000
+        try:
+            host.download("/home/sschwarzer/index.html", local_target,
+                          segments=4)
+        finally:
+            ftputil.file_transfer.MIN_SEGMENT_SIZE = old_min_segment_size
+        assert all(child._file.closed for child in host._children)
+        with open(local_target, "rb") as fobj:
+            assert fobj.read() == SegmentedDownloadMockSession.mock_file_content
+        os.unlink(local_target)
+
+    def test_segmented_download_without_rest_stream(self):
+        """Without `REST STREAM` in `FEAT`, files aren't segmented."""
+        self._test_single_stream_download(NoRestStreamMockSession)
+
+    def test_segmented_download_with_refused_rest(self):
+        """If `REST` is refused, the file is downloaded in one piece."""
+        self._test_single_stream_download(RestRefusingMockSession)
+
+    def test_segmented_download_of_small_file(self):
+        """Small files are downloaded over one connection."""
+        local_target = "_test_target_"
+        host = test_base.ftp_host_factory(
+                 session_factory=SegmentedDownloadMockSession)
+        host.download("/home/sschwarzer/index.html", local_target,
+                      segments=4)
+        assert len(host._children) == 1
+        with open(local_target, "rb") as fobj:
+            assert fobj.read() == SegmentedDownloadMockSession.mock_file_content
+        os.unlink(local_target)
+
     def test_conditional_upload(self):
         """Test conditional upload."""
         local_source = "_test_source_"
@@ -486,6 +824,43 @@ class TestTimeShift(object):
         assert host.time_shift() == presumed_time_shift
 
 
+class TestParallelWalk(object):
+
+    def _walk(self, workers, **kwargs):
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        errors = []
+        result = list(host.walk("/", onerror=errors.append,
+                                workers=workers, **kwargs))
+        return result, [str(error) for error in errors]
+
+    def test_same_result_as_sequential_walk(self):
+        for topdown, followlinks in itertools.product([True, False],
+                                                      repeat=2):
+            sequential = self._walk(1, topdown=topdown,
+                                    followlinks=followlinks)
+            parallel = self._walk(4, topdown=topdown,
+                                  followlinks=followlinks)
+            assert parallel == sequential
+
+    def test_pruning(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        walked = []
+        for top, dirs, nondirs in host.walk("/home", workers=4):
+            walked.append(top)
+            if top == "/home":
+                dirs[:] = ["python"]
+        assert walked == ["/home", "/home/python"]
+
+    def test_stat_cache_is_filled(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        list(host.walk("/home", workers=4))
+        assert "/home/sschwarzer/index.html" in host.stat_cache
+        assert host.path.getsize("/home/sschwarzer/index.html") == 4604
+
+
 class TestAcceptEitherUnicodeOrBytes(object):
     """
     Test whether certain `FTPHost` methods accept either unicode
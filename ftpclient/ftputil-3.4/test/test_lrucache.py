@@ -0,0 +1,101 @@
+# Copyright (C) 2018, ftputil contributors (see `doc/contributors.txt`)
+# See the file LICENSE for licensing terms.
+
+from __future__ import unicode_literals
+
+import pytest
+
+import ftputil.lrucache
+
+
+class TestLRUCache(object):
+
+    def setup_method(self, method):
+        self.cache = ftputil.lrucache.LRUCache(3)
+
+    def test_get_set(self):
+        with pytest.raises(ftputil.lrucache.CacheKeyError):
+            self.cache["a"]
+        self.cache["a"] = 1
+        assert self.cache["a"] == 1
+        self.cache["a"] = 2
+        assert self.cache["a"] == 2
+        assert len(self.cache) == 1
+
+    def test_eviction(self):
+        for key in "abc":
+            self.cache[key] = key
+        # Accessing "a" makes "b" the least recently used item.
+        self.cache["a"]
+        self.cache["d"] = "d"
+        assert "b" not in self.cache
+        assert list(self.cache) == ["c", "a", "d"]
+        # Setting an existing item also counts as use.
+        self.cache["c"] = "C"
+        self.cache["e"] = "e"
+        assert list(self.cache) == ["d", "c", "e"]
+
+    def test_delete(self):
+        for key in "abc":
+            self.cache[key] = key
+        del self.cache["b"]
+        assert list(self.cache) == ["a", "c"]
+        with pytest.raises(ftputil.lrucache.CacheKeyError):
+            del self.cache["b"]
+        # The freed slot is used without evicting anything.
+        self.cache["d"] = "d"
+        assert list(self.cache) == ["a", "c", "d"]
+
+    def test_shrink(self):
+        cache = ftputil.lrucache.LRUCache(10)
+        for key in range(10):
+            cache[key] = key
+        cache[0]
+        cache.size = 4
+        assert list(cache) == [7, 8, 9, 0]
+        with pytest.raises(ValueError):
+            cache.size = 0
+        with pytest.raises(TypeError):
+            cache.size = 1.5
+
+    def test_iteration_with_access(self):
+        for key in "abc":
+            self.cache[key] = key
+        # Accessing and deleting items while iterating must neither
+        # loop endlessly nor skip keys.
+        keys = []
+        for key in self.cache:
+            keys.append(key)
+            self.cache[key]
+        assert keys == ["a", "b", "c"]
+        for key in self.cache:
+            del self.cache[key]
+        assert len(self.cache) == 0
+
+    def test_popitem(self):
+        for key in "abc":
+            self.cache[key] = key.upper()
+        self.cache["a"]
+        assert self.cache.popitem() == ("b", "B")
+        assert list(self.cache) == ["c", "a"]
+        self.cache.popitem()
+        self.cache.popitem()
+        with pytest.raises(ftputil.lrucache.CacheKeyError):
+            self.cache.popitem()
+
+    def test_mtime(self):
+        self.cache["a"] = 1
+        mtime = self.cache.mtime("a")
+        # Reading doesn't change the modification time.
+        self.cache["a"]
+        assert self.cache.mtime("a") == mtime
+        with pytest.raises(ftputil.lrucache.CacheKeyError):
+            self.cache.mtime("b")
+
+    def test_clear(self):
+        for key in "abc":
+            self.cache[key] = key
+        self.cache.clear()
+        assert len(self.cache) == 0
+        assert list(self.cache) == []
+        assert self.cache.size == 3
@@ -559,12 +559,12 @@ class TestStat(RealFTPTest):
     def test_cache_auto_resizing(self):
         """Test if the cache is resized appropriately."""
         host = self.host
-        cache = host.stat_cache._cache
+        cache = host.stat_cache
         # Make sure the cache size isn't adjusted towards smaller values.
         unused_entries = host.listdir("walk_test")
         assert cache.size == ftputil.stat_cache.StatCache._DEFAULT_CACHE_SIZE
         # Make the cache very small initially and see if it gets resized.
-        cache.size = 2
+        cache.resize(2)
         entries = host.listdir("walk_test")
         # The adjusted cache size should be larger or equal to the
         # number of items in `walk_test` and its parent directory. The
@@ -6,6 +6,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import ftplib
 import stat
 import time
 
@@ -30,6 +31,25 @@ def _test_stat(session_factory):
     return stat
 
 
+def _counting_host(session_factory=mock_ftplib.MockUnixFormatSession,
+                   method_name="_dir"):
+    """
+    Return an `FTPHost` object whose `_dir_calls` attribute counts
+    the directory listings from the server, made with the method
+    `method_name`. The listed paths are in `_dir_paths`.
+    """
+    host = test_base.ftp_host_factory(session_factory=session_factory)
+    host._dir_calls = 0
+    host._dir_paths = []
+    original_dir = getattr(host, method_name)
+    def counting_dir(path):
+        host._dir_calls += 1
+        host._dir_paths.append(path)
+        return original_dir(path)
+    setattr(host, method_name, counting_dir)
+    return host
+
+
 # Special value to handle special case of datetimes before the epoch.
 EPOCH = time.gmtime(0)[:6]
 
@@ -126,6 +146,42 @@ class TestParsers(object):
         self._test_valid_lines(ftputil.stat.UnixParser, lines,
                                expected_stat_results)
 
+    def test_unix_parse_lines(self):
+        """
+        Test that `UnixParser.parse_lines` gives the same results as
+        `UnixParser.parse_line`.
+        """
+        lines = [
+          "total 14",
+          "drwxr-sr-x   2 45854    200           512 May  4  2000 chemeng",
+          "-rw-r--r--   1 45854    200          4604 Dec 19 23:11 index.html",
+          "-rw-r--r--   1 45854    200          4604 Jan  1 00:00 new_year",
+          "-rw-r--r--   1 45854    200          4604 Dec 31 23:59 old_year",
+          # Days with DST switches in CET
+          "-rw-r--r--   1 45854    200          4604 Mar 25  2018 dst_start",
+          "-rw-r--r--   1 45854    200          4604 Oct 28 04:00 dst_end",
+          "lrwxrwxrwx   2 45854    200           512 May 29  2000 osup -> "
+                                                                  "../os2",
+          "-rw-r--r--   1 45854    200          4604 Jan  1  1960 pre_epoch",
+          # Format without user id
+          "-rw-r--r--   1   45854   4604 Dec 19 23:11 index.html",
+          "",
+        ]
+        parser = ftputil.stat.UnixParser()
+        expected = [parser.parse_line(line, 3600.0)
+                    for line in lines if not parser.ignores_line(line)]
+        stat_results = list(parser.parse_lines(lines, 3600.0))
+        assert stat_results == expected
+        for stat_result, expected_stat_result in zip(stat_results, expected):
+            for name in ["_st_name", "_st_target", "_st_mtime_precision"]:
+                assert (getattr(stat_result, name) ==
+                        getattr(expected_stat_result, name))
+        # Invalid lines give the same errors.
+        with pytest.raises(ftputil.error.ParserError):
+            list(parser.parse_lines(
+                   ["-rw-r--r--   1 45854    200          4604 Dec 32 23:11 "
+                    "index.html"]))
+
     def test_alternative_unix_format(self):
         # See http://ftputil.sschwarzer.net/trac/ticket/12 for a
         # description for the need for an alternative format.
@@ -279,6 +335,50 @@ class TestParsers(object):
         ]
         self._test_invalid_lines(ftputil.stat.MSParser, lines)
 
+    #
+    # MLSD parser
+    #
+    def test_valid_mlsd_lines(self):
+        parser = ftputil.stat.MLSDParser()
+        stat_result = parser.parse_line(
+          "type=file;size=4604;modify=20180620101112;UNIX.mode=0644;"
+          "UNIX.owner=45854;UNIX.group=200; index.html")
+        assert stat_result == (0o100644, None, None, None, "45854", "200",
+                               4604, None, 1529489472.0, None)
+        assert stat_result._st_mtime_precision == 1
+        assert stat_result._st_name == "index.html"
+        # Fact names are case-insensitive, fractional seconds are
+        # allowed and the time shift is applied.
+        stat_result = parser.parse_line(
+          "Type=dir;Modify=20180620101112.5; dir with spaces", 3600.0)
+        assert stat.S_ISDIR(stat_result.st_mode)
+        assert stat_result.st_mtime == 1529489472.5 + 3600.0
+        assert stat_result._st_name == "dir with spaces"
+        # Current and parent directory
+        assert parser.parse_line("type=cdir; /home")._st_name == "."
+        assert parser.parse_line("type=pdir; /")._st_name == ".."
+        # Link with target
+        stat_result = parser.parse_line(
+          "type=OS.unix=slink:/home/target;UNIX.mode=0777; link")
+        assert stat.S_ISLNK(stat_result.st_mode)
+        assert stat_result._st_target == "/home/target"
+
+    def test_invalid_mlsd_lines(self):
+        lines = [
+          # No name
+          "type=file;size=4604;",
+          # Fact without value
+          "type=file;size; index.html",
+          # Invalid modify fact
+          "type=file;modify=2018062010111; index.html",
+          "type=file;modify=20181320101112; index.html",
+          # Invalid mode
+          "type=file;UNIX.mode=rw-r--r--; index.html",
+          # Invalid size
+          "type=file;size=46O4; index.html",
+        ]
+        self._test_invalid_lines(ftputil.stat.MLSDParser, lines)
+
     #
     # The following code checks if the decision logic in the Unix
     # line parser for determining the year works.
@@ -382,6 +482,43 @@ class TestLstatAndStat(object):
               "st_atime=None, st_mtime=957391200.0, st_ctime=None)")
         assert repr(stat_result) == expected_result
 
+    def test_tuple_compatibility(self):
+        """Test if a `StatResult` can be used like a tuple."""
+        stat_result = self.stat._lstat("/home/sschwarzer/index.html")
+        as_tuple = tuple(stat_result)
+        assert len(stat_result) == len(as_tuple) == 10
+        assert stat_result[stat.ST_MODE] == stat_result.st_mode == 33188
+        assert stat_result[stat.ST_SIZE] == stat_result.st_size == 4604
+        assert stat_result[-1] is None
+        assert stat_result[4:6] == ("45854", "200")
+        assert stat_result == as_tuple
+        assert not stat_result != as_tuple
+        assert hash(stat_result) == hash(as_tuple)
+        assert stat_result == ftputil.stat.StatResult(as_tuple)
+        with pytest.raises(AttributeError):
+            stat_result.st_blocks
+        # Ordering, as for tuples
+        smaller = ftputil.stat.StatResult((0,) + as_tuple[1:])
+        assert smaller < stat_result
+        assert smaller <= stat_result <= as_tuple
+        assert stat_result > smaller
+        assert stat_result >= as_tuple >= smaller
+        assert not stat_result < as_tuple
+        assert sorted([stat_result, smaller]) == [smaller, stat_result]
+
+    def test_shared_owner_and_group(self):
+        """Test if owner and group strings are shared between entries."""
+        parser = ftputil.stat.UnixParser()
+        lines = [
+          "-rw-r--r--   1 45854    200          4604 Jan 19 23:11 a",
+          "-rw-r--r--   1 45854    200          4604 Jan 19 23:11 b"]
+        for stat_results in (list(parser.parse_lines(lines)),
+                             [parser.parse_line(line) for line in lines]):
+            first, second = stat_results
+            assert first.st_uid is second.st_uid
+            assert first.st_gid is second.st_gid
+            assert not hasattr(first, "__dict__")
+
     def test_failing_lstat(self):
         """Test whether `lstat` fails for a nonexistent path."""
         with pytest.raises(ftputil.error.PermanentError):
@@ -536,3 +673,278 @@ class TestListdir(object):
         remote_file_list = self.stat._listdir(".")
         for file in expected:
             assert file in remote_file_list
+
+    def test_listdir_stat(self):
+        """Test `FTPHost.listdir_stat`."""
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        items = host.listdir_stat("/home/sschwarzer")
+        names = [name for name, _ in items]
+        assert names == host.listdir("/home/sschwarzer")
+        stat_results = dict(items)
+        assert stat_results["index.html"].st_size == 4604
+        assert stat.S_ISDIR(stat_results["chemeng"].st_mode)
+        # The stat results are the same that `lstat` returns.
+        assert host.lstat("/home/sschwarzer/index.html") == \
+                 stat_results["index.html"]
+
+    def test_iterdir_stat(self):
+        """Test `FTPHost.iterdir_stat`."""
+        for session_factory in (mock_ftplib.MockUnixFormatSession,
+                                mock_ftplib.MockMSFormatSession):
+            host = test_base.ftp_host_factory(session_factory=session_factory)
+            for path in ("/home", "/home/sschwarzer", "/home/msformat"):
+                try:
+                    expected = host.listdir_stat(path)
+                except ftputil.error.PermanentError:
+                    continue
+                # Don't use the cached listing.
+                host.stat_cache.clear()
+                assert list(host.iterdir_stat(path)) == expected
+            # The listings were transferred by a child session.
+            assert len(host._children) == 1
+            assert host._children[0]._file.closed
+
+    def test_iterdir_stat_stopped_early(self):
+        """Test closing the iterator before the listing is complete."""
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        items = host.iterdir_stat("/home/sschwarzer")
+        assert next(items)[0] == "chemeng"
+        assert not host._children[0]._file.closed
+        # The host is still usable during the transfer.
+        assert "index.html" in host.listdir("/home/sschwarzer")
+        items.close()
+        assert host._children[0]._file.closed
+
+    def test_failing_iterdir_stat(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        with pytest.raises(ftputil.error.PermanentError):
+            list(host.iterdir_stat("/home/notthere"))
+
+    def test_cached_listing(self):
+        """Repeated listings of a directory come from the cache."""
+        host = _counting_host()
+        names = host.listdir("/home/sschwarzer")
+        assert host._dir_calls == 1
+        assert host.listdir("/home/sschwarzer") == names
+        assert [name for name, _ in host.listdir_stat("/home/sschwarzer")] \
+               == names
+        assert [name for name, _ in host.iterdir_stat("/home/sschwarzer")] \
+               == names
+        assert host._dir_calls == 1
+        # No additional child session was needed for `iterdir_stat`.
+        assert host._children == []
+
+    def test_cached_listing_after_changes(self):
+        """Changes through the `FTPHost` make the listing incomplete."""
+        host = _counting_host()
+        path = "/home/sschwarzer"
+        changes = [
+          lambda: host.mkdir(path + "/newdir"),
+          lambda: host.open(path + "/newfile", "w").close(),
+          lambda: host.remove(path + "/index.html"),
+          lambda: host.rename(path + "/osup", path + "/osdown"),
+        ]
+        for count, change in enumerate(changes, 1):
+            host.listdir(path)
+            assert host._dir_calls == count
+            change()
+            host.listdir(path)
+            assert host._dir_calls == count + 1
+
+    def test_cached_listing_max_age(self):
+        host = _counting_host()
+        host.stat_cache.max_age = 60
+        host.listdir("/home/sschwarzer")
+        host.stat_cache.max_age = 0
+        time.sleep(0.01)
+        host.listdir("/home/sschwarzer")
+        assert host._dir_calls == 2
+
+    def test_revalidated_listing(self):
+        """Expired listings are reused if the directory hasn't changed."""
+        host = _counting_host()
+        host.stat_cache.max_age = 0.05
+        host.stat_cache.revalidate_listings = True
+        names = host.listdir("/home/python")
+        time.sleep(0.1)
+        # Listing the parent directory shows the directory unchanged.
+        assert host.listdir("/home/python") == names
+        assert host._dir_paths.count("/home/python") == 1
+        assert host._dir_paths[-1] == "/home"
+        # Now fresh again
+        calls = host._dir_calls
+        host.listdir("/home/python")
+        assert host._dir_calls == calls
+        # Pretend the directory had another modification time when it
+        # was listed.
+        host.stat_cache._node("/home/python").listed_mtime -= 60
+        time.sleep(0.1)
+        assert host.listdir("/home/python") == names
+        assert host._dir_paths.count("/home/python") == 2
+
+    def test_revalidated_listing_with_mlst(self):
+        host = _counting_host(mock_ftplib.MockMLSDSession, "_mlsd")
+        host.stat_cache.max_age = 0.05
+        host.stat_cache.revalidate_listings = True
+        names = host.listdir("/home")
+        time.sleep(0.1)
+        assert host.listdir("/home") == names
+        assert host._dir_paths == ["/home"]
+
+    def test_no_revalidation_by_default(self):
+        host = _counting_host()
+        host.stat_cache.max_age = 0.05
+        host.listdir("/home/python")
+        time.sleep(0.1)
+        host.listdir("/home/python")
+        assert host._dir_paths.count("/home/python") == 2
+
+    def test_disabled_cache(self):
+        host = _counting_host()
+        host.stat_cache.disable()
+        host.listdir("/home/sschwarzer")
+        calls = host._dir_calls
+        host.listdir("/home/sschwarzer")
+        assert host._dir_calls == 2 * calls
+
+
+class TestMLSD(object):
+    """Test stat'ing and listing with `MLSD` and `MLST`."""
+
+    def setup_method(self, method):
+        self.host = test_base.ftp_host_factory(
+                      session_factory=mock_ftplib.MockMLSDSession)
+
+    def test_mlsd_parser_from_features(self):
+        self.host.listdir("/home")
+        assert isinstance(self.host._stat._parser, ftputil.stat.MLSDParser)
+        assert self.host._stat._allow_parser_switching is False
+
+    def test_explicit_parser_wins(self):
+        self.host.set_parser(ftputil.stat.UnixParser())
+        self.host._stat._check_features()
+        assert isinstance(self.host._stat._parser, ftputil.stat.UnixParser)
+
+    def test_no_mlsd_without_feature(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        host.listdir("/home")
+        assert host.capabilities().as_dict() == {}
+        assert isinstance(host._stat._parser, ftputil.stat.UnixParser)
+
+    def test_listdir(self):
+        names = self.host.listdir("/home")
+        assert names == ["sschwarzer", "index.html", "link",
+                         "file with spaces"]
+        assert self.host.listdir("/home/sschwarzer") == []
+
+    def test_iterdir_stat(self):
+        items = list(self.host.iterdir_stat("/home"))
+        assert items == self.host.listdir_stat("/home")
+        assert [name for name, _ in items] == self.host.listdir("/home")
+
+    def test_lstat_with_mlst(self):
+        stat_result = self.host.lstat("/home/index.html")
+        assert stat_result.st_size == 4604
+        assert stat_result._st_name == "index.html"
+        assert stat_result._st_mtime_precision == 1
+        # Only the path itself has been stat'ed, not its directory.
+        assert "/home/index.html" in self.host.stat_cache
+        assert "/home/sschwarzer" not in self.host.stat_cache
+        assert self.host.path.isfile("/home/file with spaces")
+
+    def test_lstat_for_root(self):
+        assert stat.S_ISDIR(self.host.lstat("/").st_mode)
+
+    def test_missing_path(self):
+        with pytest.raises(ftputil.error.PermanentError):
+            self.host.lstat("/home/notthere")
+        assert not self.host.path.exists("/home/notthere")
+
+    def test_stat_following_link(self):
+        assert self.host.path.islink("/home/link")
+        assert stat.S_ISDIR(self.host.stat("/home/link").st_mode)
+        assert self.host.path.isdir("/home/link")
+
+
+class SizeAndMdtmSession(mock_ftplib.MockUnixFormatSession):
+    """
+    Mock session for a server which supports the `SIZE` and `MDTM`
+    commands, but not `MLST`.
+    """
+
+    file_facts = {"/home/sschwarzer/index.html": ("4604", "20180620101112")}
+
+    def sendcmd(self, cmd):
+        if cmd == "FEAT":
+            return "211-Features:\n MDTM\n SIZE\n211 End"
+        command, _, path = cmd.partition(" ")
+        path = self._transform_path(path)
+        if command in ("SIZE", "MDTM") and path in self.file_facts:
+            size, modify = self.file_facts[path]
+            return "213 " + (size if command == "SIZE" else modify)
+        raise ftplib.error_perm("550 {0}: not a plain file".format(path))
+
+
+class TestSingleCommandStat(object):
+    """Test `getsize`, `getmtime` and `exists` on a server with `SIZE`."""
+
+    def setup_method(self, method):
+        self.host = _counting_host(SizeAndMdtmSession)
+
+    def test_getsize(self):
+        assert self.host.path.getsize("/home/sschwarzer/index.html") == 4604
+        assert self.host._dir_calls == 0
+        # The size of a directory comes from the listing.
+        assert self.host.path.getsize("/home/sschwarzer/chemeng") == 512
+        assert self.host._dir_paths == ["/home/sschwarzer"]
+
+    def test_getsize_in_binary_mode(self):
+        """`SIZE` is sent in binary mode."""
+        commands = []
+        original_voidcmd = self.host._session.voidcmd
+        original_sendcmd = self.host._session.sendcmd
+        def voidcmd(cmd):
+            commands.append(cmd)
+            return original_voidcmd(cmd)
+        def sendcmd(cmd):
+            commands.append(cmd)
+            return original_sendcmd(cmd)
+        self.host._session.voidcmd = voidcmd
+        self.host._session.sendcmd = sendcmd
+        self.host.path.getsize("/home/sschwarzer/index.html")
+        # After `FEAT`
+        assert commands[-2:] == ["TYPE I",
+                                 "SIZE /home/sschwarzer/index.html"]
+
+    def test_getmtime(self):
+        """
+        The UTC time from `MDTM` doesn't match the server's local
+        times in listings, so `getmtime` uses the listing.
+        """
+        host = self.host
+        host._session.sendcmd = None
+        host._stat._features_checked = True
+        mtime = host.path.getmtime("/home/sschwarzer/index.html")
+        assert host._dir_calls == 1
+        assert mtime == host.lstat("/home/sschwarzer/index.html").st_mtime
+
+    def test_exists(self):
+        assert self.host.path.exists("/home/sschwarzer/index.html")
+        assert self.host._dir_calls == 0
+        assert self.host.path.exists("/home/sschwarzer/chemeng")
+        assert not self.host.path.exists("/home/sschwarzer/notthere")
+
+    def test_missing_path(self):
+        with pytest.raises(ftputil.error.PermanentError):
+            self.host.path.getsize("/home/sschwarzer/notthere")
+
+    def test_cached_stat_result(self):
+        """Paths in the cache don't need a command."""
+        self.host.listdir("/home/sschwarzer")
+        self.host._session.sendcmd = None
+        assert self.host.path.getsize("/home/sschwarzer/index.html") == 4604
+        assert self.host.path.exists("/home/sschwarzer/index.html")
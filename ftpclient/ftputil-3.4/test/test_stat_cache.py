@@ -4,13 +4,16 @@
 
 from __future__ import unicode_literals
 
+import stat
 import time
 
 import pytest
 
 import ftputil.error
+import ftputil.stat
 import ftputil.stat_cache
 
+from test import mock_ftplib
 from test import test_base
 
 
@@ -101,3 +104,282 @@ class TestStatCache(object):
         # If bug #38 was present, this raised an `IndexError`.
         items = host.listdir(host.curdir)
         assert items[:3] == ["chemeng", "download", "image"]
+
+    def test_invalidate_subtree(self):
+        for path in ["/a", "/a/b", "/a/b/c", "/a/d", "/ab", "/e"]:
+            self.cache[path] = path
+        self.cache.invalidate_subtree("/a")
+        assert len(self.cache) == 2
+        assert "/ab" in self.cache
+        assert "/a/b/c" not in self.cache
+        self.cache.invalidate_subtree("/")
+        assert len(self.cache) == 0
+
+    def test_move_subtree(self):
+        for path in ["/a", "/a/b", "/a/b/c", "/x/a"]:
+            self.cache[path] = path
+        self.cache.move_subtree("/a", "/x/y")
+        # The entry of the moved directory itself is invalidated.
+        assert "/a" not in self.cache
+        assert "/x/y" not in self.cache
+        assert self.cache["/x/y/b"] == "/a/b"
+        assert self.cache["/x/y/b/c"] == "/a/b/c"
+        assert "/a/b" not in self.cache
+        # Entries in the target are replaced.
+        self.cache["/z/old"] = "/z/old"
+        self.cache.move_subtree("/x/y", "/z")
+        assert sorted(self.cache.iter_subtree("/")) == [
+                 ("/x/a", "/x/a"), ("/z/b", "/a/b"), ("/z/b/c", "/a/b/c")]
+
+    def test_iter_subtree(self):
+        for path in ["/a", "/a/b", "/a/b/c", "/ab"]:
+            self.cache[path] = path
+        assert sorted(self.cache.iter_subtree("/a")) == [
+                 ("/a", "/a"), ("/a/b", "/a/b"), ("/a/b/c", "/a/b/c")]
+        assert list(self.cache.iter_subtree("/notthere")) == []
+
+    def test_eviction_removes_unused_path_nodes(self):
+        self.cache.resize(2)
+        self.cache["/a/b/c"] = 1
+        self.cache["/d"] = 2
+        self.cache["/e"] = 3
+        assert "/a/b/c" not in self.cache
+        assert sorted(self.cache._root.children) == ["d", "e"]
+
+    def test_rename_moves_cached_entries(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        host.listdir("/home/sschwarzer")
+        host.rename("/home/sschwarzer", "/home/renamed")
+        assert "/home/renamed/index.html" in host.stat_cache
+        assert "/home/sschwarzer/index.html" not in host.stat_cache
+
+    def test_listing(self):
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.listing("/dir")
+        self.cache["/dir/a"] = "a"
+        self.cache["/dir/b"] = "b"
+        self.cache.mark_listed("/dir")
+        assert sorted(self.cache.listing("/dir")) == ["a", "b"]
+        self.cache.mark_listed("/empty")
+        assert self.cache.listing("/empty") == []
+
+    def test_listing_drops_removed_entries(self):
+        self.cache["/dir/a"] = "a"
+        self.cache["/dir/b"] = "b"
+        self.cache["/dir/b/c"] = "c"
+        self.cache.mark_listed("/dir", 1000.0)
+        # `b` has been removed on the server before the next listing.
+        self.cache.invalidate("/dir/other")
+        self.cache["/dir/a"] = "a"
+        self.cache.mark_listed("/dir", 1000.0, names=["a"])
+        assert self.cache.listing("/dir") == ["a"]
+        assert "/dir/b" not in self.cache
+        assert "/dir/b/c" not in self.cache
+        assert self.cache.is_missing("/dir/b")
+        # An expired listing can still be revalidated.
+        self.cache.revalidate_listings = True
+        self.cache.max_age = 0
+        time.sleep(0.01)
+        assert self.cache.stale_listing("/dir") == (1000.0, ["a"])
+        # The same for listings added from elsewhere
+        self.cache.max_age = None
+        stat_result = ftputil.stat.StatResult((0,) * 10)
+        stat_result._st_name = "new"
+        self.cache.add_listing("/dir", [stat_result])
+        assert self.cache.listing("/dir") == [stat_result]
+        assert "/dir/a" not in self.cache
+
+    def test_relisting_drops_removed_entries(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        names = host.listdir("/home/sschwarzer")
+        assert "index.html" in names
+        # Remove `index.html` from the listing on the "server".
+        host.stat_cache.invalidate("/home/sschwarzer/other")
+        original_dir = host._dir
+        def dir_without_index(path):
+            return [line for line in original_dir(path)
+                    if not line.endswith(" index.html")]
+        host._dir = dir_without_index
+        assert "index.html" not in host.listdir("/home/sschwarzer")
+        # The cached listing doesn't bring it back.
+        host._dir = None
+        assert "index.html" not in host.listdir("/home/sschwarzer")
+        assert not host.path.exists("/home/sschwarzer/index.html")
+
+    def test_listing_incomplete(self):
+        self.cache["/dir/a"] = "a"
+        self.cache["/dir/b"] = "b"
+        self.cache["/dir/c/d"] = "d"
+        self.cache.mark_listed("/dir")
+        # Child without an entry of its own
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.listing("/dir")
+        self.cache["/dir/c"] = "c"
+        self.cache.mark_listed("/dir")
+        assert len(self.cache.listing("/dir")) == 3
+        # Changes below `/dir/c` don't affect the listing of `/dir`.
+        self.cache.invalidate("/dir/c/d")
+        assert len(self.cache.listing("/dir")) == 3
+        # Invalidating a path, even if it isn't in the cache, makes
+        # the listing of its directory incomplete.
+        self.cache.invalidate("/dir/new")
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.listing("/dir")
+
+    def test_listing_after_eviction(self):
+        self.cache.resize(3)
+        self.cache["/dir/a"] = "a"
+        self.cache["/dir/b"] = "b"
+        self.cache.mark_listed("/dir")
+        self.cache["/other"] = "other"
+        assert len(self.cache.listing("/dir")) == 2
+        # Evict `/other`, then `/dir/a`
+        self.cache["/other2"] = "other2"
+        self.cache["/other3"] = "other3"
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.listing("/dir")
+
+    def test_listing_max_age(self):
+        self.cache["/dir/a"] = "a"
+        self.cache.mark_listed("/dir")
+        self.cache.max_age = 0
+        time.sleep(0.01)
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.listing("/dir")
+
+    def test_listing_after_move(self):
+        self.cache["/dir/sub/a"] = "a"
+        self.cache["/dir/sub"] = "sub"
+        self.cache.mark_listed("/dir")
+        self.cache.mark_listed("/dir/sub")
+        self.cache.move_subtree("/dir/sub", "/dir/moved")
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.listing("/dir")
+        assert self.cache.listing("/dir/moved") == ["a"]
+
+    def test_stale_listing(self):
+        self.cache["/dir/a"] = "a"
+        self.cache.mark_listed("/dir", 1000.0)
+        # Listings are only kept for revalidation if requested.
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.stale_listing("/dir")
+        self.cache.revalidate_listings = True
+        self.cache.max_age = 0
+        time.sleep(0.01)
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.listing("/dir")
+        # The expired entry is kept for the revalidation.
+        assert "/dir/a" not in self.cache
+        assert self.cache.stale_listing("/dir") == (1000.0, ["a"])
+        self.cache.max_age = 60
+        self.cache.renew_listing("/dir")
+        assert self.cache.listing("/dir") == ["a"]
+        assert self.cache["/dir/a"] == "a"
+        # Without a modification time the listing can't be revalidated.
+        self.cache.mark_listed("/dir")
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.stale_listing("/dir")
+
+    def test_add_listing(self):
+        stat_results = []
+        for name in ["a", "b"]:
+            stat_result = ftputil.stat.StatResult((0,) * 10)
+            stat_result._st_name = name
+            stat_results.append(stat_result)
+        self.cache.add_listing("/dir", stat_results, mtime=1000.0,
+                               listed=time.time() - 120)
+        assert self.cache.listing("/dir") == stat_results
+        assert self.cache.listing_mtime("/dir") == 1000.0
+        assert self.cache.listing_mtime("/other") is None
+        # Stored as if listed two minutes ago
+        self.cache.max_age = 60
+        with pytest.raises(ftputil.error.CacheMissError):
+            self.cache.listing("/dir")
+        self.cache.revalidate_listings = True
+        assert self.cache.stale_listing("/dir") == (1000.0, stat_results)
+
+    def test_is_missing(self):
+        directory = ftputil.stat.StatResult((stat.S_IFDIR,) + (0,) * 9)
+        regular_file = ftputil.stat.StatResult((stat.S_IFREG,) + (0,) * 9)
+        self.cache["/dir/sub"] = directory
+        self.cache["/dir/file"] = regular_file
+        # Without a complete listing, nothing is known to be missing.
+        assert not self.cache.is_missing("/dir/new")
+        self.cache.mark_listed("/dir")
+        assert self.cache.is_missing("/dir/new")
+        assert self.cache.is_missing("/dir/new/deeper")
+        assert self.cache.is_missing("/dir/file/deeper")
+        assert not self.cache.is_missing("/dir/sub")
+        assert not self.cache.is_missing("/dir/file")
+        assert not self.cache.is_missing("/dir/sub/unknown")
+        assert not self.cache.is_missing("/")
+        # Creating a path makes the listing incomplete.
+        self.cache.invalidate("/dir/new")
+        assert not self.cache.is_missing("/dir/new")
+        self.cache.mark_listed("/dir")
+        self.cache.max_age = 0
+        time.sleep(0.01)
+        assert not self.cache.is_missing("/dir/new")
+        self.cache.max_age = None
+        self.cache.disable()
+        assert not self.cache.is_missing("/dir/new")
+
+    def test_missing_paths_from_listing(self):
+        host = test_base.ftp_host_factory(
+                 session_factory=mock_ftplib.MockUnixFormatSession)
+        host.listdir("/home/sschwarzer")
+        # Fail if the directory is listed again.
+        host._dir = None
+        assert not host.path.exists("/home/sschwarzer/notthere")
+        assert not host.path.isdir("/home/sschwarzer/notthere/deeper")
+        with pytest.raises(ftputil.error.PermanentError):
+            host.lstat("/home/sschwarzer/notthere")
+        # Writing through the host makes the listing incomplete.
+        host.open("/home/sschwarzer/notthere", "w").close()
+        assert not host.stat_cache.is_missing("/home/sschwarzer/notthere")
+
+    def test_adaptive_max_age(self):
+        cache = self.cache
+        cache.adaptive_max_age = (10, 35)
+        cache["/dir/a"] = "a"
+        cache.mark_listed("/dir")
+        statistics = cache.listing_statistics()["/dir"]
+        assert statistics["max_age"] == 10
+        assert statistics["hit_ratio"] is None
+        assert cache.listing("/dir") == ["a"]
+        # Unchanged listings double the maximum age, up to the maximum.
+        for expected_max_age in [20, 35]:
+            cache["/dir/a"] = "a"
+            cache.mark_listed("/dir")
+            assert cache.listing_statistics()["/dir"]["max_age"] == \
+                   expected_max_age
+        # Changed listings halve it, down to the minimum.
+        for expected_max_age in [17.5, 10]:
+            cache["/dir/a"] = expected_max_age
+            cache.mark_listed("/dir")
+            assert cache.listing_statistics()["/dir"]["max_age"] == \
+                   expected_max_age
+        cache.invalidate("/dir/b")
+        with pytest.raises(ftputil.error.CacheMissError):
+            cache.listing("/dir")
+        statistics = cache.listing_statistics()["/dir"]
+        assert statistics["listings"] == 5
+        assert statistics["changes"] == 2
+        assert (statistics["hits"], statistics["misses"]) == (1, 1)
+        assert statistics["hit_ratio"] == 0.5
+
+    def test_adaptive_max_age_expiry(self):
+        cache = self.cache
+        cache.adaptive_max_age = (0.05, 60)
+        cache["/dir/a"] = "a"
+        cache.mark_listed("/dir")
+        cache["/other/a"] = "a"
+        time.sleep(0.1)
+        # The listing and its entries expire with the learned maximum
+        # age, other entries with `max_age`.
+        with pytest.raises(ftputil.error.CacheMissError):
+            cache.listing("/dir")
+        assert "/dir/a" not in cache
+        assert "/other/a" in cache
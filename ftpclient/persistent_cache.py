@@ -0,0 +1,194 @@
+import math
+import posixpath
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from os.path import join as pathjoin
+
+import ftputil.stat
+from fman import DATA_DIRECTORY
+
+# Defaults, can be overridden in `FTP Settings.json`
+PERSISTENT_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+PERSISTENT_CACHE_FILE = 'FTP Cache.sqlite'
+
+# st_mode, st_size, st_mtime, mtime precision (see `encode_listing`)
+_ENTRY = struct.Struct('<Iqdi')
+# Length of the following UTF-8 string, `_NONE` for `None`
+_LENGTH = struct.Struct('<H')
+_NONE = 0xffff
+
+
+def _encode_string(value):
+    if value is None:
+        return _LENGTH.pack(_NONE)
+    data = str(value).encode('utf-8')[:_NONE - 1]
+    return _LENGTH.pack(len(data)) + data
+
+
+def _decode_string(data, offset):
+    length, = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    if length == _NONE:
+        return None, offset
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+
+def encode_listing(stat_results):
+    """
+    Return the `StatResult`s of a directory listing as compressed bytes.
+    Only what fman shows is kept: name, mode, size, modification time
+    (with its precision), owner, group and link target.
+    """
+    parts = []
+    for lstat in stat_results:
+        precision = lstat._st_mtime_precision
+        parts.append(_ENTRY.pack(
+            lstat.st_mode or 0,
+            -1 if lstat.st_size is None else lstat.st_size,
+            math.nan if lstat.st_mtime is None else lstat.st_mtime,
+            -1 if precision is None else precision))
+        for value in (lstat._st_name, lstat.st_uid, lstat.st_gid,
+                      lstat._st_target):
+            parts.append(_encode_string(value))
+    return zlib.compress(b''.join(parts))
+
+
+def decode_listing(data):
+    """Return the list of `StatResult`s encoded by `encode_listing`."""
+    data = zlib.decompress(data)
+    stat_results = []
+    offset = 0
+    while offset < len(data):
+        mode, size, mtime, precision = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        name, offset = _decode_string(data, offset)
+        uid, offset = _decode_string(data, offset)
+        gid, offset = _decode_string(data, offset)
+        target, offset = _decode_string(data, offset)
+        lstat = ftputil.stat.StatResult((
+            mode, None, None, None, uid, gid,
+            None if size == -1 else size, None,
+            None if math.isnan(mtime) else mtime, None))
+        lstat._st_name = name
+        lstat._st_target = target
+        lstat._st_mtime_precision = None if precision == -1 else precision
+        stat_results.append(lstat)
+    return stat_results
+
+
+class PersistentCache():
+    """
+    Directory listings of FTP servers kept on disk in a SQLite database, so
+    that they survive restarts of fman.
+
+    Listings are keyed by server (scheme, host and port), user and path,
+    with the time they were made and the modification time of the
+    directory (as recorded by ftputil's stat cache, for revalidation).
+    Listings older than `max_age` seconds are ignored and removed.
+    """
+
+    def __init__(self, db_path, max_age):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS listings ('
+                'server TEXT, user TEXT, path TEXT, listed REAL, mtime REAL, '
+                'data BLOB, PRIMARY KEY (server, user, path))')
+            self._db.execute(
+                'DELETE FROM listings WHERE listed < ?',
+                (time.time() - max_age,))
+
+    @staticmethod
+    def _server(key):
+        # Never store passwords
+        scheme, host, port, user, _ = key
+        return '%s%s:%d' % (scheme, host, port), user
+
+    def load(self, key, path):
+        """
+        Return `(listed, mtime, stat_results)` for the listing of `path`,
+        or None if there is none younger than `max_age`.
+        """
+        server, user = self._server(key)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT listed, mtime, data FROM listings '
+                'WHERE server = ? AND user = ? AND path = ? AND listed >= ?',
+                (server, user, posixpath.normpath(path),
+                 time.time() - self.max_age)).fetchone()
+        if row is None:
+            return None
+        listed, mtime, data = row
+        return listed, mtime, decode_listing(data)
+
+    def load_all(self, key, max_entries):
+        """
+        Yield `(path, listed, mtime, stat_results)` for the most recent
+        listings of the server of `key`, up to about `max_entries` entries
+        in total.
+        """
+        server, user = self._server(key)
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT path, listed, mtime, data FROM listings '
+                'WHERE server = ? AND user = ? AND listed >= ? '
+                'ORDER BY listed DESC',
+                (server, user, time.time() - self.max_age)).fetchall()
+        count = 0
+        for path, listed, mtime, data in rows:
+            stat_results = decode_listing(data)
+            count += len(stat_results)
+            if count > max_entries:
+                return
+            yield path, listed, mtime, stat_results
+
+    def store(self, key, path, stat_results, mtime=None, listed=None):
+        """Store the listing of `path` made at time `listed` (now)."""
+        server, user = self._server(key)
+        data = encode_listing(stat_results)
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?)',
+                (server, user, posixpath.normpath(path),
+                 time.time() if listed is None else listed, mtime, data))
+
+    def invalidate(self, key, path):
+        """
+        Forget the listings of `path`, anything below it and the
+        directory containing it.
+        """
+        server, user = self._server(key)
+        path = posixpath.normpath(path)
+        below = path.rstrip('/').replace('\\', '\\\\') \
+            .replace('%', '\\%').replace('_', '\\_') + '/%'
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM listings WHERE server = ? AND user = ? AND "
+                "(path IN (?, ?) OR path LIKE ? ESCAPE '\\')",
+                (server, user, path, posixpath.dirname(path), below))
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_persistent_cache(settings):
+    """
+    Return the `PersistentCache` if enabled with the `persistent_cache`
+    setting, else None.
+    """
+    global _instance
+    if not settings.get('persistent_cache', False):
+        return None
+    with _instance_lock:
+        if _instance is None:
+            _instance = PersistentCache(
+                pathjoin(DATA_DIRECTORY, PERSISTENT_CACHE_FILE),
+                settings.get(
+                    'persistent_cache_max_age', PERSISTENT_CACHE_MAX_AGE))
+        return _instance
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from fman import fs, show_status_message
+from fman.url import join as urljoin
+
+
+class TransferError(OSError):
+    """
+    Raised when some files of a tree could not be copied. `errors` is a
+    list of `(src_url, exception)` in the order the failures happened.
+    """
+
+    def __init__(self, errors, total):
+        self.errors = errors
+        src_url, exc = errors[0]
+        super().__init__(
+            'Could not copy %d of %d entries, first error on %s: %s' % (
+                len(errors), total, src_url, exc))
+
+
+class TransferScheduler():
+    """
+    Copy a directory tree with concurrent file transfers.
+
+    The source tree is walked once and all target directories are created
+    before any file is copied. Files are then copied by `workers` threads,
+    each calling `copy_file(src_url, dst_url)`; as `FtpWrapper` leases are
+    per thread, every worker gets its own pooled connection. A failing
+    file doesn't stop the others, all errors are raised together at the
+    end as a `TransferError`.
+    """
+
+    def __init__(self, copy_file, workers):
+        self._copy_file = copy_file
+        self._workers = max(1, workers)
+
+    def copy_tree(self, src_url, dst_url):
+        show_status_message('Preparing copy of %s...' % (src_url,))
+        dirs, files = self._plan(src_url, dst_url)
+        errors = []
+        # Entries below a directory that couldn't be created are skipped
+        failed_dirs = []
+        # The top directory is created first; if that fails there's
+        # nothing to copy, so let the error through
+        fs.mkdir(dirs[0][1])
+        for src, dst in dirs[1:]:
+            if self._is_below(dst, failed_dirs):
+                continue
+            try:
+                fs.mkdir(dst)
+            except Exception as exc:
+                errors.append((src, exc))
+                failed_dirs.append(dst)
+        files = [(src, dst) for src, dst in files
+                 if not self._is_below(dst, failed_dirs)]
+        self._copy_files(files, errors)
+        show_status_message('Ready.', timeout_secs=0)
+        if errors:
+            raise TransferError(errors, len(dirs) + len(files))
+
+    def _plan(self, src_url, dst_url):
+        """
+        Return the lists of `(src_url, dst_url)` of the directories and
+        of the files to copy. Parents come before their subdirectories.
+        """
+        dirs, files = [], []
+        pending = [(src_url, dst_url)]
+        while pending:
+            src, dst = pending.pop()
+            dirs.append((src, dst))
+            for name in fs.iterdir(src):
+                child = (urljoin(src, name), urljoin(dst, name))
+                if fs.is_dir(child[0]):
+                    pending.append(child)
+                else:
+                    files.append(child)
+        return dirs, files
+
+    def _copy_files(self, files, errors):
+        total = len(files)
+        if not total:
+            return
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = {
+                executor.submit(self._copy_file, src, dst): src
+                for src, dst in files}
+            # Progress is reported from this thread only
+            for done, future in enumerate(as_completed(futures), 1):
+                show_status_message(
+                    'Copying files (%d of %d)...' % (done, total))
+                exc = future.exception()
+                if exc is not None:
+                    errors.append((futures[future], exc))
+
+    @staticmethod
+    def _is_below(url, dir_urls):
+        return any(url.startswith(dir_url + '/') for dir_url in dir_urls)